@@ -0,0 +1,65 @@
+from threading import Lock
+from time import time
+from typing import Dict, Hashable, Optional, Set
+
+from config import get_settings
+from api.core.cache import TTLCache
+from api.schemas import CurrentUser
+
+
+class AuthCache:
+    # Map a bearer token (website token or bot JWT) to the identity of its user
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl, on_evict=self._forget)
+        # Keys of the cached entries only, pruned when the cache evicts one
+        self._keys_by_user: Dict[int, Set[Hashable]] = {}
+        self._lock = Lock()
+
+    def get(self, key: Hashable) -> Optional[CurrentUser]:
+        return self.cache.get(key)
+
+    def set(self, key: Hashable, user: CurrentUser, expire: Optional[float] = None) -> None:
+        ttl = None
+        if expire is not None:
+            # Never keep a JWT longer than its own expiration
+            ttl = min(self.cache.ttl, expire - time())
+            if ttl <= 0:
+                return
+        with self._lock:
+            self._keys_by_user.setdefault(user.id, set()).add(key)
+        self.cache.set(key, user, ttl=ttl)
+
+    def _forget(self, key: Hashable, user: CurrentUser) -> None:
+        with self._lock:
+            keys = self._keys_by_user.get(user.id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_user[user.id]
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            keys = self._keys_by_user.pop(user_id, set())
+        for key in keys:
+            self.cache.pop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._keys_by_user.clear()
+        self.cache.clear()
+
+
+_auth_cache: Optional[AuthCache] = None
+
+
+def get_auth_cache() -> AuthCache:
+    global _auth_cache
+    if _auth_cache is None:
+        settings = get_settings()
+        _auth_cache = AuthCache(settings.auth_cache_size, settings.auth_cache_ttl)
+    return _auth_cache
+
+
+def invalidate_user(user_id: int) -> None:
+    get_auth_cache().invalidate_user(user_id)
@@ -0,0 +1,56 @@
+from operator import ge
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Tuple
+
+TIME_CONDITION = "Time"
+
+
+class StatIndex:
+    # Position of every stat type in the threshold and stat vectors, shared by all the missions.
+    # Append only: a vector built before a new type was seen is a prefix of the current layout
+
+    def __init__(self):
+        self._positions: Dict[str, int] = {}
+        self._types: List[str] = []
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._types)
+
+    def position(self, stat_type: str) -> int:
+        with self._lock:
+            if stat_type not in self._positions:
+                self._positions[stat_type] = len(self._types)
+                self._types.append(stat_type)
+            return self._positions[stat_type]
+
+    def vector(self, character_stat: dict) -> Tuple[int, ...]:
+        details = character_stat['details']
+        return tuple(details[stat_type]['niveau'] if stat_type in details else 0 for stat_type in list(self._types))
+
+
+_stat_index = StatIndex()
+
+
+def get_stat_index() -> StatIndex:
+    return _stat_index
+
+
+def compile_conditions(conditions: Iterable) -> Tuple[Tuple[int, ...], int]:
+    # Stat conditions become one threshold per stat type, the first Time condition a number of minutes
+    thresholds: List[int] = []
+    additional_time: Optional[int] = None
+    for condition in conditions:
+        if condition.type == TIME_CONDITION:
+            if additional_time is None:
+                additional_time = int(condition.value)
+            continue
+        position = _stat_index.position(condition.type)
+        if position >= len(thresholds):
+            thresholds.extend([0] * (position + 1 - len(thresholds)))
+        thresholds[position] = max(thresholds[position], int(condition.value))
+    return tuple(thresholds), additional_time or 0
+
+
+def meets_thresholds(stat_vector: Tuple[int, ...], thresholds: Tuple[int, ...]) -> bool:
+    return all(map(ge, stat_vector, thresholds))
@@ -0,0 +1,83 @@
+from threading import Event, Lock, Thread
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy.engine import Engine
+from sqlmodel import Session
+
+from config import get_settings, log
+from api.crud import add_character_cash, update_rank_stat
+
+
+class CounterBuffer:
+    # Write-behind buffer: increments of the same counter are summed and written together on flush
+
+    def __init__(self):
+        self.rank_stats: Dict[Tuple[int, str], Tuple[int, int]] = {}
+        self.cash: Dict[int, int] = {}
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread: Optional[Thread] = None
+
+    def add_rank_stat(self, character_id: int, rank: str, win: int = 0, fail: int = 0) -> None:
+        with self._lock:
+            current_win, current_fail = self.rank_stats.get((character_id, rank), (0, 0))
+            self.rank_stats[(character_id, rank)] = (current_win + win, current_fail + fail)
+
+    def add_cash(self, character_id: int, cash: int) -> None:
+        with self._lock:
+            self.cash[character_id] = self.cash.get(character_id, 0) + cash
+
+    def flush(self, engine: Engine) -> int:
+        with self._lock:
+            rank_stats, self.rank_stats = self.rank_stats, {}
+            cash, self.cash = self.cash, {}
+        if not rank_stats and not cash:
+            return 0
+        try:
+            with Session(engine) as db:
+                for (character_id, rank), (win, fail) in rank_stats.items():
+                    update_rank_stat(db, character_id, rank, win=win, fail=fail, commit=False)
+                for character_id, delta in cash.items():
+                    add_character_cash(db, character_id, delta, commit=False)
+                db.commit()
+        except Exception:
+            # Keep the increments for the next flush
+            for (character_id, rank), (win, fail) in rank_stats.items():
+                self.add_rank_stat(character_id, rank, win=win, fail=fail)
+            for character_id, delta in cash.items():
+                self.add_cash(character_id, delta)
+            raise
+        return len(rank_stats) + len(cash)
+
+    def start(self, engine: Engine, interval: float) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.flush(engine)
+                except Exception as err:
+                    log.error(f"Counter flush failed: {err}")
+
+        self._thread = Thread(target=run, name="counter-buffer", daemon=True)
+        self._thread.start()
+
+    def stop(self, engine: Engine) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.flush(engine)
+
+
+_counter_buffer: Optional[CounterBuffer] = None
+
+
+def get_counter_buffer() -> Optional[CounterBuffer]:
+    # None when the counters are written in the result transaction
+    global _counter_buffer
+    if _counter_buffer is None and get_settings().counter_write_behind:
+        _counter_buffer = CounterBuffer()
+    return _counter_buffer
@@ -1,17 +1,143 @@
+import hashlib
+from typing import Optional
+
 from sqlmodel import Session
-from config import get_settings
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
+from config import Settings, get_settings
 from sqlmodel import SQLModel, create_engine
-from api.crud import get_village, create_village
+from api.crud import (get_village, create_village, has_stat_admin_mission, has_stat_admin_rollup,
+                      rebuild_stat_admin_rollup, has_character, has_leaderboard, rebuild_leaderboard,
+                      backfill_mission_playing_end_time, get_schema_version, set_schema_version)
+from api.services import MISSION_RANK_TIME
+from api.core.instrumentation import instrument_engine
+
+
+def engine_options(settings: Settings, url: str) -> dict:
+    options = {"echo": settings.db_echo}
+    if url.startswith("sqlite"):
+        return options
+    options.update(pool_size=settings.db_pool_size,
+                   max_overflow=settings.db_max_overflow,
+                   pool_timeout=settings.db_pool_timeout,
+                   pool_recycle=settings.db_pool_recycle,
+                   pool_pre_ping=settings.db_pool_pre_ping)
+    if settings.db_isolation_level:
+        options["isolation_level"] = settings.db_isolation_level
+    if settings.db_statement_timeout:
+        options["connect_args"] = {"init_command": f"SET SESSION MAX_EXECUTION_TIME={settings.db_statement_timeout}"}
+    return options
+
+
+def create_db_engine(settings: Settings, test: Optional[bool] = None) -> Engine:
+    url = settings.db_url(test)
+    engine = create_engine(url, **engine_options(settings, url))
+    if settings.db_instrumentation:
+        instrument_engine(engine, settings)
+    return engine
+
+
+def create_db_async_engine(settings: Settings, test: Optional[bool] = None):
+    url = settings.async_db_url(test)
+    engine = create_async_engine(url, **engine_options(settings, url))
+    if settings.db_instrumentation:
+        instrument_engine(engine.sync_engine, settings)
+    return engine
+
+
+def get_pool_status(engine: Engine) -> dict:
+    pool = engine.pool
+    return {
+        "size": pool.size() if hasattr(pool, "size") else 0,
+        "checked_in": pool.checkedin() if hasattr(pool, "checkedin") else 0,
+        "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else 0,
+        "overflow": pool.overflow() if hasattr(pool, "overflow") else 0,
+        "status": pool.status(),
+    }
+
+
+# Bump when a data migration is added to migrate_database, the models alone change the fingerprint
+SCHEMA_REVISION = 2
 
 settings = get_settings()
-engine = create_engine(settings.db_url(), echo=settings.db_echo)
+engine = create_db_engine(settings)
+async_engine = create_db_async_engine(settings) if settings.db_async else None
+
+
+def add_mission_playing_end_time(engine: Engine) -> None:
+    # create_all does not alter the tables created before end_time was stored
+    if has_end_time(engine):
+        return
+    try:
+        with engine.begin() as connection:
+            connection.execute(text("ALTER TABLE missionplaying ADD COLUMN end_time DATETIME NULL"))
+            connection.execute(text("CREATE INDEX ix_missionplaying_end_time ON missionplaying (end_time)"))
+    except OperationalError:
+        # Another worker migrating the same database added it first
+        if not has_end_time(engine):
+            raise
 
 
-def create_database():
+def has_end_time(engine: Engine) -> bool:
+    return "end_time" in {column["name"] for column in inspect(engine).get_columns("missionplaying")}
+
+
+def get_index_names(engine: Engine, table_name: str) -> set:
+    return {index["name"] for index in inspect(engine).get_indexes(table_name)}
+
+
+def add_missing_indexes(engine: Engine) -> None:
+    # create_all does not add the indexes declared after a table was created, as the composite ones on mission
+    for table in SQLModel.metadata.sorted_tables:
+        existing = get_index_names(engine, table.name)
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            try:
+                index.create(engine)
+            except OperationalError:
+                # Another worker migrating the same database created it since the check
+                if index.name not in get_index_names(engine, table.name):
+                    raise
+
+
+def get_schema_fingerprint() -> str:
+    # Changes with any table, column or index of the models, and with SCHEMA_REVISION
+    tables = [(table.name, [(column.name, str(column.type), column.nullable) for column in table.columns],
+               sorted(str(index.name) for index in table.indexes)) for table in SQLModel.metadata.sorted_tables]
+    return hashlib.sha256(repr((SCHEMA_REVISION, tables)).encode()).hexdigest()[:16]
+
+
+def is_schema_current(engine: Engine) -> bool:
+    if not inspect(engine).has_table("schema_version"):
+        return False
+    with Session(engine) as db:
+        return get_schema_version(db) == get_schema_fingerprint()
+
+
+def migrate_database(engine: Engine, schema_marker: bool = True) -> bool:
+    # False when the schema was already current, the workers started after the first one skip every step below
+    if schema_marker and is_schema_current(engine):
+        return False
     SQLModel.metadata.create_all(engine)
+    add_mission_playing_end_time(engine)
+    add_missing_indexes(engine)
     with Session(engine) as db:
         village = get_village(db, 'Konoha')
         if not village:
             create_village(db, "Kumo")
             create_village(db, "Konoha")
             create_village(db, "Errant")
+        if not has_stat_admin_rollup(db) and has_stat_admin_mission(db):
+            rebuild_stat_admin_rollup(db)
+        if not has_leaderboard(db) and has_character(db):
+            rebuild_leaderboard(db)
+        backfill_mission_playing_end_time(db, MISSION_RANK_TIME)
+        set_schema_version(db, get_schema_fingerprint())
+    return True
+
+
+def create_database() -> bool:
+    return migrate_database(engine, settings.db_schema_marker)
@@ -0,0 +1,90 @@
+import asyncio
+import json
+from threading import Lock
+from typing import AsyncIterator, Dict, Optional, Set, Tuple
+
+from config import get_settings, log
+
+
+class Subscription:
+    # Events of one user for one stream, filled from any thread through the loop of the stream
+
+    def __init__(self, user_id: int, loop: asyncio.AbstractEventLoop, size: int):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=size)
+
+    def put(self, event: Tuple[str, dict]) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            log.warning(f"Game events of user {self.user_id} dropped, the stream is not read")
+
+
+class EventBus:
+    # In-process only: a stream only receives the events published by the worker it is connected to
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self._subscriptions: Dict[int, Set[Subscription]] = {}
+        self._lock = Lock()
+
+    def subscribe(self, user_id: int) -> Subscription:
+        subscription = Subscription(user_id, asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is None:
+                return
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.user_id]
+
+    def publish(self, user_id: int, event: str, data: dict) -> int:
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, (event, data))
+            except RuntimeError:
+                # Loop closed, the stream is gone
+                self.unsubscribe(subscription)
+        return len(subscriptions)
+
+
+def format_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def stream_events(bus: EventBus, user_id: int, first: Tuple[str, dict], last_event: str,
+                        keepalive: float) -> AsyncIterator[str]:
+    # Server-Sent Events until last_event, a comment keeps idle proxies from closing the connection.
+    # Subscribed once the stream is read, a response never sent leaves no subscription behind
+    subscription = bus.subscribe(user_id)
+    try:
+        yield format_event(*first)
+        while True:
+            try:
+                event, data = await asyncio.wait_for(subscription.queue.get(), keepalive)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield format_event(event, data)
+            if event == last_event:
+                return
+    finally:
+        bus.unsubscribe(subscription)
+
+
+_event_bus: Optional[EventBus] = None
+
+
+def get_event_bus() -> EventBus:
+    global _event_bus
+    if _event_bus is None:
+        _event_bus = EventBus(get_settings().game_events_queue_size)
+    return _event_bus
@@ -2,7 +2,12 @@ import logging
 
 from click import style
 from config import Settings
-from api.core.database import create_database
+from api.core.database import create_database, engine
+from api.core.srpg_client import get_srpg_client
+from api.core.counter_buffer import get_counter_buffer
+from api.core.mission_sweeper import get_mission_sweeper
+from api.core.roster_refresher import get_roster_refresher
+from api.core.startup import get_startup_report
 
 log = logging.getLogger('uvicorn')
 
@@ -10,10 +15,53 @@ log = logging.getLogger('uvicorn')
 def create_start_app_handler(settings: Settings) -> None:
     async def start_app() -> None:
         log.info("Event handler: start application")
+        startup_report = get_startup_report()
 
         # Database
         log.info(
             f"Loading database settings ... "
             f"[ { style(settings.db_name, fg='cyan') }] on ")
-        create_database()
-    return start_app
\ No newline at end of file
+        with startup_report.measure("database"):
+            if not create_database():
+                log.info("Schema version is current, creation skipped")
+
+        with startup_report.measure("background tasks"):
+            start_background_tasks(settings)
+        log.info(startup_report.ready())
+    return start_app
+
+
+def start_background_tasks(settings: Settings) -> None:
+    counter_buffer = get_counter_buffer()
+    if counter_buffer is not None:
+        log.info("Starting rank stat and cash write-behind")
+        counter_buffer.start(engine, settings.counter_flush_interval)
+
+    mission_sweeper = get_mission_sweeper()
+    if mission_sweeper is not None:
+        log.info("Starting expired games sweep")
+        mission_sweeper.start(engine, settings.mission_sweep_interval)
+
+    roster_refresher = get_roster_refresher()
+    if roster_refresher is not None:
+        log.info("Starting SRPG roster refresh")
+        roster_refresher.start(engine, settings.roster_tick)
+
+
+def create_stop_app_handler() -> None:
+    async def stop_app() -> None:
+        log.info("Event handler: stop application")
+        await get_srpg_client().close()
+
+        mission_sweeper = get_mission_sweeper()
+        if mission_sweeper is not None:
+            mission_sweeper.stop()
+
+        roster_refresher = get_roster_refresher()
+        if roster_refresher is not None:
+            roster_refresher.stop()
+
+        counter_buffer = get_counter_buffer()
+        if counter_buffer is not None:
+            counter_buffer.stop(engine)
+    return stop_app
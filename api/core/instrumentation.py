@@ -0,0 +1,110 @@
+import logging
+from collections import Counter
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config import Settings, get_settings
+
+log = logging.getLogger('uvicorn')
+
+
+class RequestStats:
+    # SQL activity of one HTTP request, shared with the worker threads through the context
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.rows = 0
+        self.statements: Counter = Counter()
+        self.slow: List[str] = []
+
+    def add(self, statement: str, duration: float, rows: int) -> None:
+        self.queries += 1
+        self.db_time += duration
+        self.rows += max(rows, 0)
+        self.statements[statement] += 1
+
+    def repeated_statements(self, threshold: int) -> Dict[str, int]:
+        return {statement: count for statement, count in self.statements.items() if count >= threshold}
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def get_request_stats() -> Optional[RequestStats]:
+    return _request_stats.get()
+
+
+# -------------------------------------------------#
+#               Engine                             #
+# -------------------------------------------------#
+
+
+def instrument_engine(engine: Engine, settings: Settings) -> None:
+    slow_query = settings.db_slow_query_ms / 1000
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        duration = perf_counter() - conn.info["query_start"].pop()
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.add(statement, duration, cursor.rowcount)
+        if duration >= slow_query:
+            log.warning(f"Slow query ({duration * 1000:.1f}ms): {statement}",
+                        extra={"db_time": duration, "statement": statement})
+            if stats is not None:
+                stats.slow.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+
+# -------------------------------------------------#
+#               Middleware                         #
+# -------------------------------------------------#
+
+
+class QueryStatsMiddleware:
+    # Count the statements of each request, report them as headers and in one log line keyed by route
+
+    def __init__(self, app, settings: Optional[Settings] = None):
+        self.app = app
+        self.settings = settings or get_settings()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start" and self.settings.db_query_headers:
+                message["headers"] = [*message.get("headers", []),
+                                      (b"x-db-queries", str(stats.queries).encode()),
+                                      (b"x-db-time", f"{stats.db_time * 1000:.2f}".encode()),
+                                      (b"x-db-rows", str(stats.rows).encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _request_stats.reset(token)
+            self.report(scope, stats)
+
+    def report(self, scope, stats: RequestStats) -> None:
+        endpoint = scope.get("endpoint")
+        route = endpoint.__name__ if endpoint else scope["path"]
+        repeated = stats.repeated_statements(self.settings.db_n_plus_one_threshold)
+        fields = {"route": route, "queries": stats.queries, "db_time": round(stats.db_time * 1000, 2),
+                  "rows": stats.rows, "slow_queries": len(stats.slow), "n_plus_one": len(repeated)}
+        for statement, count in repeated.items():
+            log.warning(f"N+1 suspected on {route}: {count} x {statement}", extra={**fields, "statement": statement})
+        if self.settings.db_query_log:
+            log.info(" ".join(f"{key}={value}" for key, value in fields.items()), extra=fields)
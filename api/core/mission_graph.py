@@ -0,0 +1,158 @@
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+from sqlmodel import Session
+
+from api.crud import (get_choices_from_mission, get_conditions_from_mission, get_finality_from_mission,
+                      get_steps_from_mission)
+from api.core.conditions import compile_conditions
+
+# -------------------------------------------------#
+#                   MENU                           #
+#                                                  #
+#               0.Nodes                            #
+#               1.Graph                            #
+#               2.Cache                            #
+# -------------------------------------------------#
+
+# -------------------------------------------------#
+#                                                  #
+#               0.Nodes                            #
+#                                                  #
+# -------------------------------------------------#
+
+
+@dataclass(frozen=True)
+class ConditionNode:
+    id: int
+    type: str
+    value: int
+
+
+@dataclass(frozen=True)
+class FinalityNode:
+    id: int
+    description: str
+    value: str
+    cash: int
+
+
+@dataclass(frozen=True)
+class ChoiceNode:
+    id: int
+    sentence: str
+    value: int
+    step_from_id: Optional[int]
+    step_to_id: Optional[int]
+    conditions: Tuple[ConditionNode, ...] = ()
+    finalities: Dict[str, FinalityNode] = field(default_factory=dict)
+    # Compiled from the conditions: minimum level per stat type in the StatIndex layout, minutes added
+    thresholds: Tuple[int, ...] = ()
+    additional_time: int = 0
+
+
+@dataclass(frozen=True)
+class StepNode:
+    id: int
+    description: str
+    first_step: bool
+
+
+# -------------------------------------------------#
+#                                                  #
+#               1.Graph                            #
+#                                                  #
+# -------------------------------------------------#
+
+
+@dataclass(frozen=True)
+class MissionGraph:
+    mission_id: int
+    first_step_id: Optional[int]
+    steps: Dict[int, StepNode]
+    choices: Dict[int, ChoiceNode]
+    choices_by_step: Dict[int, Tuple[ChoiceNode, ...]]
+
+    def get_step(self, id: Optional[int]) -> Optional[StepNode]:
+        return self.steps.get(id)
+
+    def get_choice(self, id: Optional[int]) -> Optional[ChoiceNode]:
+        return self.choices.get(id)
+
+    def get_choices_from_step(self, step_id: Optional[int]) -> Tuple[ChoiceNode, ...]:
+        return self.choices_by_step.get(step_id, ())
+
+    def is_final_choice(self, choice_id: Optional[int]) -> bool:
+        choice = self.choices.get(choice_id)
+        return bool(choice and choice.finalities)
+
+
+def compile_mission_graph(db: Session, mission_id: int) -> MissionGraph:
+    conditions: Dict[int, List[ConditionNode]] = {}
+    for condition in get_conditions_from_mission(db, mission_id):
+        conditions.setdefault(condition.choice_id, []).append(
+            ConditionNode(id=condition.id, type=condition.type, value=int(condition.value)))
+
+    finalities: Dict[int, Dict[str, FinalityNode]] = {}
+    for finality in get_finality_from_mission(db, mission_id):
+        # Keep the first finality per result, as get_finality_from_choice did
+        finalities.setdefault(finality.choice_id, {}).setdefault(
+            finality.value, FinalityNode(id=finality.id, description=finality.description,
+                                         value=finality.value, cash=finality.cash))
+
+    steps = {}
+    first_step_id = None
+    for step in sorted(get_steps_from_mission(db, mission_id), key=lambda step: step.id):
+        steps[step.id] = StepNode(id=step.id, description=step.description, first_step=step.first_step)
+        if step.first_step and first_step_id is None:
+            first_step_id = step.id
+
+    choices = {}
+    choices_by_step: Dict[int, List[ChoiceNode]] = {}
+    for choice in sorted(get_choices_from_mission(db, mission_id), key=lambda choice: choice.id):
+        choice_conditions = tuple(conditions.get(choice.id, []))
+        thresholds, additional_time = compile_conditions(choice_conditions)
+        node = ChoiceNode(id=choice.id, sentence=choice.sentence, value=int(choice.value),
+                          step_from_id=choice.step_from_id, step_to_id=choice.step_to_id,
+                          conditions=choice_conditions,
+                          finalities=finalities.get(choice.id, {}),
+                          thresholds=thresholds, additional_time=additional_time)
+        choices[choice.id] = node
+        choices_by_step.setdefault(choice.step_from_id, []).append(node)
+
+    return MissionGraph(mission_id=mission_id,
+                        first_step_id=first_step_id,
+                        steps=steps,
+                        choices=choices,
+                        choices_by_step={key: tuple(value) for key, value in choices_by_step.items()})
+
+
+# -------------------------------------------------#
+#                                                  #
+#               2.Cache                            #
+#                                                  #
+# -------------------------------------------------#
+
+_graphs: Dict[int, MissionGraph] = {}
+_lock = Lock()
+
+
+def get_mission_graph(db: Session, mission_id: int) -> MissionGraph:
+    graph = _graphs.get(mission_id)
+    if graph is None:
+        graph = compile_mission_graph(db, mission_id)
+        # A mission without steps is missing or still being imported
+        if not graph.steps:
+            return graph
+        with _lock:
+            graph = _graphs.setdefault(mission_id, graph)
+    return graph
+
+
+def invalidate_mission_graph(mission_id: Optional[int] = None) -> None:
+    with _lock:
+        if mission_id is None:
+            _graphs.clear()
+        else:
+            _graphs.pop(mission_id, None)
@@ -0,0 +1,123 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple, Union
+
+from sqlalchemy.engine import Engine
+from sqlmodel import Session
+
+from api.crud import get_village
+from api.models import Choice, Condition, Finality, Mission, Step
+from api.services import MISSION_RANK_PERCENT
+from api.core.mission_graph import invalidate_mission_graph
+from api.core.mission_index import invalidate_mission_index
+
+
+class MissionImportError(ValueError):
+    pass
+
+
+def load_mission_file(path: str) -> dict:
+    with open(path) as json_data:
+        return json.load(json_data)
+
+
+def list_mission_files(paths: List[str]) -> List[str]:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(".json")))
+        else:
+            files.append(path)
+    return files
+
+
+def import_mission(db: Session, data: dict) -> Mission:
+    # Add every row of an Arrows-style mission to the session, the caller commits or rolls back
+    mission_nodes = [node for node in data['nodes'] if "Mission" in node['labels']]
+    if len(mission_nodes) != 1:
+        raise MissionImportError(f"Expected one Mission node, found {len(mission_nodes)}")
+    mission_node = mission_nodes[0]
+    rank = mission_node["properties"]["rank"].upper()
+
+    villages = []
+    for label in mission_node['labels']:
+        if label != "Mission":
+            village = get_village(db, label.capitalize())
+            if not village:
+                raise MissionImportError(f"Unknown village {label}")
+            villages.append(village)
+    if not villages:
+        raise MissionImportError("Mission without village")
+
+    mission = Mission(rank=rank,
+                      title=mission_node["properties"]["title"],
+                      description=mission_node["properties"]["description"],
+                      cash=int(mission_node["properties"]["cash"]),
+                      percent_mission=MISSION_RANK_PERCENT[rank],
+                      villages=villages)
+    db.add(mission)
+    db.flush()
+
+    steps: Dict[str, Step] = {}
+    choices: Dict[str, Choice] = {}
+    conditions: Dict[str, Condition] = {}
+    finalities: Dict[str, Finality] = {}
+    for node in data['nodes']:
+        properties = node["properties"]
+        if node['caption'] == "Step":
+            steps[node['id']] = Step(description=properties["description"], mission_id=mission.id,
+                                     first_step="Mission" in node['labels'])
+        elif node['caption'] == "Choice":
+            choices[node['id']] = Choice(sentence=properties["sentence"], value=int(properties["value"]),
+                                         mission_id=mission.id)
+        elif node['caption'] == "Condition":
+            conditions[node['id']] = Condition(type=properties["type"].capitalize(), value=int(properties["value"]),
+                                               mission_id=mission.id)
+        elif node['caption'] == "Finality":
+            finalities[node['id']] = Finality(description=properties["description"], value=properties["value"],
+                                              cash=int(properties.get("cash", 0)), mission_id=mission.id)
+
+    for rel in data["relationships"]:
+        from_id, to_id = rel["fromId"], rel["toId"]
+        if from_id in steps and to_id in choices:
+            choices[to_id].step_from = steps[from_id]
+        elif from_id in choices and to_id in steps:
+            choices[from_id].step_to = steps[to_id]
+        elif from_id in choices and to_id in conditions:
+            conditions[to_id].choice = choices[from_id]
+        elif from_id in choices and to_id in finalities:
+            finalities[to_id].choice = choices[from_id]
+        else:
+            raise MissionImportError(f"Unexpected relationship {rel['id']} from {from_id} to {to_id}")
+
+    db.add_all([*steps.values(), *choices.values(), *conditions.values(), *finalities.values()])
+    db.flush()
+    return mission
+
+
+def import_mission_file(engine: Engine, path: str) -> int:
+    data = load_mission_file(path)
+    with Session(engine) as db:
+        try:
+            mission = import_mission(db, data)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        mission_id = mission.id
+    invalidate_mission_graph(mission_id)
+    invalidate_mission_index()
+    return mission_id
+
+
+def import_mission_files(
+        engine: Engine, paths: List[str], workers: int = 4) -> List[Tuple[str, Union[int, Exception]]]:
+    def run(path: str):
+        try:
+            return path, import_mission_file(engine, path)
+        except Exception as error:
+            return path, error
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        return list(executor.map(run, paths))
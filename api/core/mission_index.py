@@ -0,0 +1,51 @@
+from random import choice
+from threading import Lock
+from time import monotonic
+from typing import Dict, Optional, Tuple
+
+from sqlmodel import Session
+
+from config import get_settings
+from api.crud import get_mission_keys
+
+
+_index: Dict[Tuple[str, str], Tuple[int, ...]] = {}
+_built_at: Optional[float] = None
+_lock = Lock()
+
+
+def build_mission_index(db: Session) -> None:
+    global _index, _built_at
+    index: Dict[Tuple[str, str], list] = {}
+    for mission_id, rank, village in get_mission_keys(db):
+        index.setdefault((rank, village), []).append(mission_id)
+    with _lock:
+        _index = {key: tuple(sorted(set(value))) for key, value in index.items()}
+        _built_at = monotonic()
+
+
+def invalidate_mission_index() -> None:
+    global _built_at
+    with _lock:
+        _built_at = None
+
+
+def get_mission_index() -> Tuple[Dict[Tuple[str, str], Tuple[int, ...]], Optional[float]]:
+    # Read together, an invalidation from another thread cannot clear _built_at between the check and its use
+    with _lock:
+        return _index, _built_at
+
+
+def get_random_mission_id(db: Session, rank: str, village: str) -> Optional[int]:
+    index, built_at = get_mission_index()
+    if built_at is None:
+        build_mission_index(db)
+        index, built_at = get_mission_index()
+    missions_id = index.get((rank, village))
+    # Missions imported by another process are picked up on a miss, at most once per refresh delay
+    if not missions_id and (built_at is None or monotonic() - built_at > get_settings().mission_index_refresh):
+        build_mission_index(db)
+        missions_id = get_mission_index()[0].get((rank, village))
+    if not missions_id:
+        return None
+    return choice(missions_id)
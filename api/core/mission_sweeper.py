@@ -0,0 +1,62 @@
+from threading import Event, Thread
+from typing import Optional
+
+from sqlalchemy.engine import Engine
+from sqlmodel import Session
+
+from config import get_settings, log
+from api.services import resolve_expired_games
+
+
+class MissionSweeper:
+    # Resolve the games whose time is over in the background, the players fetch the recorded outcome later
+
+    def __init__(self, batch_size: int):
+        self.batch_size = batch_size
+        self._stop = Event()
+        self._thread: Optional[Thread] = None
+
+    def sweep(self, engine: Engine) -> int:
+        # Batches are drained until one is not full, the next run picks up what expires meanwhile
+        resolved = 0
+        while not self._stop.is_set():
+            with Session(engine, expire_on_commit=False) as db:
+                count = resolve_expired_games(db, self.batch_size)
+            resolved += count
+            if count < self.batch_size:
+                break
+        return resolved
+
+    def start(self, engine: Engine, interval: float) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    resolved = self.sweep(engine)
+                    if resolved:
+                        log.info(f"Expired games resolved: {resolved}")
+                except Exception as err:
+                    log.error(f"Expired games sweep failed: {err}")
+
+        self._thread = Thread(target=run, name="mission-sweeper", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+
+_mission_sweeper: Optional[MissionSweeper] = None
+
+
+def get_mission_sweeper() -> Optional[MissionSweeper]:
+    global _mission_sweeper
+    settings = get_settings()
+    if _mission_sweeper is None and settings.mission_sweep_enabled:
+        _mission_sweeper = MissionSweeper(settings.mission_sweep_batch)
+    return _mission_sweeper
@@ -0,0 +1,56 @@
+from random import Random
+from threading import Lock
+from typing import List, Optional, Sequence
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from config import get_settings
+
+
+WIN = "win"
+FAIL = "fail"
+
+
+class OutcomeEngine:
+    # Draw "win" with a probability of `percent` out of 100 in constant time
+
+    def __init__(self, seed: Optional[int] = None):
+        self.seed = seed
+        self.rng = Random(seed)
+        self._numpy_rng = numpy.random.default_rng(seed) if numpy is not None else None
+        self._lock = Lock()
+
+    def draw(self, percent: int) -> str:
+        with self._lock:
+            roll = self.rng.randrange(100)
+        return WIN if roll < percent else FAIL
+
+    def draw_many(self, percents: Sequence[int]) -> List[str]:
+        if not percents:
+            return []
+        if self._numpy_rng is not None:
+            with self._lock:
+                rolls = self._numpy_rng.integers(0, 100, size=len(percents))
+            wins = rolls < numpy.asarray(percents)
+            return [WIN if win else FAIL for win in wins.tolist()]
+        with self._lock:
+            rolls = [self.rng.randrange(100) for _ in percents]
+        return [WIN if roll < percent else FAIL for roll, percent in zip(rolls, percents)]
+
+
+_engine: Optional[OutcomeEngine] = None
+
+
+def get_outcome_engine() -> OutcomeEngine:
+    global _engine
+    if _engine is None:
+        _engine = OutcomeEngine(get_settings().outcome_seed)
+    return _engine
+
+
+def set_outcome_engine(engine: OutcomeEngine) -> None:
+    global _engine
+    _engine = engine
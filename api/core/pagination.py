@@ -0,0 +1,47 @@
+import base64
+import json
+from typing import Callable, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+from api.schemas import Page
+
+invalid_cursor_exception = HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Invalid cursor")
+
+
+def encode_cursor(key: tuple) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode()
+
+
+def decode_cursor(cursor: Optional[str], key_types: Tuple[type, ...]) -> Optional[tuple]:
+    # The cursor comes from the client, it must be the sort key of the listing: a list of `key_types` values
+    if not cursor:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (TypeError, ValueError):
+        raise invalid_cursor_exception
+    if not isinstance(key, list) or len(key) != len(key_types) or not all(
+            isinstance(value, key_type) and not isinstance(value, bool) for value, key_type in zip(key, key_types)):
+        raise invalid_cursor_exception
+    return tuple(key)
+
+
+class Pagination:
+    # Keyset pagination: a page starts after the sort key of the last item of the previous one
+
+    def __init__(self, limit: int, after: Optional[tuple] = None):
+        self.limit = limit
+        self.after = after
+
+    @property
+    def fetch(self) -> int:
+        # One more row than the page tells if there is a next page
+        return self.limit + 1
+
+    def make_page(self, items: List, key: Callable[..., tuple]) -> Page:
+        next_cursor = None
+        if len(items) > self.limit:
+            items = items[:self.limit]
+            next_cursor = encode_cursor(key(items[-1]))
+        return Page(items=items, next_cursor=next_cursor)
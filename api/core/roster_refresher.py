@@ -0,0 +1,157 @@
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor, wait
+from threading import Event, Lock, Thread
+from random import uniform
+from time import monotonic
+from typing import Dict, List, Optional
+
+from sqlalchemy.engine import Engine
+from sqlmodel import Session
+
+from config import Settings, get_settings, log
+from api.crud import get_user
+from api.services import get_characters_from_srpg, save_characters
+
+
+def hash_roster(characters: list) -> str:
+    return hashlib.sha256(json.dumps(characters, sort_keys=True).encode()).hexdigest()
+
+
+class RosterState:
+
+    def __init__(self, token_srpg: str, interval: float):
+        self.token_srpg = token_srpg
+        self.seen_at = monotonic()
+        # Users first seen together, as after a restart, are due at random points of the next interval
+        self.refreshed_at = self.seen_at - uniform(0, interval)
+        self.digest: Optional[str] = None
+
+
+class RosterRefresher:
+    # Refresh the SRPG characters of the users seen recently, a few at a time through a bounded pool.
+    # An account whose payload hash did not change is not written
+
+    def __init__(self, settings: Settings):
+        self.interval = settings.roster_refresh_interval
+        self.active_window = settings.roster_active_window
+        self.batch_size = settings.roster_batch
+        self.workers = settings.roster_workers
+        self.users: Dict[int, RosterState] = {}
+        self._lock = Lock()
+        self._wake = Event()
+        self._stop = Event()
+        self._thread: Optional[Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def touch(self, user_id: int, token_srpg: str) -> None:
+        with self._lock:
+            state = self.users.get(user_id)
+            if state is None or state.token_srpg != token_srpg:
+                self.users[user_id] = RosterState(token_srpg, self.interval)
+            else:
+                state.seen_at = monotonic()
+
+    def remember(self, user_id: int, token_srpg: str, characters: list) -> None:
+        # Roster synced inline by a request, the next refresh is skipped if it did not change
+        self.touch(user_id, token_srpg)
+        with self._lock:
+            state = self.users[user_id]
+            state.digest = hash_roster(characters)
+            state.refreshed_at = monotonic()
+
+    def request(self, user_id: int, token_srpg: str) -> None:
+        # Refresh this user on the next run instead of waiting for its interval, whatever the monotonic clock origin
+        self.touch(user_id, token_srpg)
+        with self._lock:
+            self.users[user_id].refreshed_at = float("-inf")
+        self._wake.set()
+
+    def due_users(self) -> List[int]:
+        now = monotonic()
+        with self._lock:
+            for user_id in [user_id for user_id, state in self.users.items()
+                            if now - state.seen_at > self.active_window]:
+                del self.users[user_id]
+            due = [user_id for user_id, state in self.users.items() if now - state.refreshed_at >= self.interval]
+            # Oldest refresh first, the batch size spreads the upstream calls over the runs
+            due.sort(key=lambda user_id: self.users[user_id].refreshed_at)
+        return due[:self.batch_size]
+
+    def fetch(self, token_srpg: str) -> Optional[list]:
+        return get_characters_from_srpg(token_srpg)
+
+    def refresh_user(self, engine: Engine, user_id: int) -> bool:
+        with self._lock:
+            state = self.users.get(user_id)
+        if state is None:
+            return False
+        characters = self.fetch(state.token_srpg)
+        digest = hash_roster(characters) if characters else None
+        changed = digest is not None and digest != state.digest
+        # An empty roster is an invalid token or an upstream error, never unlink every character on it
+        if changed:
+            with Session(engine) as db:
+                user = get_user(db, id=user_id)
+                if user is not None:
+                    save_characters(db, user, characters, refresh=True)
+        with self._lock:
+            if digest is not None:
+                state.digest = digest
+            state.refreshed_at = monotonic()
+        return changed
+
+    def refresh(self, engine: Engine, executor: ThreadPoolExecutor) -> int:
+        futures = {executor.submit(self.refresh_user, engine, user_id): user_id for user_id in self.due_users()}
+        wait(futures)
+        changed = 0
+        for future, user_id in futures.items():
+            try:
+                changed += future.result()
+            except Exception as err:
+                log.error(f"Roster of user {user_id} not refreshed: {err}")
+                with self._lock:
+                    if user_id in self.users:
+                        self.users[user_id].refreshed_at = monotonic()
+        return changed
+
+    def start(self, engine: Engine, tick: float) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+
+        def run():
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="roster") as executor:
+                while not self._stop.is_set():
+                    self._wake.wait(tick)
+                    self._wake.clear()
+                    if self._stop.is_set():
+                        break
+                    try:
+                        self.refresh(engine, executor)
+                    except Exception as err:
+                        log.error(f"Roster refresh failed: {err}")
+
+        self._thread = Thread(target=run, name="roster-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+
+
+_roster_refresher: Optional[RosterRefresher] = None
+
+
+def get_roster_refresher() -> Optional[RosterRefresher]:
+    global _roster_refresher
+    settings = get_settings()
+    if _roster_refresher is None and settings.roster_refresh_enabled:
+        _roster_refresher = RosterRefresher(settings)
+    return _roster_refresher
@@ -0,0 +1,135 @@
+import json
+from functools import lru_cache
+from typing import Optional, Tuple
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import Settings, get_settings
+from api.core.cache import TTLCache
+from api.core.conditions import get_stat_index
+from api.core.upstream import CircuitBreaker, SingleFlight, UpstreamUnavailable
+
+
+class SrpgError(Exception):
+    pass
+
+
+# Failures of the SRPG API, answered 503 by the routes
+SRPG_ERRORS = (SrpgError, UpstreamUnavailable)
+
+
+class SrpgClient:
+    # Keep-alive client for the SRPG API, shared by every request of the worker.
+    # Calls go through a circuit breaker, concurrent calls for the same token or character share one fetch
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.timeout = settings.srpg_timeout
+        self.stat_cache = TTLCache(maxsize=settings.srpg_stat_cache_size, ttl=settings.srpg_stat_cache_ttl)
+        self.stat_vector_cache = TTLCache(maxsize=settings.srpg_stat_cache_size, ttl=settings.srpg_stat_cache_ttl)
+
+        retry = Retry(total=settings.srpg_retries, backoff_factor=0.2,
+                      status_forcelist=(502, 503, 504), allowed_methods=("GET",))
+        adapter = HTTPAdapter(pool_connections=settings.srpg_pool_size,
+                              pool_maxsize=settings.srpg_pool_size,
+                              max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self.breaker = CircuitBreaker("SRPG", settings.srpg_breaker_threshold, settings.srpg_breaker_reset)
+        self.single_flight = SingleFlight()
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.settings.srpg_pool_size,
+                                    max_keepalive_connections=self.settings.srpg_pool_size),
+                transport=httpx.AsyncHTTPTransport(retries=self.settings.srpg_retries))
+        return self._async_client
+
+    def fetch(self, url: str):
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+        except requests.RequestException as err:
+            raise SrpgError(f"SRPG not reached: {err}") from err
+        return read_response(response.status_code, response.text)
+
+    async def fetch_async(self, url: str):
+        try:
+            response = await self.async_client.get(url)
+        except httpx.HTTPError as err:
+            raise SrpgError(f"SRPG not reached: {err}") from err
+        return read_response(response.status_code, response.text)
+
+    def call(self, key: Tuple, url: str):
+        return self.single_flight.do(key, lambda: self.breaker.call(lambda: self.fetch(url)))
+
+    async def call_async(self, key: Tuple, url: str):
+        return await self.single_flight.do_async(key, lambda: self.breaker.call_async(lambda: self.fetch_async(url)))
+
+    def get_account(self, token: str) -> list:
+        return self.call(("account", token), self.settings.SRPG_URL_CHARACTERS_TOKEN + token)
+
+    async def get_account_async(self, token: str) -> list:
+        return await self.call_async(("account", token), self.settings.SRPG_URL_CHARACTERS_TOKEN + token)
+
+    def get_power(self, id_srpg: int, use_cache: bool = True) -> dict:
+        if use_cache:
+            datas = self.stat_cache.get(id_srpg)
+            if datas is not None:
+                return datas
+        datas = self.call(("power", id_srpg), f"{self.settings.SRPG_URL_MISSION_PERCENT}{id_srpg}")
+        self.stat_cache.set(id_srpg, datas)
+        self.stat_vector_cache.pop(id_srpg)
+        return datas
+
+    async def get_power_async(self, id_srpg: int, use_cache: bool = True) -> dict:
+        if use_cache:
+            datas = self.stat_cache.get(id_srpg)
+            if datas is not None:
+                return datas
+        datas = await self.call_async(("power", id_srpg), f"{self.settings.SRPG_URL_MISSION_PERCENT}{id_srpg}")
+        self.stat_cache.set(id_srpg, datas)
+        self.stat_vector_cache.pop(id_srpg)
+        return datas
+
+    def get_power_vector(self, id_srpg: int) -> Tuple[int, ...]:
+        # Levels in the StatIndex layout, rebuilt when a mission compiled since brought a new stat type
+        stat_index = get_stat_index()
+        vector = self.stat_vector_cache.get(id_srpg)
+        if vector is None or len(vector) < len(stat_index):
+            vector = stat_index.vector(self.get_power(id_srpg))
+            self.stat_vector_cache.set(id_srpg, vector)
+        return vector
+
+    def invalidate_power(self, id_srpg: Optional[int] = None) -> None:
+        if id_srpg is None:
+            self.stat_cache.clear()
+            self.stat_vector_cache.clear()
+        else:
+            self.stat_cache.pop(id_srpg)
+            self.stat_vector_cache.pop(id_srpg)
+
+    async def close(self) -> None:
+        self.session.close()
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+
+def read_response(status_code: int, text: str):
+    # Only the server errors count as failures of the upstream, an invalid token is still an answer
+    if status_code >= 500:
+        raise SrpgError(f"SRPG answered {status_code}")
+    return json.loads(text)
+
+
+@lru_cache()
+def get_srpg_client() -> SrpgClient:
+    return SrpgClient(get_settings())
@@ -0,0 +1,39 @@
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Dict, Optional
+
+# Imported first by main, the clock starts with the worker
+_began_at = perf_counter()
+
+
+class StartupReport:
+    # Duration of the startup phases of the worker, logged once it serves requests
+
+    def __init__(self, began_at: float):
+        self.began_at = began_at
+        self.phases: Dict[str, float] = {}
+        self.ready_at: Optional[float] = None
+
+    def mark(self, phase: str) -> None:
+        # Phase running since the end of the previous mark, or since the start of the worker
+        self.phases[phase] = perf_counter() - self.began_at - sum(self.phases.values())
+
+    @contextmanager
+    def measure(self, phase: str):
+        begin = perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[phase] = perf_counter() - begin
+
+    def ready(self) -> str:
+        self.ready_at = perf_counter()
+        phases = ", ".join(f"{phase} {duration * 1000:.0f}ms" for phase, duration in self.phases.items())
+        return f"Started in {(self.ready_at - self.began_at) * 1000:.0f}ms ({phases})"
+
+
+_startup_report = StartupReport(_began_at)
+
+
+def get_startup_report() -> StartupReport:
+    return _startup_report
@@ -0,0 +1,114 @@
+import asyncio
+from concurrent.futures import Future
+from threading import Lock
+from time import monotonic
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from config import log
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class UpstreamUnavailable(Exception):
+    pass
+
+
+class CircuitBreaker:
+    # Opened after `threshold` failures in a row, calls then fail at once for `reset_timeout` seconds.
+    # The first call after that is a trial: its success closes the circuit, its failure opens it again
+
+    def __init__(self, name: str, threshold: int, reset_timeout: float):
+        self.name = name
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = Lock()
+
+    def check(self) -> None:
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            if self.state == OPEN and monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                return
+        raise UpstreamUnavailable(f"{self.name} circuit is {self.state}")
+
+    def success(self) -> None:
+        with self._lock:
+            if self.state != CLOSED:
+                log.info(f"{self.name} circuit closed")
+            self.state = CLOSED
+            self.failures = 0
+
+    def failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.threshold):
+                log.warning(f"{self.name} circuit opened after {self.failures} failures")
+                self.state = OPEN
+                self.opened_at = monotonic()
+
+    def call(self, function: Callable[[], Any]) -> Any:
+        self.check()
+        try:
+            result = function()
+        except Exception:
+            self.failure()
+            raise
+        self.success()
+        return result
+
+    async def call_async(self, function: Callable[[], Awaitable[Any]]) -> Any:
+        self.check()
+        try:
+            result = await function()
+        except Exception:
+            self.failure()
+            raise
+        self.success()
+        return result
+
+
+class SingleFlight:
+    # Concurrent calls with the same key wait for the call in flight and share its result
+
+    def __init__(self):
+        self._calls: Dict[Hashable, Future] = {}
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+        self._lock = Lock()
+
+    def do(self, key: Hashable, function: Callable[[], Any]) -> Any:
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                leader = False
+            else:
+                leader = True
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result()
+        try:
+            result = function()
+            future.set_result(result)
+            return result
+        except BaseException as err:
+            future.set_exception(err)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    async def do_async(self, key: Hashable, function: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._tasks.get(key)
+        if task is None:
+            task = self._tasks[key] = asyncio.ensure_future(function())
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        # A cancelled caller does not cancel the call shared with the others
+        return await asyncio.shield(task)
+
+    def __len__(self) -> int:
+        return len(self._calls) + len(self._tasks)
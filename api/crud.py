@@ -1,11 +1,17 @@
-from typing import Optional, List
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, Optional, List
 from pydantic import EmailStr
 
 from sqlmodel import Session, select, BigInteger, text
+from sqlalchemy import and_, bindparam, case, delete, func, or_, tuple_, update
+from sqlalchemy.exc import IntegrityError
 
 from api.models import (Finality, MissionPlaying, MissionVillage, RankStat, Village, User, Character, Mission, Step,
-                        Choice, Condition, UserCharacterLink, StatAdminMission)
-from api.schemas import StatAdminMissionBase, CharacterCreate, EnumRank, MissionPlayingCreate
+                        Choice, Condition, UserCharacterLink, StatAdminMission, CharacterMissionStat,
+                        StatAdminMissionRollup, LeaderboardEntry, MissionResult, SchemaVersion)
+from api.schemas import (StatAdminMissionBase, CharacterCreate, EnumRank, MissionPlayingCreate, ActiveGame, GameMission,
+                         GameCharacter)
+from api.core.auth_cache import invalidate_user
 
 # -------------------------------------------------#
 #                   MENU                           #
@@ -23,6 +29,8 @@ from api.schemas import StatAdminMissionBase, CharacterCreate, EnumRank, Mission
 #               4.Stats                            #
 #                   4.1.Rank Stats                 #
 #                   4.2.Mission Admin Stats        #
+#                   4.3.Leaderboard                #
+#               5.Schema                           #
 # -------------------------------------------------#
 
 # -------------------------------------------------#
@@ -107,30 +115,77 @@ def create_character(
     if rank_stat:
         for rank in rank_stat:
             db_character.mission_rank.append(rank)
+        create_leaderboard_entries(db, db_character.id, db_character.village, [rank.rank for rank in rank_stat])
     db.commit()
     return character
 
 
 def edit_character(
         db: Session, character: Character, village: Optional[str] = None, url_avatar: Optional[str] = None,
-        user: Optional['User'] = None, cash: Optional[int] = None):
+        user: Optional['User'] = None, cash: Optional[int] = None, commit: bool = True):
     if village:
         character.village = village
+        set_leaderboard_village(db, character.id, village)
     if url_avatar:
         character.url_avatar = url_avatar
     if user:
         character.users.append(user)
     if cash is not None:
         character.cash = cash
-    db.commit()
-    db.refresh(character)
+    if commit:
+        db.commit()
+        db.refresh(character)
     return character
 
 
+def add_character_cash(db: Session, character_id: int, cash: int, commit: bool = True) -> None:
+    # Incremented by the database, concurrent results of a character cannot overwrite each other
+    db.execute(update(Character).where(Character.id == character_id).values(
+        cash=Character.cash + cash).execution_options(synchronize_session=False))
+    if commit:
+        db.commit()
+
+
+def get_characters_to_sync(db: Session, user_id: Optional[int], ids_srpg: List[int]) -> List[tuple]:
+    # One query for the characters of the SRPG account and the ones still linked to the user, with their link
+    rows = db.exec(select(Character, UserCharacterLink.id_user).outerjoin(UserCharacterLink, and_(
+        UserCharacterLink.id_character == Character.id, UserCharacterLink.id_user == user_id)).where(
+        or_(Character.id_srpg.in_(ids_srpg), UserCharacterLink.id_user != None))).all()  # noqa: E711
+    return [(character, id_user is not None) for character, id_user in rows]
+
+
+def create_characters(db: Session, characters: List[CharacterCreate], ranks: List[str]) -> List[Character]:
+    # Flushed together with their rank stats and leaderboard entries, the caller commits
+    db_characters = [Character.parse_obj(character) for character in characters]
+    for db_character in db_characters:
+        db_character.mission_rank = [RankStat(rank=rank, win=0, fail=0) for rank in ranks]
+    db.add_all(db_characters)
+    db.flush()
+    for db_character in db_characters:
+        create_leaderboard_entries(db, db_character.id, db_character.village, ranks)
+    return db_characters
+
+
+def link_characters(db: Session, user_id: int, character_ids: List[int]) -> None:
+    if character_ids:
+        db.execute(UserCharacterLink.__table__.insert(),
+                   [{"id_user": user_id, "id_character": character_id} for character_id in character_ids])
+
+
+def unlink_characters(db: Session, user_id: int, character_ids: List[int]) -> None:
+    if character_ids:
+        db.execute(delete(UserCharacterLink).where(
+            UserCharacterLink.id_user == user_id, UserCharacterLink.id_character.in_(character_ids)).execution_options(
+            synchronize_session=False))
+
+
+def has_character(db: Session) -> bool:
+    return db.exec(select(Character.id).limit(1)).first() is not None
+
+
 def get_character(db: Session, id: Optional[int] = None, id_srpg: Optional[int] = None, name: Optional[str] = None):
     if id:
-        character = db.exec(select(Character).where(
-            Character.id == id)).first()
+        character = db.get(Character, id)
     elif id_srpg:
         character = db.exec(select(Character).where(
             Character.id_srpg == id_srpg)).first()
@@ -140,9 +195,11 @@ def get_character(db: Session, id: Optional[int] = None, id_srpg: Optional[int]
     return character
 
 
-def get_characters_db(db: Session, id_user: int):
-    characters = db.exec(select(Character).join(UserCharacterLink).where(
-        UserCharacterLink.id_user == id_user)).all()
+def get_characters_db(db: Session, id_user: int, limit: Optional[int] = None, after: Optional[tuple] = None):
+    statement = select(Character).join(UserCharacterLink).where(UserCharacterLink.id_user == id_user)
+    if after:
+        statement = statement.where(Character.id > after[0])
+    characters = db.exec(statement.order_by(Character.id).limit(limit)).all()
     return characters
 
 
@@ -192,10 +249,21 @@ def get_missions(db: Session, rank: Optional[str] = None, village: Optional[str]
     return missions
 
 
+def get_mission_keys(db: Session):
+    return db.exec(select(Mission.id, Mission.rank, Village.name).join(
+        MissionVillage, MissionVillage.mission_id == Mission.id).join(
+        Village, Village.id == MissionVillage.village_id)).all()
+
+
 def delete_mission(db: Session, id: int):
+    # Imported here, both caches read missions through this module
+    from api.core.mission_graph import invalidate_mission_graph
+    from api.core.mission_index import invalidate_mission_index
     mission = get_mission(db, id)
     db.delete(mission)
     db.commit()
+    invalidate_mission_graph(id)
+    invalidate_mission_index()
     return
 
 # -------------------------------------------------#
@@ -368,39 +436,113 @@ def create_mission_playing(db: Session, mission_data: MissionPlayingCreate):
     db.add(mission)
     db.commit()
     db.refresh(mission)
+    invalidate_user(mission.user_id)
     return mission
 
 
 def get_mission_playing(db: Session, user: Optional[User] = None, character: Optional['Character'] = None) -> Mission:
     if user:
         mission = db.exec(select(MissionPlaying).where(
-            MissionPlaying.user == user)).first()
+            MissionPlaying.user_id == user.id)).first()
     elif character:
         mission = db.exec(select(MissionPlaying).where(
             Mission.character == character)).first()
     return mission
 
 
+def get_mission_playing_by_id(db: Session, character_id: int, mission_id: int) -> Optional[MissionPlaying]:
+    return db.get(MissionPlaying, (character_id, mission_id))
+
+
+def get_active_game(db: Session, user_id: int) -> Optional[ActiveGame]:
+    # Load the game, its mission and its character in one round trip
+    row = db.exec(select(MissionPlaying, Mission, Character).join(
+        Mission, Mission.id == MissionPlaying.mission_id).join(
+        Character, Character.id == MissionPlaying.character_id).where(
+        MissionPlaying.user_id == user_id)).first()
+    if not row:
+        return None
+    mission_playing, mission, character = row
+    # The identity map only holds weak references, keep the rows alive so later gets in the request are free
+    db.info['active_game'] = row
+    return ActiveGame(**mission_playing.dict(),
+                      mission=GameMission(**mission.dict()),
+                      character=GameCharacter(**character.dict()))
+
+
+def get_mission_playing_end_time(db: Session, user_id: int) -> Optional[datetime]:
+    return db.exec(select(MissionPlaying.end_time).where(MissionPlaying.user_id == user_id)).first()
+
+
+def backfill_mission_playing_end_time(db: Session, rank_hours: dict) -> int:
+    # Games started before end_time was stored
+    rows = db.exec(select(MissionPlaying, Mission.rank).join(Mission, Mission.id == MissionPlaying.mission_id).where(
+        MissionPlaying.end_time == None)).all()  # noqa: E711
+    for mission_playing, rank in rows:
+        mission_playing.end_time = (mission_playing.begin_time + timedelta(hours=rank_hours[rank])
+                                    + timedelta(minutes=mission_playing.additionnal_time))
+    db.commit()
+    return len(rows)
+
+
 def update_mission_playing(
         db: Session, mission_playing: MissionPlaying, percent_choice: Optional[int] = None,
-        step: Optional['Step'] = None,
-        additional_time: Optional[int] = None, last_choice: Optional['Choice'] = None) -> Mission:
-    mission_playing.step = step
+        step_id: Optional[int] = None,
+        additional_time: Optional[int] = None, last_choice_id: Optional[int] = None) -> Mission:
+    mission_playing.step_id = step_id
     if percent_choice:
         mission_playing.percent_choice = percent_choice
     if additional_time:
         mission_playing.additionnal_time += additional_time
-    if last_choice:
-        mission_playing.last_choice_id = last_choice.id
+        mission_playing.end_time += timedelta(minutes=additional_time)
+    if last_choice_id:
+        mission_playing.last_choice_id = last_choice_id
     db.commit()
     db.refresh(mission_playing)
     return mission_playing
 
 
-def delete_mission_playing_db(db: Session, mission_playing: MissionPlaying) -> None:
-    db.delete(mission_playing)
-    db.commit()
-    return
+def get_expired_games(db: Session, now: datetime, limit: int) -> list:
+    # Range scan on the end_time index. Only games whose last choice has a finality are over, filtered before the
+    # limit so the games abandoned mid-mission never fill the batch
+    is_final_choice = select(Finality.id).where(Finality.choice_id == MissionPlaying.last_choice_id).exists()
+    return db.exec(select(MissionPlaying, Mission, Character).join(
+        Mission, Mission.id == MissionPlaying.mission_id).join(
+        Character, Character.id == MissionPlaying.character_id).where(
+        MissionPlaying.end_time <= now, is_final_choice).order_by(
+        MissionPlaying.end_time).limit(limit)).all()
+
+
+def create_mission_result(db: Session, mission_result: MissionResult, commit: bool = True) -> MissionResult:
+    db.add(mission_result)
+    if commit:
+        db.commit()
+    return mission_result
+
+
+def pop_mission_result(db: Session, user_id: int) -> Optional[MissionResult]:
+    mission_result = db.exec(select(MissionResult).where(MissionResult.user_id == user_id).order_by(
+        MissionResult.id).limit(1)).first()
+    if mission_result:
+        db.delete(mission_result)
+        db.commit()
+    return mission_result
+
+
+def delete_mission_playing_db(db: Session, mission_playing: MissionPlaying, commit: bool = True) -> bool:
+    # Without commit, the caller invalidates the user once its transaction is committed.
+    # False when the game was already deleted, by the player or by the expired games sweep
+    user_id = mission_playing.user_id
+    deleted = db.execute(delete(MissionPlaying).where(
+        MissionPlaying.character_id == mission_playing.character_id,
+        MissionPlaying.mission_id == mission_playing.mission_id).execution_options(synchronize_session=False))
+    if deleted.rowcount == 0:
+        return False
+    db.expunge(mission_playing)
+    if commit:
+        db.commit()
+        invalidate_user(user_id)
+    return True
 
 
 # def get_missions(db: Session, offset: int, limit: int, desc: bool, user: Optional[User] = None):
@@ -434,27 +576,199 @@ def create_rank_stat(db: Session, rank: str) -> RankStat:
 
 
 def get_rank_stat(db: Session, character: Character, rank: str):
-    return db.exec(select(RankStat).where(Character.id == character.id, RankStat.rank == rank)).first()
+    return db.exec(select(RankStat).join(
+        CharacterMissionStat, CharacterMissionStat.mission_rank_id == RankStat.id).where(
+        CharacterMissionStat.character_id == character.id, RankStat.rank == rank)).first()
 
 
 def update_rank_stat(
-        db: Session, character: Character, rank: str, win: Optional[int] = None, fail: Optional[int] = None):
-    rank_db = get_rank_stat(db, character, rank)
-    if win is not None:
-        rank_db.win += 1
-    if fail is not None:
-        rank_db.fail += 1
-    db.commit()
-    db.refresh(rank_db)
-    return rank_db
+        db: Session, character_id: int, rank: str, win: int = 0, fail: int = 0, commit: bool = True) -> None:
+    # Incremented by the database, without reading the row first
+    rank_stat_id = select(CharacterMissionStat.mission_rank_id).where(
+        CharacterMissionStat.character_id == character_id)
+    db.execute(update(RankStat).where(RankStat.rank == rank, RankStat.id.in_(rank_stat_id)).values(
+        win=RankStat.win + win, fail=RankStat.fail + fail).execution_options(synchronize_session=False))
+    update_leaderboard(db, character_id, rank, win=win, fail=fail)
+    if commit:
+        db.commit()
 
 
 # -------------------------------------------------#
 #               4.2.Mission Admin Stats            #
 # -------------------------------------------------#
 
-def create_stat_admin_mission(db: Session, data: StatAdminMissionBase):
+def create_stat_admin_mission(db: Session, data: StatAdminMissionBase, commit: bool = True):
     stat = StatAdminMission.parse_obj(data)
     db.add(stat)
-    db.commit()
+    update_stat_admin_rollup(db, stat)
+    if commit:
+        db.commit()
     return stat
+
+
+def update_stat_admin_rollup(db: Session, stat: StatAdminMission) -> None:
+    key = (StatAdminMissionRollup.mission_name == stat.mission_name,
+           StatAdminMissionRollup.mission_rank == stat.mission_rank,
+           StatAdminMissionRollup.mission_village == stat.mission_village)
+    values = dict(count=StatAdminMissionRollup.count + 1,
+                  win=StatAdminMissionRollup.win + (1 if stat.result == 'win' else 0),
+                  sum_percent_character=StatAdminMissionRollup.sum_percent_character + stat.percent_character,
+                  sum_percent_choice=StatAdminMissionRollup.sum_percent_choice + stat.percent_choice)
+    statement = update(StatAdminMissionRollup).where(*key).values(**values).execution_options(
+        synchronize_session=False)
+    if db.execute(statement).rowcount:
+        return
+    try:
+        # First row of this mission, another worker may insert it at the same time
+        with db.begin_nested():
+            db.add(StatAdminMissionRollup(mission_name=stat.mission_name, mission_rank=stat.mission_rank,
+                                          mission_village=stat.mission_village, count=1,
+                                          win=1 if stat.result == 'win' else 0,
+                                          sum_percent_character=stat.percent_character,
+                                          sum_percent_choice=stat.percent_choice))
+    except IntegrityError:
+        db.execute(statement)
+
+
+def rebuild_stat_admin_rollup(db: Session) -> None:
+    # Full scan of the history, only to fill the rollup of rows written before it existed
+    db.execute(StatAdminMissionRollup.__table__.delete())
+    rows = db.exec(select(StatAdminMission.mission_name, StatAdminMission.mission_rank,
+                          StatAdminMission.mission_village, func.count(),
+                          func.sum(case((StatAdminMission.result == 'win', 1), else_=0)),
+                          func.sum(StatAdminMission.percent_character),
+                          func.sum(StatAdminMission.percent_choice)).group_by(
+        StatAdminMission.mission_name, StatAdminMission.mission_rank, StatAdminMission.mission_village)).all()
+    db.add_all([StatAdminMissionRollup(mission_name=name, mission_rank=rank, mission_village=village, count=count,
+                                       win=win, sum_percent_character=percent_character,
+                                       sum_percent_choice=percent_choice)
+                for name, rank, village, count, win, percent_character, percent_choice in rows])
+    db.commit()
+
+
+def has_stat_admin_rollup(db: Session) -> bool:
+    return db.exec(select(StatAdminMissionRollup.id).limit(1)).first() is not None
+
+
+def has_stat_admin_mission(db: Session) -> bool:
+    return db.exec(select(StatAdminMission.id).limit(1)).first() is not None
+
+
+def get_stat_admin_rollup(db: Session, group_by: List[str], rank: Optional[str] = None,
+                          village: Optional[str] = None, limit: Optional[int] = None,
+                          after: Optional[tuple] = None) -> list:
+    # Keyset on the group columns, as the groups are sorted
+    columns = [getattr(StatAdminMissionRollup, column) for column in group_by]
+    statement = select(*columns,
+                       func.sum(StatAdminMissionRollup.count),
+                       func.sum(StatAdminMissionRollup.win),
+                       func.sum(StatAdminMissionRollup.sum_percent_character),
+                       func.sum(StatAdminMissionRollup.sum_percent_choice)).group_by(*columns).order_by(*columns)
+    if rank:
+        statement = statement.where(StatAdminMissionRollup.mission_rank == rank)
+    if village:
+        statement = statement.where(StatAdminMissionRollup.mission_village == village)
+    if after:
+        statement = statement.where(tuple_(*columns) > tuple_(*after))
+    if limit:
+        statement = statement.limit(limit)
+    return db.exec(statement).all()
+
+
+def iter_stat_admin_missions(db: Session, rank: Optional[str] = None, village: Optional[str] = None,
+                             batch_size: int = 1000) -> Iterator[StatAdminMission]:
+    # Rows are fetched by batch from a server-side cursor, the history is never loaded at once
+    statement = select(StatAdminMission).order_by(StatAdminMission.id)
+    if rank:
+        statement = statement.where(StatAdminMission.mission_rank == rank)
+    if village:
+        statement = statement.where(StatAdminMission.mission_village == village)
+    yield from db.exec(statement.execution_options(yield_per=batch_size))
+
+
+# -------------------------------------------------#
+#               4.3.Leaderboard                    #
+# -------------------------------------------------#
+
+LEADERBOARD_ALL_RANKS = "ALL"
+
+
+def create_leaderboard_entries(db: Session, character_id: int, village: str, ranks: List[str]) -> None:
+    db.add_all([LeaderboardEntry(character_id=character_id, rank=rank, village=village)
+                for rank in [*ranks, LEADERBOARD_ALL_RANKS]])
+
+
+def update_leaderboard(db: Session, character_id: int, rank: str, win: int = 0, fail: int = 0) -> None:
+    db.execute(update(LeaderboardEntry).where(
+        LeaderboardEntry.character_id == character_id,
+        LeaderboardEntry.rank.in_([rank, LEADERBOARD_ALL_RANKS])).values(
+        win=LeaderboardEntry.win + win, fail=LeaderboardEntry.fail + fail).execution_options(
+        synchronize_session=False))
+
+
+def set_leaderboard_village(db: Session, character_id: int, village: str) -> None:
+    db.execute(update(LeaderboardEntry).where(LeaderboardEntry.character_id == character_id).values(
+        village=village).execution_options(synchronize_session=False))
+
+
+def set_leaderboard_villages(db: Session, villages: Dict[int, str]) -> None:
+    # One executemany for every character that changed village
+    if villages:
+        table = LeaderboardEntry.__table__
+        db.execute(table.update().where(table.c.character_id == bindparam("b_character_id")).values(
+            village=bindparam("b_village")),
+            [{"b_character_id": character_id, "b_village": village} for character_id, village in villages.items()])
+
+
+def has_leaderboard(db: Session) -> bool:
+    return db.exec(select(LeaderboardEntry.character_id).limit(1)).first() is not None
+
+
+def rebuild_leaderboard(db: Session) -> None:
+    # Full scan of the rank stats, only to fill the leaderboard of characters created before it existed
+    db.execute(LeaderboardEntry.__table__.delete())
+    rows = db.exec(select(Character.id, Character.village, RankStat.rank, RankStat.win, RankStat.fail).join(
+        CharacterMissionStat, CharacterMissionStat.character_id == Character.id).join(
+        RankStat, RankStat.id == CharacterMissionStat.mission_rank_id)).all()
+    totals = {}
+    for character_id, village, rank, win, fail in rows:
+        db.add(LeaderboardEntry(character_id=character_id, rank=rank, village=village, win=win, fail=fail))
+        total_win, total_fail, _ = totals.get(character_id, (0, 0, village))
+        totals[character_id] = (total_win + win, total_fail + fail, village)
+    db.add_all([LeaderboardEntry(character_id=character_id, rank=LEADERBOARD_ALL_RANKS, village=village, win=win,
+                                 fail=fail)
+                for character_id, (win, fail, village) in totals.items()])
+    db.commit()
+
+
+def get_leaderboard(db: Session, rank: str = LEADERBOARD_ALL_RANKS, village: Optional[str] = None, limit: int = 10,
+                    after: Optional[tuple] = None) -> list:
+    # Keyset on (win DESC, character_id), a page after `after` costs the same as the first one
+    statement = select(LeaderboardEntry, Character).join(
+        Character, Character.id == LeaderboardEntry.character_id).where(LeaderboardEntry.rank == rank)
+    if village:
+        statement = statement.where(LeaderboardEntry.village == village)
+    if after:
+        win, character_id = after
+        statement = statement.where(or_(LeaderboardEntry.win < win,
+                                        and_(LeaderboardEntry.win == win,
+                                             LeaderboardEntry.character_id > character_id)))
+    return db.exec(statement.order_by(LeaderboardEntry.win.desc(), LeaderboardEntry.character_id).limit(limit)).all()
+
+
+# -------------------------------------------------#
+#                                                  #
+#               5.Schema                           #
+#                                                  #
+# -------------------------------------------------#
+
+def get_schema_version(db: Session) -> Optional[str]:
+    return db.exec(select(SchemaVersion.version).where(SchemaVersion.id == 1)).first()
+
+
+def set_schema_version(db: Session, version: str) -> None:
+    schema_version = db.get(SchemaVersion, 1) or SchemaVersion(id=1, version=version, migrated_at=datetime.now())
+    schema_version.version = version
+    schema_version.migrated_at = datetime.now()
+    db.add(schema_version)
+    db.commit()
@@ -0,0 +1,99 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.orm import selectinload
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from api.models import MissionPlaying, User, Character, Mission, UserCharacterLink
+from api.schemas import ActiveGame, GameMission, GameCharacter
+
+# -------------------------------------------------#
+#                   MENU                           #
+#                                                  #
+#               1.User                             #
+#               2.Character                        #
+#               3.Mission                          #
+# -------------------------------------------------#
+
+# Async counterparts of the read functions of api.crud used by the routes.
+# Writes go through api.crud with AsyncSession.run_sync, on the same async connection.
+
+# -------------------------------------------------#
+#                                                  #
+#               1.User                             #
+#                                                  #
+# -------------------------------------------------#
+
+
+async def get_user(
+        db: AsyncSession, id: Optional[int] = None, discord_id: Optional[int] = None,
+        token_srpg: Optional[str] = None) -> Optional[User]:
+    user = None
+    if id:
+        user = await db.get(User, id)
+    elif discord_id:
+        user = (await db.exec(select(User).where(User.discord_id == discord_id))).first()
+    elif token_srpg:
+        user = (await db.exec(select(User).where(User.token_srpg == token_srpg))).first()
+    return user
+
+
+# -------------------------------------------------#
+#                                                  #
+#               2.Character                        #
+#                                                  #
+# -------------------------------------------------#
+
+
+async def get_character(
+        db: AsyncSession, id: Optional[int] = None, id_srpg: Optional[int] = None,
+        name: Optional[str] = None) -> Optional[Character]:
+    # Users are loaded eagerly, lazy loading is not available on an async session
+    statement = select(Character).options(selectinload(Character.users))
+    if id:
+        statement = statement.where(Character.id == id)
+    elif id_srpg:
+        statement = statement.where(Character.id_srpg == id_srpg)
+    elif name:
+        statement = statement.where(Character.name == name)
+    else:
+        return None
+    return (await db.exec(statement)).first()
+
+
+async def get_characters_db(
+        db: AsyncSession, id_user: int, limit: Optional[int] = None, after: Optional[tuple] = None):
+    statement = select(Character).join(UserCharacterLink).where(UserCharacterLink.id_user == id_user)
+    if after:
+        statement = statement.where(Character.id > after[0])
+    return (await db.exec(statement.order_by(Character.id).limit(limit))).all()
+
+
+# -------------------------------------------------#
+#                                                  #
+#               3.Mission                          #
+#                                                  #
+# -------------------------------------------------#
+
+
+async def get_mission_playing(db: AsyncSession, user: User) -> Optional[MissionPlaying]:
+    return (await db.exec(select(MissionPlaying).where(MissionPlaying.user_id == user.id))).first()
+
+
+async def get_mission_playing_end_time(db: AsyncSession, user_id: int) -> Optional[datetime]:
+    return (await db.exec(select(MissionPlaying.end_time).where(MissionPlaying.user_id == user_id))).first()
+
+
+async def get_active_game(db: AsyncSession, user_id: int) -> Optional[ActiveGame]:
+    row = (await db.exec(select(MissionPlaying, Mission, Character).join(
+        Mission, Mission.id == MissionPlaying.mission_id).join(
+        Character, Character.id == MissionPlaying.character_id).where(
+        MissionPlaying.user_id == user_id))).first()
+    if not row:
+        return None
+    mission_playing, mission, character = row
+    db.info['active_game'] = row
+    return ActiveGame(**mission_playing.dict(),
+                      mission=GameMission(**mission.dict()),
+                      character=GameCharacter(**character.dict()))
@@ -1,14 +1,22 @@
-from fastapi import Body, HTTPException, Header, status, Depends, Security
+from datetime import datetime
+from typing import Optional
+
+from fastapi import Body, HTTPException, Header, Query, status, Depends, Security
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from jose import jwt
 
-from config import get_settings, Settings
-from tests.conftest import engine_test
-from api.core.database import engine
+from config import get_settings
+from api.core.database import engine, async_engine
 
-from api.crud import get_user, get_character
+from api import crud_async
+from api.crud import get_user, get_character, get_mission_playing, get_active_game, get_mission_playing_end_time
 from api.models import User, Character
+from api.schemas import ActiveGame, CurrentUser
+from api.core.auth_cache import get_auth_cache, invalidate_user
+from api.core.pagination import Pagination, decode_cursor
+from api.core.roster_refresher import get_roster_refresher
 
 
 # -------------------------------------------------#
@@ -28,45 +36,35 @@ from api.models import User, Character
 
 
 def get_session():
-    settings: Settings = get_settings()
-    if settings.is_test():
-        with Session(engine_test) as session:
-            try:
-                yield session
-            except Exception:
-                session.rollback()
-                raise
-    else:
-        with Session(engine) as session:
-            try:
-                yield session
-            except Exception:
-                session.rollback()
-                raise
+    # The engine is built once for the active environment (see api.core.database)
+    with Session(engine) as session:
+        try:
+            yield session
+        except Exception:
+            session.rollback()
+            raise
 
 
-async def pagination_parameters(desc: bool = False, skip: int = 0, limit: int = 10):
-    if desc:
-        desc = "DESC"
-    else:
-        desc = ""
-    if skip < 0:
-        skip = 0
-    if limit <= 0:
-        limit = 10
-    if skip >= limit:
-        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=[
-            {
-                "loc": [
-                    "body",
-                    "pagination_dependencies",
-                    "skip / limit"
-                ],
-                "msg": "value is not a valid sort",
-                "type": "value_error"
-            }
-        ])
-    return {"skip": skip, "limit": limit, "desc": desc}
+async def get_async_session():
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        try:
+            yield session
+        except Exception:
+            await session.rollback()
+            raise
+
+
+def make_pagination_parameters(*key_types: type):
+    # `key_types` are the types of the sort key of the listing, the cursor is checked against them
+    async def pagination_parameters(limit: int = Query(10, ge=1, le=100),
+                                    cursor: Optional[str] = None) -> Pagination:
+        return Pagination(limit=limit, after=decode_cursor(cursor, key_types))
+    return pagination_parameters
+
+
+# Characters by id, leaderboards by (win, character id)
+character_pagination = make_pagination_parameters(int)
+leaderboard_pagination = make_pagination_parameters(int, int)
 
 
 # -------------------------------------------------#
@@ -81,30 +79,92 @@ credentials_exception = HTTPException(
     headers={"srpg-token": "Bearer"},
 )
 
+srpg_unavailable_exception = HTTPException(
+    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    detail="SRPG Unavailable",
+)
+
 oauth_schema = HTTPBearer()
 
 
+def decode_bot_token(token: str):
+    try:
+        settings = get_settings()
+        payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm_hash])
+        discord_id = payload.get("discord_id")
+        if discord_id is None:
+            raise credentials_exception
+    except jwt.JWTError:
+        raise credentials_exception
+    return discord_id, payload.get("exp")
+
+
+def make_current_user(user: User, has_mission: bool) -> CurrentUser:
+    return CurrentUser(id=user.id, discord_id=user.discord_id, token_srpg=user.token_srpg, role=user.role,
+                       has_mission=has_mission)
+
+
+def track_activity(current_user: CurrentUser) -> CurrentUser:
+    # Active users get their SRPG characters refreshed in the background
+    roster_refresher = get_roster_refresher()
+    if roster_refresher is not None and current_user.token_srpg:
+        roster_refresher.touch(current_user.id, current_user.token_srpg)
+    return current_user
+
+
 def get_current_user(
         token: HTTPAuthorizationCredentials = Security(oauth_schema),
         front: str = Header("website"),
-        db: Session = Depends(get_session)):
+        db: Session = Depends(get_session)) -> CurrentUser:
     token = token.credentials
-    if front == 'bot':
-        try:
-            settings = get_settings()
-            payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm_hash])
-            discord_id = payload.get("discord_id")
-            if discord_id is None:
-                raise credentials_exception
-        except jwt.JWTError:
-            raise credentials_exception
+    auth_cache = get_auth_cache()
+    key = (front == 'bot', token)
+    current_user = auth_cache.get(key)
+    if current_user is not None:
+        return track_activity(current_user)
 
+    expire = None
+    if front == 'bot':
+        discord_id, expire = decode_bot_token(token)
         user = get_user(db, discord_id=discord_id)
-
     else:
         user = get_user(db, token_srpg=token)
     if user is None:
         raise credentials_exception
+
+    current_user = make_current_user(user, get_mission_playing(db, user=user) is not None)
+    auth_cache.set(key, current_user, expire=expire)
+    return track_activity(current_user)
+
+
+async def get_current_user_async(
+        token: HTTPAuthorizationCredentials = Security(oauth_schema),
+        front: str = Header("website"),
+        db: AsyncSession = Depends(get_async_session)) -> CurrentUser:
+    token = token.credentials
+    auth_cache = get_auth_cache()
+    key = (front == 'bot', token)
+    current_user = auth_cache.get(key)
+    if current_user is not None:
+        return track_activity(current_user)
+
+    expire = None
+    if front == 'bot':
+        discord_id, expire = decode_bot_token(token)
+        user = await crud_async.get_user(db, discord_id=discord_id)
+    else:
+        user = await crud_async.get_user(db, token_srpg=token)
+    if user is None:
+        raise credentials_exception
+
+    current_user = make_current_user(user, await crud_async.get_mission_playing(db, user=user) is not None)
+    auth_cache.set(key, current_user, expire=expire)
+    return track_activity(current_user)
+
+
+def check_if_admin(user: CurrentUser = Depends(get_current_user)) -> CurrentUser:
+    if user.role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin only")
     return user
 
 
@@ -118,14 +178,29 @@ def get_current_user(
 def get_my_character_and_user(
         character_name: str = Body(...),
         db: Session = Depends(get_session),
-        user: User = Depends(get_current_user)) -> Character:
+        user: CurrentUser = Depends(get_current_user)) -> Character:
     try:
         character: Character = get_character(db, name=character_name)
     except Exception:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server Error")
+    return check_my_character(user, character)
+
+
+async def get_my_character_and_user_async(
+        character_name: str = Body(...),
+        db: AsyncSession = Depends(get_async_session),
+        user: CurrentUser = Depends(get_current_user_async)) -> Character:
+    try:
+        character: Character = await crud_async.get_character(db, name=character_name)
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server Error")
+    return check_my_character(user, character)
+
+
+def check_my_character(user: CurrentUser, character: Character):
     if not character:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Character Not Found")
-    elif user not in character.users:
+    elif user.id not in [character_user.id for character_user in character.users]:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Character is not yours")
     return {
         'user': user,
@@ -139,7 +214,96 @@ def get_my_character_and_user(
 #                                                  #
 # -------------------------------------------------#
 
-def check_if_mission(user: User = Depends(get_current_user)) -> User:
-    if not user.mission_playing:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Mission Not Found")
+def check_if_mission(user: CurrentUser = Depends(get_current_user), db: Session = Depends(get_session)) -> CurrentUser:
+    # A cached False is stale when the game was started in another worker, checked against the database before a 404
+    if not user.has_mission:
+        try:
+            has_mission = get_mission_playing(db, user=user) is not None
+        except Exception:
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server Error")
+        check_has_mission(user, has_mission)
     return user
+
+
+async def check_if_mission_async(user: CurrentUser = Depends(get_current_user_async),
+                                 db: AsyncSession = Depends(get_async_session)) -> CurrentUser:
+    if not user.has_mission:
+        try:
+            has_mission = await crud_async.get_mission_playing(db, user) is not None
+        except Exception:
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server Error")
+        check_has_mission(user, has_mission)
+    return user
+
+
+def check_has_mission(user: CurrentUser, has_mission: bool) -> None:
+    if not has_mission:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Mission Not Found")
+    invalidate_user(user.id)
+
+
+def get_my_active_game(user: CurrentUser = Depends(check_if_mission),
+                       db: Session = Depends(get_session)) -> ActiveGame:
+    try:
+        game: ActiveGame = get_active_game(db, user.id)
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server Error")
+    return check_active_game(user, game)
+
+
+async def get_my_active_game_async(user: CurrentUser = Depends(check_if_mission_async),
+                                   db: AsyncSession = Depends(get_async_session)) -> ActiveGame:
+    try:
+        game: ActiveGame = await crud_async.get_active_game(db, user.id)
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server Error")
+    return check_active_game(user, game)
+
+
+def get_my_end_time(user: CurrentUser = Depends(check_if_mission), db: Session = Depends(get_session)) -> datetime:
+    # Only the end time of the game, without its mission and character
+    try:
+        end_time = get_mission_playing_end_time(db, user.id)
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server Error")
+    return check_active_game(user, end_time)
+
+
+async def get_my_end_time_async(user: CurrentUser = Depends(check_if_mission_async),
+                                db: AsyncSession = Depends(get_async_session)) -> datetime:
+    try:
+        end_time = await crud_async.get_mission_playing_end_time(db, user.id)
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server Error")
+    return check_active_game(user, end_time)
+
+
+def get_my_game_if_any(user: CurrentUser = Depends(get_current_user),
+                       db: Session = Depends(get_session)) -> Optional[ActiveGame]:
+    # None when the game was already resolved in the background. Always read, the cached has_mission can be stale
+    try:
+        game: ActiveGame = get_active_game(db, user.id)
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server Error")
+    if bool(game) != user.has_mission:
+        invalidate_user(user.id)
+    return game
+
+
+async def get_my_game_if_any_async(user: CurrentUser = Depends(get_current_user_async),
+                                   db: AsyncSession = Depends(get_async_session)) -> Optional[ActiveGame]:
+    try:
+        game: ActiveGame = await crud_async.get_active_game(db, user.id)
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server Error")
+    if bool(game) != user.has_mission:
+        invalidate_user(user.id)
+    return game
+
+
+def check_active_game(user: CurrentUser, game: ActiveGame) -> ActiveGame:
+    if not game:
+        # The cached identity was stale, the mission ended in another worker
+        invalidate_user(user.id)
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Mission Not Found")
+    return game
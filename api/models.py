@@ -3,7 +3,7 @@ from datetime import datetime
 
 from pydantic import EmailStr
 from sqlmodel import SQLModel, Field, BigInteger, Relationship
-from sqlalchemy import Column, table
+from sqlalchemy import Column, Index, table
 
 from api.schemas import CharacterCreate, RankStatBase, StatAdminMissionBase
 
@@ -16,6 +16,7 @@ from api.schemas import CharacterCreate, RankStatBase, StatAdminMissionBase
 #               3.Village                          #
 #               4.Mission                          #
 #               5.Stats                            #
+#               6.Schema                           #
 # -------------------------------------------------#
 
 
@@ -42,6 +43,7 @@ class MissionPlaying(SQLModel, table=True):
     )
 
     begin_time: datetime = Field(default=datetime.now())
+    end_time: Optional[datetime] = Field(default=None, index=True)
     percent_character: int = Field()
     percent_choice: int = Field()
     additionnal_time: int = Field(default=0)
@@ -55,7 +57,23 @@ class MissionPlaying(SQLModel, table=True):
     user: 'User' = Relationship(back_populates="mission_playing")
 
 
+class MissionResult(SQLModel, table=True):
+    # Outcome of a game resolved in the background, kept until the player fetches it
+    __tablename__ = "mission_result"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: Optional[int] = Field(default=None, foreign_key="user.id", index=True)
+    character_id: Optional[int] = Field(default=None, foreign_key="character.id")
+    mission_id: Optional[int] = Field(default=None, foreign_key="mission.id")
+
+    description: str
+    value: str  # win or fail
+    resolved_at: datetime
+
+
 class MissionVillage(SQLModel, table=True):
+    __table_args__ = (Index("ix_missionvillage_mission_id_village_id", "mission_id", "village_id"),)
+
     village_id: Optional[int] = Field(
         default=None, foreign_key="village.id", primary_key=True
     )
@@ -134,6 +152,8 @@ class Village(SQLModel, table=True):
 
 
 class Mission(SQLModel, table=True):
+    __table_args__ = (Index("ix_mission_rank_id", "rank", "id"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
 
     rank: str = Field()
@@ -225,3 +245,51 @@ class RankStat(RankStatBase, table=True):
 
 class StatAdminMission(StatAdminMissionBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True, index=True)
+
+
+class StatAdminMissionRollup(SQLModel, table=True):
+    # Running totals of StatAdminMission per mission, rank and village, updated with every inserted row
+    __tablename__ = "stat_admin_mission_rollup"
+    __table_args__ = (Index("ix_stat_admin_mission_rollup_key", "mission_name", "mission_rank", "mission_village",
+                            unique=True),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+
+    mission_name: str
+    mission_rank: str
+    mission_village: str
+
+    count: int = Field(default=0)
+    win: int = Field(default=0)
+    sum_percent_character: int = Field(default=0)
+    sum_percent_choice: int = Field(default=0)
+
+
+class LeaderboardEntry(SQLModel, table=True):
+    # Wins and fails of a character per rank, and for every rank under "ALL", kept in step with RankStat
+    __tablename__ = "leaderboard"
+    __table_args__ = (Index("ix_leaderboard_rank_win_character_id", "rank", "win", "character_id"),
+                      Index("ix_leaderboard_rank_village_win_character_id", "rank", "village", "win", "character_id"))
+
+    character_id: Optional[int] = Field(default=None, foreign_key="character.id", primary_key=True)
+    rank: str = Field(primary_key=True)
+    village: str
+
+    win: int = Field(default=0)
+    fail: int = Field(default=0)
+
+
+# -------------------------------------------------#
+#                                                  #
+#               6.Schema                           #
+#                                                  #
+# -------------------------------------------------#
+
+
+class SchemaVersion(SQLModel, table=True):
+    # Fingerprint of the models the database was last created and migrated for, a single row
+    __tablename__ = "schema_version"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    version: str
+    migrated_at: datetime
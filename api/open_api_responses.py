@@ -1,5 +1,6 @@
 from typing import Optional
-from api.schemas import Response204, Response400, Response401, Response403, Response404, Response409, Response500
+from api.schemas import (Response204, Response400, Response401, Response403, Response404, Response409, Response500,
+                         Response503)
 
 
 # -------------------------------------------------#
@@ -30,6 +31,15 @@ def open_api_response_error_server(adding_message: Optional[str] = None):
         },
     }
 
+
+def open_api_response_srpg_unavailable():
+    return {
+        503: {
+            "model": Response503,
+            "description": "SRPG is unavailable or failing, retry later"
+        }
+    }
+
 # -------------------------------------------------#
 #                                                  #
 #               1.User                             #
@@ -72,6 +82,19 @@ def open_api_response_invalid_token(adding_message: Optional[str] = None):
     }
 
 
+def open_api_response_admin_only(adding_message: Optional[str] = None):
+    if adding_message:
+        split = "/ "
+    else:
+        split = ""
+    return {
+        403: {
+            "model": Response403,
+            "description": f"Admin only {split}{adding_message if adding_message else ''}"
+        },
+    }
+
+
 # -------------------------------------------------#
 #                                                  #
 #               2.Character                        #
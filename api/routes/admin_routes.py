@@ -0,0 +1,98 @@
+import csv
+import io
+import json
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlmodel import Session
+
+from api.open_api_responses import (open_api_response_admin_only, open_api_response_error_server,
+                                    open_api_response_invalid_token)
+from api.schemas import CurrentUser, EnumRank, EnumStatGroup, Page, StatAdminMissionAggregate, StatAdminMissionBase
+from api.dependencies import check_if_admin, get_session, make_pagination_parameters
+from api.crud import get_stat_admin_rollup, iter_stat_admin_missions
+from api.core.pagination import Pagination
+
+router = APIRouter(tags={"Admin"}, prefix='/admin')
+
+STAT_GROUP_COLUMNS = {
+    EnumStatGroup.mission: ["mission_name", "mission_rank", "mission_village"],
+    EnumStatGroup.rank: ["mission_rank"],
+    EnumStatGroup.village: ["mission_village"],
+}
+EXPORT_COLUMNS = ["id", *StatAdminMissionBase.__fields__]
+
+
+# -------------------------------------------------#
+#                                                  #
+#               1.Mission Stats                    #
+#                                                  #
+# -------------------------------------------------#
+
+async def mission_stat_pagination(group_by: EnumStatGroup = EnumStatGroup.mission,
+                                  limit: int = Query(10, ge=1, le=100), cursor: Optional[str] = None) -> Pagination:
+    # The sort key is the group, one string per column of group_by
+    return await make_pagination_parameters(*[str] * len(STAT_GROUP_COLUMNS[group_by]))(limit, cursor)
+
+
+@router.get('/stats/missions', response_model=Page[StatAdminMissionAggregate],
+            summary="Win rate and average percents of the finished missions",
+            responses={**open_api_response_invalid_token(),
+                       **open_api_response_admin_only(),
+                       **open_api_response_error_server()})
+def get_mission_stats(group_by: EnumStatGroup = EnumStatGroup.mission, rank: Optional[EnumRank] = None,
+                      village: Optional[str] = None, pagination: Pagination = Depends(mission_stat_pagination),
+                      db: Session = Depends(get_session), user: CurrentUser = Depends(check_if_admin)):
+    columns = STAT_GROUP_COLUMNS[group_by]
+    try:
+        rows = get_stat_admin_rollup(db, columns, rank=rank, village=village, limit=pagination.fetch,
+                                     after=pagination.after)
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server Error")
+    page = pagination.make_page(rows, key=lambda row: tuple(row[:len(columns)]))
+    page.items = [make_mission_aggregate(columns, row) for row in page.items]
+    return page
+
+
+def make_mission_aggregate(columns: List[str], row) -> StatAdminMissionAggregate:
+    count, win, sum_percent_character, sum_percent_choice = row[len(columns):]
+    return StatAdminMissionAggregate(**dict(zip(columns, row)),
+                                     count=count,
+                                     win=win,
+                                     fail=count - win,
+                                     win_rate=win / count if count else 0,
+                                     avg_percent_character=sum_percent_character / count if count else 0,
+                                     avg_percent_choice=sum_percent_choice / count if count else 0)
+
+
+@router.get('/stats/missions/export', summary="Export every finished mission as NDJSON or CSV",
+            responses={**open_api_response_invalid_token(),
+                       **open_api_response_admin_only()})
+def export_mission_stats(format: str = "ndjson", rank: Optional[EnumRank] = None, village: Optional[str] = None,
+                         db: Session = Depends(get_session), user: CurrentUser = Depends(check_if_admin)):
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Format is ndjson or csv")
+    stats = iter_stat_admin_missions(db, rank=rank, village=village)
+    if format == "csv":
+        return StreamingResponse(stream_csv(stats), media_type="text/csv",
+                                 headers={"Content-Disposition": "attachment; filename=missions.csv"})
+    return StreamingResponse(stream_ndjson(stats), media_type="application/x-ndjson")
+
+
+def stream_ndjson(stats):
+    for stat in stats:
+        yield json.dumps({column: getattr(stat, column) for column in EXPORT_COLUMNS}) + "\n"
+
+
+def stream_csv(stats):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for stat in stats:
+        writer.writerow([getattr(stat, column) for column in EXPORT_COLUMNS])
+        if buffer.tell() > 64 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
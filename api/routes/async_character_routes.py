@@ -0,0 +1,93 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import List
+
+from api.open_api_responses import (open_api_response_error_server, open_api_response_login,
+                                    open_api_response_not_found_character, open_api_response_srpg_unavailable)
+from api.dependencies import (get_async_session, get_current_user_async, character_pagination,
+                              srpg_unavailable_exception)
+from api import crud_async
+from api.schemas import CharacterBase, CurrentUser, Page
+from api.core.pagination import Pagination
+from api.services import get_characters_from_srpg_async
+from api.core.roster_refresher import get_roster_refresher
+from api.core.srpg_client import SRPG_ERRORS
+from api.routes import character_routes
+
+tags_metadata = character_routes.tags_metadata
+router = APIRouter(tags={"Characters"}, prefix='/characters')
+
+
+@router.patch('/',
+              summary="Update characters of user from SRPG",
+              status_code=status.HTTP_200_OK,
+              response_model=List[CharacterBase],
+              responses={
+                  **open_api_response_login(),
+                  **open_api_response_not_found_character(),
+                  **open_api_response_error_server(),
+                  **open_api_response_srpg_unavailable()
+              })
+async def update_characters(db: AsyncSession = Depends(get_async_session),
+                            user: CurrentUser = Depends(get_current_user_async)):
+    roster_refresher = get_roster_refresher()
+    if roster_refresher is not None and roster_refresher.running and user.token_srpg:
+        try:
+            characters = await crud_async.get_characters_db(db, user.id)
+        except Exception:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server Error")
+        if characters:
+            roster_refresher.request(user.id, user.token_srpg)
+            return characters
+
+    try:
+        list_character_srpg = await get_characters_from_srpg_async(user.token_srpg)
+    except SRPG_ERRORS:
+        raise srpg_unavailable_exception
+
+    return await db.run_sync(character_routes.save_my_characters, user, list_character_srpg)
+
+
+@router.get("/mine",
+            summary="Get all character of a user connected",
+            status_code=status.HTTP_200_OK,
+            response_model=Page[CharacterBase],
+            responses={
+                **open_api_response_login(),
+                **open_api_response_not_found_character(),
+                **open_api_response_error_server()
+            })
+async def get_characters(db: AsyncSession = Depends(get_async_session),
+                         user: CurrentUser = Depends(get_current_user_async),
+                         pagination: Pagination = Depends(character_pagination)):
+    try:
+        characters_list = await crud_async.get_characters_db(db, user.id, limit=pagination.fetch,
+                                                             after=pagination.after)
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server Error")
+
+    return character_routes.make_characters_page(characters_list, pagination)
+
+
+@router.get("/{id}",
+            summary="Get one character of mine by id",
+            status_code=status.HTTP_200_OK,
+            response_model=CharacterBase)
+async def get_one_character(id: int,
+                            db: AsyncSession = Depends(get_async_session),
+                            user: CurrentUser = Depends(get_current_user_async)):
+    return await db.run_sync(lambda session: character_routes.get_one_character(id=id, db=session, user=user))
+
+
+@router.get("/name/{family_name}-{first_name}",
+            summary="Get one character of mine by name",
+            status_code=status.HTTP_200_OK,
+            response_model=CharacterBase)
+async def get_one_character_by_name(family_name: str,
+                                    first_name: str,
+                                    db: AsyncSession = Depends(get_async_session),
+                                    user: CurrentUser = Depends(get_current_user_async)):
+    return await db.run_sync(lambda session: character_routes.get_one_character_by_name(
+        family_name=family_name, first_name=first_name, db=session, user=user))
@@ -0,0 +1,162 @@
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Body, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from api.open_api_responses import (open_api_response_login, open_api_response_not_found_character,
+                                    open_api_response_error_server, open_api_response_already_exist_mission,
+                                    open_api_response_not_found_choice, open_api_response_not_found_mission,
+                                    open_api_response_srpg_unavailable)
+from api.schemas import (FinalResult, MissionPlayingResponse, MissionResponse, EnumRank, StepResponse, TimeLeft,
+                         ActiveGame, CurrentUser)
+from api.dependencies import (check_if_mission_async, get_async_session, get_current_user_async,
+                              get_my_active_game_async, get_my_character_and_user_async, get_my_end_time_async,
+                              get_my_game_if_any_async, srpg_unavailable_exception)
+from api.core.mission_graph import MissionGraph, get_mission_graph
+from api.core.srpg_client import SRPG_ERRORS, get_srpg_client
+from api.routes import mission_routes
+
+# Async mode of the games routes: SRPG calls are awaited, the game logic of mission_routes runs on the
+# async connection through AsyncSession.run_sync
+
+tags_metadata = mission_routes.tags_metadata
+router = APIRouter(tags={"games"}, prefix='/games')
+
+
+@router.post("/start",
+             summary="Start game with a random mission for a character according to the Rank and for the\
+                 character Choice",
+             status_code=status.HTTP_201_CREATED,
+             response_model=MissionPlayingResponse,
+             responses={
+                 **open_api_response_login(),
+                 **open_api_response_not_found_character(),
+                 **open_api_response_error_server(),
+                 **open_api_response_already_exist_mission(),
+                 **open_api_response_srpg_unavailable()
+             })
+async def start_game(rank: EnumRank = Body(...),
+                     user_character: dict = Depends(get_my_character_and_user_async),
+                     db: AsyncSession = Depends(get_async_session)):
+    user = user_character['user']
+    character = user_character['character']
+
+    await db.run_sync(mission_routes.check_no_mission, user)
+    try:
+        character_stat = await get_srpg_client().get_power_async(character.id_srpg, use_cache=False)
+    except SRPG_ERRORS:
+        raise srpg_unavailable_exception
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server Error")
+
+    return await db.run_sync(mission_routes.make_game, rank, user, character, character_stat)
+
+
+@router.get('/in-progress',
+            summary="Get game in progress according to user connect",
+            status_code=status.HTTP_200_OK,
+            response_model=MissionPlayingResponse,
+            responses={
+                **open_api_response_login(),
+                **open_api_response_error_server(),
+                **open_api_response_not_found_mission()
+            })
+async def get_game_in_progress(game: ActiveGame = Depends(get_my_active_game_async),
+                               db: AsyncSession = Depends(get_async_session)):
+    return await db.run_sync(lambda session: mission_routes.get_game_in_progress(game=game, db=session))
+
+
+@router.get('/in-progress/time-left',
+            summary="Get time left in progress game",
+            status_code=status.HTTP_200_OK,
+            response_model=TimeLeft,
+            responses={
+                **open_api_response_login(),
+                **open_api_response_error_server(),
+                **open_api_response_not_found_mission()
+            })
+async def get_game_time_left(end_time: datetime = Depends(get_my_end_time_async)):
+    return mission_routes.get_game_time_left(end_time=end_time)
+
+
+@router.get('/in-progress/result',
+            summary="Get final result of game",
+            status_code=status.HTTP_200_OK,
+            response_model=FinalResult,
+            responses={
+                **open_api_response_login(),
+                **open_api_response_error_server(),
+                **open_api_response_not_found_mission()
+            })
+async def get_game_result(game: Optional[ActiveGame] = Depends(get_my_game_if_any_async),
+                          user: CurrentUser = Depends(get_current_user_async),
+                          db: AsyncSession = Depends(get_async_session)):
+    return await db.run_sync(lambda session: mission_routes.get_game_result(game=game, user=user, db=session))
+
+
+@router.get('/in-progress/events',
+            summary="Stream the end time, then the step changes and the result of the game in progress (SSE)",
+            status_code=status.HTTP_200_OK,
+            response_class=StreamingResponse,
+            responses={
+                **open_api_response_login(),
+                **open_api_response_error_server(),
+                **open_api_response_not_found_mission()
+            })
+async def stream_game_events(user: CurrentUser = Depends(check_if_mission_async),
+                             end_time: datetime = Depends(get_my_end_time_async),
+                             db: AsyncSession = Depends(get_async_session)):
+    await db.close()
+    return mission_routes.make_event_stream(user.id, end_time)
+
+
+@router.get('/step/in-progress',
+            summary="Get the step in mission for an user connecting",
+            status_code=status.HTTP_200_OK,
+            response_model=StepResponse,
+            responses={
+                **open_api_response_login(),
+                **open_api_response_error_server(),
+                **open_api_response_not_found_mission(),
+            })
+async def get_step_game_in_progress(game: ActiveGame = Depends(get_my_active_game_async),
+                                    db: AsyncSession = Depends(get_async_session)):
+    return await db.run_sync(lambda session: mission_routes.get_step_game_in_progress(game=game, db=session))
+
+
+@router.patch('/in-progress/step',
+              summary="Edit which step where are the player during a mission",
+              status_code=status.HTTP_200_OK,
+              responses={
+                  **open_api_response_login(),
+                  **open_api_response_error_server(),
+                  **open_api_response_not_found_mission(),
+                  **open_api_response_not_found_choice(),
+                  **open_api_response_srpg_unavailable()
+              })
+async def edit_position(id_choice: int, game: ActiveGame = Depends(get_my_active_game_async),
+                        db: AsyncSession = Depends(get_async_session)):
+    try:
+        graph: MissionGraph = await db.run_sync(get_mission_graph, game.mission_id)
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server Error")
+    # An invalid choice is refused before any SRPG call, only a choice with stat conditions needs the stats
+    if mission_routes.get_choice_of_step(graph, id_choice, game).thresholds:
+        try:
+            # Warm the stat cache so the choice value is computed without a blocking call
+            await get_srpg_client().get_power_async(game.character.id_srpg)
+        except SRPG_ERRORS:
+            raise srpg_unavailable_exception
+        except Exception:
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server Error")
+    return await db.run_sync(lambda session: mission_routes.edit_position(id_choice=id_choice, game=game, db=session))
+
+
+@router.get('/missions/{id}',
+            summary="Get mission",
+            status_code=status.HTTP_200_OK,
+            response_model=MissionResponse)
+async def read_mission(id: int, game: ActiveGame = Depends(get_my_active_game_async)):
+    return mission_routes.read_mission(id=id, game=game)
@@ -0,0 +1,35 @@
+from typing import Optional
+from fastapi import APIRouter, Body, status, Depends
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from api.open_api_responses import (open_api_response_error_server, open_api_response_invalid_token,
+                                    open_api_response_srpg_unavailable)
+from api.schemas import CurrentUser, UserBase, UserResponse
+from api.dependencies import get_async_session, get_current_user_async, srpg_unavailable_exception
+from api.services import get_characters_from_srpg_async
+from api.routes import user_routes
+from api.core.srpg_client import SRPG_ERRORS
+
+tags_metadata = user_routes.tags_metadata
+router = APIRouter(tags={"Users"}, prefix='/users')
+
+
+@router.post('', response_model=UserResponse, status_code=status.HTTP_201_CREATED, summary="Create a new user",
+             responses={**open_api_response_invalid_token(),
+                        **open_api_response_error_server(),
+                        **open_api_response_srpg_unavailable()})
+async def create_user(token_srpg: str = Body(...), id_discord: Optional[int] = Body(None),
+                      db: AsyncSession = Depends(get_async_session)):
+    token_srpg = token_srpg.strip()
+    await db.run_sync(user_routes.check_token_is_unique, token_srpg)
+
+    try:
+        character_list = await get_characters_from_srpg_async(token_srpg)
+    except SRPG_ERRORS:
+        raise srpg_unavailable_exception
+    return await db.run_sync(user_routes.save_user, token_srpg, id_discord, character_list)
+
+
+@router.get('', response_model=UserBase, status_code=status.HTTP_200_OK, summary="Get user by header")
+async def get_user_by_header(user: CurrentUser = Depends(get_current_user_async)):
+    return UserBase(**user.dict(), mission=user.has_mission)
@@ -4,12 +4,15 @@ from typing import List
 
 
 from api.open_api_responses import (open_api_response_error_server, open_api_response_login,
-                                    open_api_response_not_found_character)
-from api.dependencies import get_session, get_current_user
+                                    open_api_response_not_found_character, open_api_response_srpg_unavailable)
+from api.dependencies import get_session, get_current_user, character_pagination, srpg_unavailable_exception
 from api.models import Character, User
-from api.crud import get_character, get_characters_db
-from api.schemas import CharacterBase
-from api.services import (save_characters, delete_connexion_with_character, get_characters_from_srpg)
+from api.crud import get_character, get_characters_db, get_user
+from api.schemas import CharacterBase, CurrentUser, Page
+from api.core.pagination import Pagination
+from api.services import get_characters_from_srpg, refresh_characters
+from api.core.roster_refresher import get_roster_refresher
+from api.core.srpg_client import SRPG_ERRORS
 
 tags_metadata = [
     {"name": "characters", "description": "Operations with characters.", }]
@@ -23,25 +26,45 @@ router = APIRouter(tags={"Characters"}, prefix='/characters')
               responses={
                   **open_api_response_login(),
                   **open_api_response_not_found_character(),
-                  **open_api_response_error_server()
+                  **open_api_response_error_server(),
+                  **open_api_response_srpg_unavailable()
               })
 def update_characters(db: Session = Depends(get_session),
-                      user: User = Depends(get_current_user)):
+                      user: CurrentUser = Depends(get_current_user)):
+    roster_refresher = get_roster_refresher()
+    if roster_refresher is not None and roster_refresher.running and user.token_srpg:
+        # Answer with the stored characters, the refresher pulls the SRPG account right after
+        try:
+            characters = get_characters_db(db, user.id)
+        except Exception:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server Error")
+        if characters:
+            roster_refresher.request(user.id, user.token_srpg)
+            return characters
+
+    try:
+        list_character_srpg = get_characters_from_srpg(user.token_srpg)
+    except SRPG_ERRORS:
+        raise srpg_unavailable_exception
+
+    return save_my_characters(db, user, list_character_srpg)
 
-    list_character_srpg = get_characters_from_srpg(user.token_srpg)
 
+def save_my_characters(db: Session, user: CurrentUser, list_character_srpg: list):
     if not list_character_srpg:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Character Not Found")
 
     try:
-        list_characters = save_characters(
-            db, user, list_character_srpg, refresh=True)
-        delete_connexion_with_character(
-            db, user, list_character_srpg, list_characters)
+        user_db: User = get_user(db, id=user.id)
+        list_characters = refresh_characters(db, user_db, list_character_srpg)
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server Error")
+    roster_refresher = get_roster_refresher()
+    if roster_refresher is not None and user.token_srpg:
+        roster_refresher.remember(user.id, user.token_srpg, list_character_srpg)
 
     return list_characters
 
@@ -49,25 +72,30 @@ def update_characters(db: Session = Depends(get_session),
 @router.get("/mine",
             summary="Get all character of a user connected",
             status_code=status.HTTP_200_OK,
-            response_model=List[CharacterBase],
+            response_model=Page[CharacterBase],
             responses={
                 **open_api_response_login(),
                 **open_api_response_not_found_character(),
                 **open_api_response_error_server()
             })
 def get_characters(db: Session = Depends(get_session),
-                   user: User = Depends(get_current_user)):
+                   user: CurrentUser = Depends(get_current_user),
+                   pagination: Pagination = Depends(character_pagination)):
     try:
-        characters_list = get_characters_db(db, user.id)
+        characters_list = get_characters_db(db, user.id, limit=pagination.fetch, after=pagination.after)
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server Error")
 
-    if not characters_list:
+    return make_characters_page(characters_list, pagination)
+
+
+def make_characters_page(characters_list: List[Character], pagination: Pagination) -> Page:
+    if not characters_list and pagination.after is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Character Not Found")
 
-    return characters_list
+    return pagination.make_page(characters_list, key=lambda character: (character.id,))
 
 
 @router.get("/{id}",
@@ -76,7 +104,7 @@ def get_characters(db: Session = Depends(get_session),
             response_model=CharacterBase)
 def get_one_character(id: int,
                       db: Session = Depends(get_session),
-                      user: User = Depends(get_current_user)):
+                      user: CurrentUser = Depends(get_current_user)):
     try:
         character: Character = get_character(db, id=id)
     except Exception:
@@ -102,7 +130,7 @@ def get_one_character(id: int,
 def get_one_character_by_name(family_name: str,
                               first_name: str,
                               db: Session = Depends(get_session),
-                              user: User = Depends(get_current_user)):
+                              user: CurrentUser = Depends(get_current_user)):
     try:
         character: Character = get_character(db, name=f"{family_name} {first_name}")
     except Exception:
@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Depends
+
+from api.open_api_responses import open_api_response_admin_only, open_api_response_invalid_token
+from api.schemas import CurrentUser, DatabaseStatus
+from api.dependencies import check_if_admin
+from api.core.database import engine, async_engine, get_pool_status
+
+router = APIRouter(tags={"Internal"}, prefix='/internal')
+
+
+# -------------------------------------------------#
+#                                                  #
+#               1.Database                         #
+#                                                  #
+# -------------------------------------------------#
+
+@router.get('/database', response_model=DatabaseStatus, summary="Connection pool statistics",
+            responses={**open_api_response_invalid_token(),
+                       **open_api_response_admin_only()})
+def get_database_status(user: CurrentUser = Depends(check_if_admin)):
+    return DatabaseStatus(pool=get_pool_status(engine),
+                          async_pool=get_pool_status(async_engine.sync_engine) if async_engine else None)
@@ -0,0 +1,58 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlmodel import Session
+
+from api.open_api_responses import open_api_response_error_server, open_api_response_login
+from api.schemas import CurrentUser, EnumRank, LeaderboardCharacter, Page
+from api.dependencies import get_current_user, get_session, leaderboard_pagination
+from api.crud import LEADERBOARD_ALL_RANKS, get_leaderboard
+from api.core.pagination import Pagination
+
+tags_metadata = [
+    {"name": "leaderboards", "description": "Best characters by wins.", }]
+router = APIRouter(tags={"Leaderboards"}, prefix='/leaderboards')
+
+
+# -------------------------------------------------#
+#                                                  #
+#               1.Leaderboard                      #
+#                                                  #
+# -------------------------------------------------#
+
+@router.get('', response_model=Page[LeaderboardCharacter], summary="Best characters of every village and rank",
+            responses={**open_api_response_login(),
+                       **open_api_response_error_server()})
+def get_global_leaderboard(pagination: Pagination = Depends(leaderboard_pagination),
+                           db: Session = Depends(get_session), user: CurrentUser = Depends(get_current_user)):
+    return make_leaderboard_page(db, LEADERBOARD_ALL_RANKS, None, pagination)
+
+
+@router.get('/villages/{village}', response_model=Page[LeaderboardCharacter], summary="Best characters of a village",
+            responses={**open_api_response_login(),
+                       **open_api_response_error_server()})
+def get_village_leaderboard(village: str, rank: Optional[EnumRank] = None,
+                            pagination: Pagination = Depends(leaderboard_pagination),
+                            db: Session = Depends(get_session), user: CurrentUser = Depends(get_current_user)):
+    return make_leaderboard_page(db, rank or LEADERBOARD_ALL_RANKS, village, pagination)
+
+
+@router.get('/ranks/{rank}', response_model=Page[LeaderboardCharacter],
+            summary="Best characters on the missions of a rank",
+            responses={**open_api_response_login(),
+                       **open_api_response_error_server()})
+def get_rank_leaderboard(rank: EnumRank, pagination: Pagination = Depends(leaderboard_pagination),
+                         db: Session = Depends(get_session), user: CurrentUser = Depends(get_current_user)):
+    return make_leaderboard_page(db, rank, None, pagination)
+
+
+def make_leaderboard_page(db: Session, rank: str, village: Optional[str], pagination: Pagination) -> Page:
+    try:
+        rows = get_leaderboard(db, rank=rank, village=village, limit=pagination.fetch, after=pagination.after)
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server Error")
+    page = pagination.make_page(rows, key=lambda row: (row[0].win, row[0].character_id))
+    page.items = [LeaderboardCharacter(name=character.name, village=entry.village, url_avatar=character.url_avatar,
+                                       rank=entry.rank, win=entry.win, fail=entry.fail)
+                  for entry, character in page.items]
+    return page
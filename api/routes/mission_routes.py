@@ -1,22 +1,29 @@
 from datetime import datetime
-from os import EX_CANTCREAT
-import traceback
+from typing import Optional
 from fastapi import APIRouter, Body, Depends, status, HTTPException, Response
+from fastapi.responses import StreamingResponse
 from sqlmodel import Session
-from api.crud import (create_mission_playing, create_stat_admin_mission, delete_mission_playing_db, edit_character,
-                      get_character, get_choice, get_choice_from_step, get_first_step, get_mission,
-                      get_mission_playing, get_step, update_mission_playing, update_rank_stat)
+from starlette.concurrency import run_in_threadpool
+
+from config import get_settings
+from api.crud import (create_mission_playing, get_character, get_mission, get_mission_playing,
+                      get_mission_playing_by_id, update_mission_playing, pop_mission_result)
+from api.core.mission_graph import ChoiceNode, FinalityNode, MissionGraph, StepNode, get_mission_graph
+from api.core.event_bus import get_event_bus, stream_events
+from api.core.srpg_client import SRPG_ERRORS
 
 from api.open_api_responses import (open_api_response_login, open_api_response_not_found_character,
                                     open_api_response_error_server, open_api_response_already_exist_mission,
-                                    open_api_response_not_found_choice, open_api_response_not_found_mission)
+                                    open_api_response_not_found_choice, open_api_response_not_found_mission,
+                                    open_api_response_srpg_unavailable)
 from api.schemas import (CharacterBase, FinalResult, MissionPlayingCreate, MissionPlayingResponse, MissionResponse,
-                         EnumRank, StatAdminMissionBase, StepResponse, TimeLeft)
-from api.dependencies import get_my_character_and_user, get_session, check_if_mission
-from api.models import Choice, Finality, Mission, MissionPlaying, Step, User, Character
-from api.services import (MISSION_RANK_PERCENT, get_cash, get_finish_time, check_if_finish_time, get_additional_time,
-                          get_choice_value, get_result_step, get_time_left, get_random_mission,
-                          get_stat_character_from_srpg, make_response_step, make_url_endpoint)
+                         EnumRank, StepResponse, TimeLeft, CurrentUser, ActiveGame)
+from api.dependencies import (check_if_mission, get_current_user, get_my_character_and_user, get_session,
+                              get_my_active_game, get_my_end_time, get_my_game_if_any, srpg_unavailable_exception)
+from api.models import Mission, MissionPlaying, MissionResult, User, Character
+from api.services import (get_finish_time, check_if_finish_time, get_additional_time, get_choice_value,
+                          get_time_left, get_random_mission, get_stat_character_from_srpg, make_response_step,
+                          make_url_endpoint, resolve_game_result)
 
 
 tags_metadata = [
@@ -33,37 +40,51 @@ router = APIRouter(tags={"games"}, prefix='/games')
                  **open_api_response_login(),
                  **open_api_response_not_found_character(),
                  **open_api_response_error_server(),
-                 **open_api_response_already_exist_mission()
+                 **open_api_response_already_exist_mission(),
+                 **open_api_response_srpg_unavailable()
              })
 def start_game(rank: EnumRank = Body(...),
                user_character: dict = Depends(get_my_character_and_user),
                db: Session = Depends(get_session)):
-    user: User = user_character['user']
+    user: CurrentUser = user_character['user']
     character: Character = user_character['character']
 
-    if user.mission_playing:
+    check_no_mission(db, user)
+    try:
+        character_stat = get_stat_character_from_srpg(character, use_cache=False)
+    except SRPG_ERRORS:
+        raise srpg_unavailable_exception
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server Error")
+
+    return make_game(db, rank, user, character, character_stat)
+
+
+def check_no_mission(db: Session, user: CurrentUser) -> None:
+    if get_mission_playing(db, user=user):
         raise HTTPException(status_code=status.HTTP_409_CONFLICT,
                             detail="Mission Already Exist")
 
+
+def make_game(db: Session, rank: EnumRank, user: CurrentUser, character: Character, character_stat: dict):
     try:
         mission_db: Mission = get_random_mission(db, rank, character.village)
     except Exception:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server Error")
     if not mission_db:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No Mission")
+    begin_time = datetime.now()
     try:
         mission_playing: MissionPlaying = create_mission_playing(db, MissionPlayingCreate(
-            mission_id=mission_db.id, character_id=character.id, begin_time=datetime.now(),
-            percent_character=get_stat_character_from_srpg(character)['total'],
-            step_id=get_first_step(db).id, user_id=user.id))
+            mission_id=mission_db.id, character_id=character.id, begin_time=begin_time,
+            end_time=get_finish_time(begin_time, rank, 0), percent_character=character_stat['total'],
+            step_id=get_mission_graph(db, mission_db.id).first_step_id, user_id=user.id))
         mission = get_mission(db, mission_playing.mission_id)
         character = get_character(db, id=mission_playing.character_id)
     except Exception:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server Error")
 
-    end_time = get_finish_time(mission_playing.begin_time,
-                               rank, mission_playing.additionnal_time)
-    return MissionPlayingResponse(time_left=get_time_left(end_time),
+    return MissionPlayingResponse(time_left=get_time_left(mission_playing.end_time),
                                   mission=MissionResponse(
                                       **mission.dict(), village=character.village),
                                   character=CharacterBase(**character.dict()))
@@ -78,27 +99,18 @@ def start_game(rank: EnumRank = Body(...),
                 **open_api_response_error_server(),
                 **open_api_response_not_found_mission()
             })
-def get_game_in_progress(user: User = Depends(check_if_mission), db: Session = Depends(get_session)):
+def get_game_in_progress(game: ActiveGame = Depends(get_my_active_game), db: Session = Depends(get_session)):
     try:
-        mission_playing: MissionPlaying = get_mission_playing(db, user=user)
-        mission_db: Mission = get_mission(db, mission_playing.mission_id)
-        character: Character = get_character(
-            db, id=mission_playing.character_id)
-        finish_choice: bool = False
-        if mission_playing.last_choice and mission_playing.last_choice.finalities:
-            finish_choice: bool = True
+        finish_choice: bool = get_mission_graph(db, game.mission_id).is_final_choice(game.last_choice_id)
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server Error")
 
-    end_time = get_finish_time(mission_playing.begin_time,
-                               mission_db.rank, mission_playing.additionnal_time)
-
     return MissionPlayingResponse(finish_choice=finish_choice,
-                                  time_left=get_time_left(end_time),
+                                  time_left=get_time_left(game.end_time),
                                   mission=MissionResponse(
-                                      **mission_db.dict(), village=character.village),
-                                  character=CharacterBase(**character.dict()))
+                                      **game.mission.dict(), village=game.character.village),
+                                  character=CharacterBase(**game.character.dict()))
 
 
 @router.get('/in-progress/time-left',
@@ -110,17 +122,8 @@ def get_game_in_progress(user: User = Depends(check_if_mission), db: Session = D
                 **open_api_response_error_server(),
                 **open_api_response_not_found_mission()
             })
-def get_game_time_left(user: User = Depends(check_if_mission), db: Session = Depends(get_session)):
-    try:
-        mission_playing = get_mission_playing(db, user=user)
-        mission: Mission = get_mission(db, mission_playing.mission_id)
-    except Exception:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server Error")
-
-    return TimeLeft(
-        time=get_time_left(
-            get_finish_time(mission_playing.begin_time, mission.rank, mission_playing.additionnal_time)))
+def get_game_time_left(end_time: datetime = Depends(get_my_end_time)):
+    return TimeLeft(time=get_time_left(end_time))
 
 
 @router.get('/in-progress/result',
@@ -132,59 +135,54 @@ def get_game_time_left(user: User = Depends(check_if_mission), db: Session = Dep
                 **open_api_response_error_server(),
                 **open_api_response_not_found_mission()
             })
-def get_game_result(user: User = Depends(check_if_mission),
-                    db: Session = Depends(get_session)):
+def get_game_result(game: Optional[ActiveGame] = Depends(get_my_game_if_any),
+                    user: CurrentUser = Depends(get_current_user), db: Session = Depends(get_session)):
+    if game is None:
+        return get_recorded_result(db, user)
     try:
-        mission_playing: MissionPlaying = get_mission_playing(db, user=user)
+        graph: MissionGraph = get_mission_graph(db, game.mission_id)
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server Error")
-    if not mission_playing.last_choice or not mission_playing.last_choice.finalities:
+    if not graph.is_final_choice(game.last_choice_id):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, detail="You need take all choice")
-    try:
-        mission: Mission = get_mission(db, mission_playing.mission_id)
-    except Exception:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server Error")
 
-    if not check_if_finish_time(mission_playing.begin_time, mission.rank, mission_playing.additionnal_time):
+    if not check_if_finish_time(game.end_time):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
                             detail="Time is not over")
     try:
-        finality: Finality = get_result_step(db, mission_playing, mission)
-        character: Character = get_character(
-            db, id=mission_playing.character_id)
+        # Already loaded by get_active_game, these come from the session identity map
+        mission_playing: MissionPlaying = get_mission_playing_by_id(db, game.character_id, game.mission_id)
+        mission: Mission = get_mission(db, game.mission_id)
+        character: Character = get_character(db, id=game.character_id)
+        finality: FinalityNode = resolve_game_result(db, mission_playing, mission, character)
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server Error")
+    if finality is None:
+        # Resolved by the expired games sweep in the meantime
+        return get_recorded_result(db, user)
+
+    return FinalResult(description=finality.description,
+                       value=finality.value,
+                       mission=make_url_endpoint(
+                           'games/missions', game.mission_id),
+                       character=make_url_endpoint('characters', game.character_id))
+
+
+def get_recorded_result(db: Session, user: CurrentUser) -> FinalResult:
     try:
-        delete_mission_playing_db(db, mission_playing)
-        if finality.value == 'win':
-            update_rank_stat(db, character, mission.rank, win=1)
-        else:
-            update_rank_stat(db, character, mission.rank, fail=1)
-        create_stat_admin_mission(db, StatAdminMissionBase(
-            mission_name=mission.title,
-            mission_rank=mission.rank,
-            mission_village=character.village,
-            character_name=character.name,
-            percent_mission=MISSION_RANK_PERCENT[mission.rank],
-            percent_character=mission_playing.percent_character,
-            percent_choice=mission_playing.percent_choice,
-            result=finality.value
-        ))
-        finality: Finality = get_result_step(db, mission_playing, mission)
-        edit_character(db, character, cash=character.cash + get_cash(character, finality, mission))
-        finality: Finality = get_result_step(db, mission_playing, mission)
+        mission_result: MissionResult = pop_mission_result(db, user.id)
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server Error")
-
-    return FinalResult(**finality.dict(),
-                       mission=make_url_endpoint(
-                           'games/missions', mission_playing.mission_id),
-                       character=make_url_endpoint('characters', mission_playing.character_id))
+    if not mission_result:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Mission Not Found")
+    return FinalResult(description=mission_result.description,
+                       value=mission_result.value,
+                       mission=make_url_endpoint('games/missions', mission_result.mission_id),
+                       character=make_url_endpoint('characters', mission_result.character_id))
 
 
 @router.get('/step/in-progress',
@@ -196,11 +194,11 @@ def get_game_result(user: User = Depends(check_if_mission),
                 **open_api_response_error_server(),
                 **open_api_response_not_found_mission(),
             })
-def get_step_game_in_progress(user: User = Depends(check_if_mission), db: Session = Depends(get_session)):
+def get_step_game_in_progress(game: ActiveGame = Depends(get_my_active_game), db: Session = Depends(get_session)):
     try:
-        mission_playing: MissionPlaying = get_mission_playing(db, user=user)
-        choices = get_choice_from_step(db, step_from=mission_playing.step)
-        step = get_step(db, mission_playing.step_id)
+        graph: MissionGraph = get_mission_graph(db, game.mission_id)
+        step: StepNode = graph.get_step(game.step_id)
+        choices = graph.get_choices_from_step(game.step_id)
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server Error")
@@ -208,7 +206,7 @@ def get_step_game_in_progress(user: User = Depends(check_if_mission), db: Sessio
     if not choices:
         return Response(status_code=status.HTTP_204_NO_CONTENT)
 
-    step_response = make_response_step(db, mission_playing, step, choices)
+    step_response = make_response_step(db, game, step, choices)
 
     return step_response
 
@@ -220,62 +218,81 @@ def get_step_game_in_progress(user: User = Depends(check_if_mission), db: Sessio
                   **open_api_response_login(),
                   **open_api_response_error_server(),
                   **open_api_response_not_found_mission(),
-                  **open_api_response_not_found_choice()
+                  **open_api_response_not_found_choice(),
+                  **open_api_response_srpg_unavailable()
               })
-def edit_position(id_choice: int, user: User = Depends(check_if_mission), db: Session = Depends(get_session)):
+def edit_position(id_choice: int, game: ActiveGame = Depends(get_my_active_game),
+                  db: Session = Depends(get_session)):
     try:
-        mission_playing: MissionPlaying = get_mission_playing(db, user=user)
-        choices = get_choice_from_step(db, step_from=mission_playing.step)
-        print(mission_playing)
-        print(choices)
+        graph: MissionGraph = get_mission_graph(db, game.mission_id)
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server Error")
 
-    list_id = [value.id for value in choices]
-
-    if id_choice not in list_id:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="")
+    choice: ChoiceNode = get_choice_of_step(graph, id_choice, game)
     try:
-        character: Character = get_character(
-            db, mission_playing.character_id)
-        choice: Choice = get_choice(db, id_choice)
-        next_step: Step = get_step(db, choice.step_to_id)
+        mission_playing: MissionPlaying = get_mission_playing_by_id(db, game.character_id, game.mission_id)
+        character: Character = get_character(db, id=game.character_id)
         mission_playing = update_mission_playing(db,
                                                  mission_playing,
                                                  percent_choice=mission_playing.percent_choice + get_choice_value(
                                                      db, choice, character),
-                                                 step=next_step,
+                                                 step_id=choice.step_to_id,
                                                  additional_time=get_additional_time(
                                                      choice),
-                                                 last_choice=choice)
-
+                                                 last_choice_id=choice.id)
+    except SRPG_ERRORS:
+        raise srpg_unavailable_exception
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server Error")
+    get_event_bus().publish(game.user_id, "step", {"step_id": mission_playing.step_id,
+                                                   "end_time": mission_playing.end_time.isoformat(),
+                                                   "finish_choice": graph.is_final_choice(choice.id)})
     return
 
 
+def get_choice_of_step(graph: MissionGraph, id_choice: int, game: ActiveGame) -> ChoiceNode:
+    choice: ChoiceNode = graph.get_choice(id_choice)
+    if not choice or choice.step_from_id != game.step_id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="")
+    return choice
+
+
+@router.get('/in-progress/events',
+            summary="Stream the end time, then the step changes and the result of the game in progress (SSE)",
+            status_code=status.HTTP_200_OK,
+            response_class=StreamingResponse,
+            responses={
+                **open_api_response_login(),
+                **open_api_response_error_server(),
+                **open_api_response_not_found_mission()
+            })
+async def stream_game_events(user: CurrentUser = Depends(check_if_mission),
+                             end_time: datetime = Depends(get_my_end_time), db: Session = Depends(get_session)):
+    # The stream lasts until the result, its connection goes back to the pool first
+    await run_in_threadpool(db.close)
+    return make_event_stream(user.id, end_time)
+
+
+def make_event_stream(user_id: int, end_time: datetime) -> StreamingResponse:
+    bus = get_event_bus()
+    time_left = get_time_left(end_time)
+    first = ("end_time", {"end_time": end_time.isoformat(),
+                          "time_left": time_left.total_seconds() if time_left else 0})
+    events = stream_events(bus, user_id, first, last_event="result",
+                           keepalive=get_settings().game_events_keepalive)
+    return StreamingResponse(events, media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 @router.get('/missions/{id}',
             summary="Get mission",
             status_code=status.HTTP_200_OK,
             response_model=MissionResponse)
-def read_mission(id: int, user: User = Depends(check_if_mission), db: Session = Depends(get_session)):
-    try:
-        mission_playing: MissionPlaying = get_mission_playing(db, user=user)
-        character: Character = get_character(
-            db, id=mission_playing.character_id)
-    except Exception:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server Error")
-
-    if id != mission_playing.mission_id:
+def read_mission(id: int, game: ActiveGame = Depends(get_my_active_game)):
+    if id != game.mission_id:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                             detail="Mission not according to your character")
-    try:
-        mission = get_mission(db, id)
-    except Exception:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server Error")
 
-    return MissionResponse(**mission.dict(), village=character.village)
+    return MissionResponse(**game.mission.dict(), village=game.character.village)
@@ -2,12 +2,15 @@ from typing import Optional
 from fastapi import APIRouter, Body, status, Depends, HTTPException
 from sqlmodel import Session
 
-from api.open_api_responses import open_api_response_error_server, open_api_response_invalid_token
-from api.schemas import UserBase, UserResponse
-from api.dependencies import get_session, get_current_user
+from api.open_api_responses import (open_api_response_error_server, open_api_response_invalid_token,
+                                    open_api_response_srpg_unavailable)
+from api.schemas import CurrentUser, UserBase, UserResponse
+from api.dependencies import get_session, get_current_user, srpg_unavailable_exception
 from api.services import (save_characters, get_characters_from_srpg)
 from api.models import User
 from api.crud import add_connexion_discord, create_user_db, get_user
+from api.core.roster_refresher import get_roster_refresher
+from api.core.srpg_client import SRPG_ERRORS
 
 tags_metadata = [
     {"name": "users", "description": "Operations with users. The **login** logic is also here.", }]
@@ -26,10 +29,21 @@ router = APIRouter(tags={"Users"}, prefix='/users')
 
 @router.post('', response_model=UserResponse, status_code=status.HTTP_201_CREATED, summary="Create a new user",
              responses={**open_api_response_invalid_token(),
-                        **open_api_response_error_server()})
+                        **open_api_response_error_server(),
+                        **open_api_response_srpg_unavailable()})
 def create_user(token_srpg: str = Body(...), id_discord: Optional[int] = Body(None),
                 db: Session = Depends(get_session)):
     token_srpg = token_srpg.strip()
+    check_token_is_unique(db, token_srpg)
+
+    try:
+        character_list = get_characters_from_srpg(token_srpg)
+    except SRPG_ERRORS:
+        raise srpg_unavailable_exception
+    return save_user(db, token_srpg, id_discord, character_list)
+
+
+def check_token_is_unique(db: Session, token_srpg: str) -> None:
     try:
         user = get_user(db, token_srpg=token_srpg)
     except Exception as e:
@@ -40,7 +54,8 @@ def create_user(token_srpg: str = Body(...), id_discord: Optional[int] = Body(No
         raise HTTPException(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="value is not unique")
 
-    character_list = get_characters_from_srpg(token_srpg)
+
+def save_user(db: Session, token_srpg: str, id_discord: Optional[int], character_list: Optional[list]):
     if not character_list:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid Token")
     try:
@@ -49,10 +64,13 @@ def create_user(token_srpg: str = Body(...), id_discord: Optional[int] = Body(No
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server Error")
+    roster_refresher = get_roster_refresher()
+    if roster_refresher is not None:
+        roster_refresher.remember(user.id, token_srpg, character_list)
     return user
 
 
 @router.get('', response_model=UserBase, status_code=status.HTTP_200_OK, summary="Get user by header")
 def get_user_by_header(db: Session = Depends(get_session),
-                       user: User = Depends(get_current_user)):
-    return UserBase(**user.dict(), mission=True if user.mission_playing else False)
+                       user: CurrentUser = Depends(get_current_user)):
+    return UserBase(**user.dict(), mission=user.has_mission)
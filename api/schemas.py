@@ -1,9 +1,10 @@
-from typing import List, Optional
+from typing import Generic, List, Optional, TypeVar
 from datetime import datetime, timedelta
 from enum import Enum
 from pydantic import AnyHttpUrl
 
 from pydantic import BaseModel, EmailStr, validator
+from pydantic.generics import GenericModel
 from sqlmodel import SQLModel, Field
 # -------------------------------------------------#
 #                   MENU                           #
@@ -14,6 +15,7 @@ from sqlmodel import SQLModel, Field
 #               4.Character                        #
 #               5.Mission                          #
 #               6.Stats                            #
+#               7.Internal                         #
 # -------------------------------------------------#
 
 # -------------------------------------------------#
@@ -51,6 +53,18 @@ class Response500(BaseModel):
     detail: str
 
 
+class Response503(BaseModel):
+    detail: str
+
+
+PageItem = TypeVar("PageItem")
+
+
+class Page(GenericModel, Generic[PageItem]):
+    items: List[PageItem]
+    next_cursor: Optional[str] = None
+
+
 # -------------------------------------------------#
 #                                                  #
 #               2.Token                            #
@@ -85,6 +99,17 @@ class UserResponse(SQLModel):
     token_srpg: Optional[str]
 
 
+class CurrentUser(BaseModel):
+    id: int
+    discord_id: Optional[int]
+    token_srpg: Optional[str]
+    role: str
+    has_mission: bool = False
+
+    class Config:
+        frozen = True
+
+
 # -------------------------------------------------#
 #                                                  #
 #               4.Character                        #
@@ -138,6 +163,7 @@ class MissionPlayingCreate(SQLModel):
     mission_id: int
     character_id: int
     begin_time: datetime
+    end_time: datetime
     percent_character: int
     percent_choice: int = 0
     additionnal_time: int = 0
@@ -145,6 +171,51 @@ class MissionPlayingCreate(SQLModel):
     user_id: int
 
 
+class GameMission(BaseModel):
+    id: int
+    rank: str
+    title: str
+    description: str
+    cash: int
+    percent_mission: int
+
+    class Config:
+        frozen = True
+
+
+class GameCharacter(BaseModel):
+    id: int
+    id_srpg: int
+    name: str
+    village: str
+    level: int
+    exp: int
+    cash: int
+    url_avatar: str
+
+    class Config:
+        frozen = True
+
+
+class ActiveGame(BaseModel):
+    user_id: int
+    character_id: int
+    mission_id: int
+    begin_time: datetime
+    end_time: datetime
+    percent_character: int
+    percent_choice: int
+    additionnal_time: int
+    step_id: Optional[int]
+    last_choice_id: Optional[int]
+
+    mission: GameMission
+    character: GameCharacter
+
+    class Config:
+        frozen = True
+
+
 class ChoiceResponse(SQLModel):
     choice_id: int
     sentence: str
@@ -192,3 +263,50 @@ class StatAdminMissionBase(SQLModel):
     percent_choice: int
 
     result: str
+
+
+class EnumStatGroup(str, Enum):
+    mission = "mission"
+    rank = "rank"
+    village = "village"
+
+
+class StatAdminMissionAggregate(BaseModel):
+    mission_name: Optional[str] = None
+    mission_rank: Optional[str] = None
+    mission_village: Optional[str] = None
+
+    count: int
+    win: int
+    fail: int
+    win_rate: float
+    avg_percent_character: float
+    avg_percent_choice: float
+
+
+class LeaderboardCharacter(BaseModel):
+    name: str
+    village: str
+    url_avatar: str
+    rank: str
+    win: int
+    fail: int
+
+
+# -------------------------------------------------#
+#                                                  #
+#               7.Internal                         #
+#                                                  #
+# -------------------------------------------------#
+
+class PoolStatus(BaseModel):
+    size: int
+    checked_in: int
+    checked_out: int
+    overflow: int
+    status: str
+
+
+class DatabaseStatus(BaseModel):
+    pool: PoolStatus
+    async_pool: Optional[PoolStatus] = None
@@ -1,22 +1,28 @@
-
 from datetime import timedelta, datetime
 from math import floor
-from random import randint, shuffle
-from typing import List, Optional
-import requests
-import json
+from typing import Dict, List, Optional, Union
 
 from sqlmodel import Session
-from fastapi_mail import FastMail, MessageSchema
 from pydantic import EmailStr
 from jose import jwt
 
 from config import get_settings, log
 
-from api.schemas import ChoiceResponse, StepResponse, CharacterCreate
-from api.models import Finality, Mission, MissionPlaying, Step, User, Character, Choice
-from api.crud import (create_rank_stat, get_finality_from_choice, get_missions, create_character, get_character,
-                      edit_character)
+from api.schemas import (ActiveGame, ChoiceResponse, StepResponse, CharacterBase, CharacterCreate,
+                         StatAdminMissionBase)
+from api.models import Finality, Mission, MissionPlaying, MissionResult, Step, User, Character, Choice
+from api.crud import (get_mission, get_missions, delete_mission_playing_db,
+                      update_rank_stat, create_stat_admin_mission, add_character_cash, create_mission_result,
+                      get_expired_games, get_characters_to_sync, create_characters, link_characters,
+                      unlink_characters, set_leaderboard_villages)
+from api.core.auth_cache import invalidate_user
+from api.core.counter_buffer import get_counter_buffer
+from api.core.event_bus import get_event_bus
+from api.core.conditions import meets_thresholds
+from api.core.mission_graph import ChoiceNode, FinalityNode, StepNode, get_mission_graph
+from api.core.srpg_client import get_srpg_client
+from api.core.outcome import get_outcome_engine
+from api.core.mission_index import get_random_mission_id, invalidate_mission_index
 
 # -------------------------------------------------#
 #                   MENU                           #
@@ -94,6 +100,8 @@ async def send_email(email_body: str, to_email: List[EmailStr], email_subject: s
     if get_settings().is_dev():
         log.info(email_body)
     else:
+        # Only needed to send mails, not imported with the worker
+        from fastapi_mail import FastMail, MessageSchema
         message = MessageSchema(
             subject=email_subject,
             recipients=to_email,
@@ -142,64 +150,79 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 
 
 def get_characters_from_srpg(token: str):
-    url = requests.get(get_settings().SRPG_URL_CHARACTERS_TOKEN + token)
-    datas = json.loads(url.text)
+    return format_characters_from_srpg(get_srpg_client().get_account(token))
+
+
+async def get_characters_from_srpg_async(token: str):
+    return format_characters_from_srpg(await get_srpg_client().get_account_async(token))
+
+
+def format_characters_from_srpg(datas: list):
     if len(datas) == 0:
         return None
-    else:
-        for data in datas:
-            data['avatar'] = get_settings().SRPG_URL_BASE + data['avatar']
-    return datas
-
-
-def get_stat_character_from_srpg(character):
-    url = requests.get(
-        f"{get_settings().SRPG_URL_MISSION_PERCENT}{character.id_srpg}")
-    datas = json.loads(url.text)
-    return datas
-
-
-def save_characters(db: Session, user: User, list_character: list(), refresh: bool = False) -> List[Character]:
-    character_db_list = []
-    for character in list_character:
-        character_in_db = get_character(db, id_srpg=character['id'])
-        # If character doesn't exist in the database, add it
-        if not character_in_db:
-            rank_stat_lst = []
-            for rank in MISSION_RANK:
-                rank_stat_lst.append(create_rank_stat(db, rank))
-            character_in_db = create_character(db,
-                                               CharacterCreate(id_srpg=character['id'],
-                                                               name=character['name'],
-                                                               url_avatar=character['avatar'],
-                                                               village=character['village']),
-                                               user, rank_stat_lst)
-            character_db_list.append(character_in_db)
-
-        # If character already exist in database, update it and add user connexion
-        else:
-            if not refresh:
-                character_db_list.append(edit_character(
-                    db, character_in_db, village=character['village'], url_avatar=character['avatar'], user=user))
-            else:
-                village = None if character_in_db.village == character[
-                    'village'] else character['village']
-                url_avatar = None if character_in_db.url_avatar == character[
-                    'avatar'] else character['avatar']
-                if village or url_avatar:
-                    character_db_list.append(edit_character(
-                        db, character_in_db, village=village, url_avatar=url_avatar))
-    return character_db_list
+    # The SRPG payload can be shared by concurrent requests, it is not modified
+    return [{**data, 'avatar': get_settings().SRPG_URL_BASE + data['avatar']} for data in datas]
+
+
+def get_stat_character_from_srpg(character, use_cache: bool = True):
+    return get_srpg_client().get_power(character.id_srpg, use_cache=use_cache)
+
+
+def save_characters(db: Session, user: User, list_character: list(), refresh: bool = False) -> List[CharacterBase]:
+    # Diff of the SRPG account against the database keyed by id_srpg, applied in one transaction.
+    # Returns the created and changed characters, a refresh also unlinks the characters gone from the account
+    characters_srpg = {character['id']: character for character in list_character}
+    user_id = user.id if user else None
+    try:
+        known: Dict[int, Character] = {}
+        linked, unlinked = set(), []
+        for character, is_linked in get_characters_to_sync(db, user_id, list(characters_srpg)):
+            if character.id_srpg in characters_srpg:
+                known[character.id_srpg] = character
+                if is_linked:
+                    linked.add(character.id)
+            elif refresh:
+                unlinked.append(character.id)
+
+        updated, villages = [], {}
+        for id_srpg, character in known.items():
+            character_srpg = characters_srpg[id_srpg]
+            if (character.village, character.url_avatar) != (character_srpg['village'], character_srpg['avatar']):
+                if character.village != character_srpg['village']:
+                    villages[character.id] = character_srpg['village']
+                character.village = character_srpg['village']
+                character.url_avatar = character_srpg['avatar']
+                updated.append(character)
+        set_leaderboard_villages(db, villages)
+
+        inserted = create_characters(db, [CharacterCreate(id_srpg=character['id'], name=character['name'],
+                                                          url_avatar=character['avatar'],
+                                                          village=character['village'])
+                                          for id_srpg, character in characters_srpg.items() if id_srpg not in known],
+                                     MISSION_RANK)
+        if user_id is not None:
+            link_characters(db, user_id, [character.id for character in [*inserted, *known.values()]
+                                          if character.id not in linked])
+            unlink_characters(db, user_id, unlinked)
+        # Read before the commit expires them
+        characters = [CharacterBase(**character.dict()) for character in [*inserted, *updated]]
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return characters
+
+
+def refresh_characters(db: Session, user: User, list_character_srpg: list) -> List[CharacterBase]:
+    return save_characters(db, user, list_character_srpg, refresh=True)
 
 
 def delete_connexion_with_character(
         db: Session, user: User, list_character_srpg: list(),
         list_character_db: List[Character]):
-    list_of_all_values = [value for elem in list_character_srpg
-                          for value in elem.values()]
-    for character in list_character_db:
-        if character.name not in list_of_all_values:
-            character.users.remove(user)
+    ids_srpg = {character['id'] for character in list_character_srpg}
+    unlink_characters(db, user.id, [character.id for character in list_character_db
+                                    if character.id_srpg not in ids_srpg])
     db.commit()
     return
 
@@ -210,8 +233,8 @@ def delete_connexion_with_character(
 #                                                  #
 # -------------------------------------------------#
 
-def check_if_finish_time(begin_time, rank, additionnal_time) -> bool:
-    if datetime.now() < (begin_time + timedelta(hours=MISSION_RANK_TIME[rank]) + timedelta(minutes=additionnal_time)):
+def check_if_finish_time(end_time) -> bool:
+    if datetime.now() < end_time:
         return False
     return True
 
@@ -230,11 +253,16 @@ def get_time_left(finish_time):
 def get_random_mission(db: Session, rank: str, village: str) -> Mission:
     if village == "Nukenin":
         village = "Errant"
-    missions = get_missions(db, rank, village)
-    if not missions:
+    mission_id = get_random_mission_id(db, rank, village)
+    if mission_id is None:
         return None
-    size_max = len(missions)
-    return missions[randint(0, size_max - 1)]
+    mission = get_mission(db, mission_id)
+    if not mission:
+        # Mission deleted since the index was built
+        invalidate_mission_index()
+        mission_id = get_random_mission_id(db, rank, village)
+        mission = get_mission(db, mission_id) if mission_id is not None else None
+    return mission
 
 
 def get_percent_final(percent_mission, percent_character, percent_choice) -> int:
@@ -252,22 +280,85 @@ def get_percent_final(percent_mission, percent_character, percent_choice) -> int
 
 
 def win_or_loose(percent) -> str:
-    total_choice = 100
-    lst_result_win = ["win"] * percent
-    lst_result__loose = ["fail"] * (total_choice - percent)
-    result = lst_result_win + lst_result__loose
-    shuffle(result)
-    return result[randint(0, total_choice - 1)]
+    return get_outcome_engine().draw(percent)
 
 
-def get_result_step(db: Session, mission_playing: MissionPlaying, mission: Mission):
-    percent_final = get_percent_final(
-        mission.percent_mission, mission_playing.percent_character, mission_playing.percent_choice)
-    result = win_or_loose(percent_final)
-    return get_finality_from_choice(db, mission_playing.last_choice, result)
+def win_or_loose_many(percents: List[int]) -> List[str]:
+    return get_outcome_engine().draw_many(percents)
 
 
-def make_response_step(db: Session, mission_playing: MissionPlaying, step: Step, choices: List[Choice]) -> StepResponse:
+def get_mission_result(mission_playing: MissionPlaying, mission: Mission) -> str:
+    # Drawn once per game: resolve_game_result deletes the game in the same transaction, a retry finds it gone
+    percent_final = get_percent_final(
+        mission.percent_mission, mission_playing.percent_character, mission_playing.percent_choice)
+    return win_or_loose(percent_final)
+
+
+def get_result_step(db: Session, mission_playing: MissionPlaying, mission: Mission) -> FinalityNode:
+    result = get_mission_result(mission_playing, mission)
+    last_choice = get_mission_graph(db, mission.id).get_choice(mission_playing.last_choice_id)
+    return last_choice.finalities.get(result)
+
+
+def resolve_game_result(
+        db: Session, mission_playing: MissionPlaying, mission: Mission, character: Character,
+        record: bool = False) -> Optional[FinalityNode]:
+    # Every write of a result is applied in one transaction, a failure leaves the game as it was.
+    # None when the game was resolved concurrently, record keeps the outcome for the player to fetch later
+    user_id, character_id, rank = mission_playing.user_id, character.id, mission.rank
+    counter_buffer = get_counter_buffer()
+    try:
+        # Deleted first: the row lock makes a concurrent resolution of the same game wait, then match nothing
+        if not delete_mission_playing_db(db, mission_playing, commit=False):
+            db.rollback()
+            return None
+        finality = get_result_step(db, mission_playing, mission)
+        win, fail = (1, 0) if finality.value == 'win' else (0, 1)
+        cash = get_cash(character, finality, mission)
+        if record:
+            create_mission_result(db, MissionResult(
+                user_id=user_id, character_id=character_id, mission_id=mission.id,
+                description=finality.description, value=finality.value, resolved_at=datetime.now()), commit=False)
+        if counter_buffer is None:
+            update_rank_stat(db, character_id, rank, win=win, fail=fail, commit=False)
+            add_character_cash(db, character_id, cash, commit=False)
+        create_stat_admin_mission(db, StatAdminMissionBase(
+            mission_name=mission.title,
+            mission_rank=mission.rank,
+            mission_village=character.village,
+            character_name=character.name,
+            percent_mission=MISSION_RANK_PERCENT[mission.rank],
+            percent_character=mission_playing.percent_character,
+            percent_choice=mission_playing.percent_choice,
+            result=finality.value
+        ), commit=False)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    if counter_buffer is not None:
+        counter_buffer.add_rank_stat(character_id, rank, win=win, fail=fail)
+        counter_buffer.add_cash(character_id, cash)
+    invalidate_user(user_id)
+    get_event_bus().publish(user_id, "result", {"value": finality.value, "description": finality.description})
+    return finality
+
+
+def resolve_expired_games(db: Session, batch_size: int) -> int:
+    # Games whose time is over and whose last choice is final, each one in its own transaction
+    resolved = 0
+    for mission_playing, mission, character in get_expired_games(db, datetime.now(), batch_size):
+        try:
+            if resolve_game_result(db, mission_playing, mission, character, record=True):
+                resolved += 1
+        except Exception as err:
+            log.error(f"Expired game of character {character.id} not resolved: {err}")
+    return resolved
+
+
+def make_response_step(
+        db: Session, mission_playing: Union[MissionPlaying, ActiveGame], step: StepNode,
+        choices: List[ChoiceNode]) -> StepResponse:
     choice_lst_responses = []
     if choices:
         for choice in choices:
@@ -283,28 +374,21 @@ def make_response_step(db: Session, mission_playing: MissionPlaying, step: Step,
     return step_response
 
 
-def get_choice_value(db: Session, choice: Choice, character: Character):
-    character_stat = get_stat_character_from_srpg(character)
-    condition_ok = True
-    for condition in choice.conditions:
-        if condition.type != "Time":
-            value_character = character_stat['details'][condition.type]['niveau']
-            if value_character < condition.value:
-                condition_ok = False
-    if not condition_ok:
+def get_choice_value(db: Session, choice: ChoiceNode, character: Character):
+    # Without stat condition the SRPG stats are not needed
+    if not choice.thresholds:
+        return choice.value
+    if not meets_thresholds(get_srpg_client().get_power_vector(character.id_srpg), choice.thresholds):
         return choice.value * -1
     else:
         return choice.value
 
 
-def get_additional_time(choice: Choice):
-    for condition in choice.conditions:
-        if condition.type == "Time":
-            return condition.value
-    return 0
+def get_additional_time(choice: ChoiceNode):
+    return choice.additional_time
 
 
-def get_cash(character: Character, finality: Finality, mission: Mission):
+def get_cash(character: Character, finality: FinalityNode, mission: Mission):
     value_base = MISSION_REWARD[mission.rank]
     if finality.cash == 0:
         return value_base
@@ -0,0 +1,159 @@
+import argparse
+import asyncio
+import hashlib
+import random
+from typing import List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Query
+from fastapi.responses import JSONResponse
+
+from config import Settings, get_settings
+from benchmarks.stub_srpg import VILLAGES, make_character
+
+# -------------------------------------------------#
+#                   MENU                           #
+#                                                  #
+#               1.Datas                            #
+#               2.Upstream behaviour               #
+#               3.Application                      #
+# -------------------------------------------------#
+
+STAT_TYPES = ["Ninjutsu", "Taijutsu", "Genjutsu", "Kenjutsu", "Fuinjutsu"]
+CITATIONS = ["Je ne reviens jamais sur ma parole", "Un ninja doit voir au-dela de ce qui se voit",
+             "Ceux qui abandonnent leurs amis sont pires que des moins que rien"]
+# Ids of the extra characters of an account, above every player number
+SLOT_STRIDE = 10 ** 7
+
+# -------------------------------------------------#
+#                                                  #
+#               1.Datas                            #
+#                                                  #
+# -------------------------------------------------#
+
+
+def get_player(token: str) -> Optional[int]:
+    # Benchmark tokens keep the player of benchmarks.stub_srpg, any other token gets a stable player from its hash
+    if not token or token.startswith("invalid"):
+        return None
+    if token.startswith("bench-") and token[len("bench-"):].isdigit():
+        return int(token[len("bench-"):])
+    return int(hashlib.sha256(token.encode()).hexdigest()[:5], 16)
+
+
+def make_roster(token: str, size: int) -> List[dict]:
+    player = get_player(token)
+    if player is None:
+        return []
+    roster = [make_character(player)]
+    for slot in range(1, size):
+        roster.append({"id": player + 1 + slot * SLOT_STRIDE, "name": f"Ninja{player}-{slot}",
+                       "village": VILLAGES[(player + slot) % len(VILLAGES)], "avatar": f"/avatar/{player}-{slot}.png"})
+    return roster
+
+
+def make_power(id_srpg: int) -> dict:
+    generator = random.Random(id_srpg)
+    details = {stat_type: {"niveau": generator.randint(0, 10)} for stat_type in STAT_TYPES}
+    return {"total": sum(detail["niveau"] for detail in details.values()), "details": details}
+
+
+def make_last_users(count: int = 10) -> List[dict]:
+    return [make_character(player) for player in range(count)]
+
+
+def make_citations(count: int = 10) -> List[dict]:
+    return [{"id": character["id"], "name": character["name"], "citation": CITATIONS[player % len(CITATIONS)]}
+            for player, character in enumerate(make_last_users(count))]
+
+
+# -------------------------------------------------#
+#                                                  #
+#               2.Upstream behaviour               #
+#                                                  #
+# -------------------------------------------------#
+
+
+class FakeBehaviour:
+    # Latency and failures of the stand-in, in ms and fractions of the calls
+
+    def __init__(self, settings: Settings):
+        self.latency = settings.srpg_fake_latency
+        self.latency_tail = settings.srpg_fake_latency_tail
+        self.error_rate = settings.srpg_fake_error_rate
+        self.slow_rate = settings.srpg_fake_slow_rate
+        self.slow_latency = settings.srpg_fake_slow_latency
+        self.roster_size = settings.srpg_fake_roster_size
+        self.random = random.Random(settings.srpg_fake_seed)
+
+    def delay(self) -> float:
+        if self.slow_rate and self.random.random() < self.slow_rate:
+            return self.slow_latency / 1000
+        tail = self.random.expovariate(1 / self.latency_tail) if self.latency_tail else 0
+        return (self.latency + tail) / 1000
+
+    def fails(self) -> bool:
+        return bool(self.error_rate) and self.random.random() < self.error_rate
+
+
+# -------------------------------------------------#
+#                                                  #
+#               3.Application                      #
+#                                                  #
+# -------------------------------------------------#
+
+
+def create_fake_srpg(settings: Settings) -> FastAPI:
+    app = FastAPI(title="Fake SRPG API")
+    behaviour = FakeBehaviour(settings)
+    app.state.behaviour = behaviour
+
+    @app.get("/api.php")
+    async def api(function: str, tokenAPI: Optional[str] = None, crypt: str = "",
+                  id: Optional[int] = Query(default=None)):
+        delay = behaviour.delay()
+        if delay:
+            await asyncio.sleep(delay)
+        if behaviour.fails():
+            return JSONResponse(status_code=503, content=[])
+        if function == "getAccount":
+            return make_roster(crypt, behaviour.roster_size)
+        if function == "getPower" and id is not None:
+            return make_power(id)
+        if function == "getDerniers":
+            return make_last_users()
+        if function == "getCitations":
+            return make_citations()
+        return JSONResponse(status_code=404, content=[])
+
+    return app
+
+
+def main():
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Serve a local stand-in of the SRPG API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=settings.srpg_fake_latency, help="latency of a call in ms")
+    parser.add_argument("--latency-tail", type=float, default=settings.srpg_fake_latency_tail,
+                        help="mean in ms of an exponential delay added to the latency")
+    parser.add_argument("--error-rate", type=float, default=settings.srpg_fake_error_rate,
+                        help="fraction of the calls answered with a 503")
+    parser.add_argument("--slow-rate", type=float, default=settings.srpg_fake_slow_rate,
+                        help="fraction of the calls answered after --slow-latency")
+    parser.add_argument("--slow-latency", type=float, default=settings.srpg_fake_slow_latency)
+    parser.add_argument("--roster-size", type=int, default=settings.srpg_fake_roster_size,
+                        help="characters of every account")
+    parser.add_argument("--seed", type=int, default=settings.srpg_fake_seed)
+    args = parser.parse_args()
+
+    settings = settings.copy(update={
+        "srpg_fake_latency": args.latency, "srpg_fake_latency_tail": args.latency_tail,
+        "srpg_fake_error_rate": args.error_rate, "srpg_fake_slow_rate": args.slow_rate,
+        "srpg_fake_slow_latency": args.slow_latency, "srpg_fake_roster_size": args.roster_size,
+        "srpg_fake_seed": args.seed})
+    uvicorn.run(create_fake_srpg(settings), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
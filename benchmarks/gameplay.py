@@ -0,0 +1,289 @@
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from typing import Dict, List
+
+import httpx
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import QueuePool
+from sqlmodel import Session, SQLModel, create_engine, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from config import Settings, get_settings
+from main import create_application
+from api.crud import create_village
+from api.dependencies import get_session, get_async_session
+from api.models import Character, MissionPlaying
+from api.core.instrumentation import instrument_engine
+from api.core.mission_importer import import_mission_files, list_mission_files
+from api.core.srpg_client import get_srpg_client
+from benchmarks.stub_srpg import install_stub_srpg, make_character, make_token
+
+# -------------------------------------------------#
+#                   MENU                           #
+#                                                  #
+#               1.Measures                         #
+#               2.Application                      #
+#               3.Player                           #
+#               4.Report                           #
+# -------------------------------------------------#
+
+MISSION_DIRECTORY = f"{os.getcwd()}/data/mission_json"
+
+# -------------------------------------------------#
+#                                                  #
+#               1.Measures                         #
+#                                                  #
+# -------------------------------------------------#
+
+class Measures:
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.queries: Dict[str, List[int]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def add(self, endpoint: str, latency: float, queries: int, error: bool) -> None:
+        self.latencies.setdefault(endpoint, []).append(latency)
+        self.queries.setdefault(endpoint, []).append(queries)
+        if error:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+
+def percentile(values: List[float], percent: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(percent / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+# -------------------------------------------------#
+#                                                  #
+#               2.Application                      #
+#                                                  #
+# -------------------------------------------------#
+
+
+def make_engines(settings: Settings, path: str, pool_size: int, concurrency: int):
+    connect_args = {"check_same_thread": False, "timeout": 30}
+    # A request keeps its connection while it waits for a worker thread, the pool can grow up to the concurrency
+    engine = create_engine(f"sqlite:///{path}", connect_args=connect_args, poolclass=QueuePool,
+                           pool_size=pool_size, max_overflow=max(0, concurrency - pool_size))
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}", connect_args={"timeout": 30})
+    for sync_engine in (engine, async_engine.sync_engine):
+        instrument_engine(sync_engine, settings)
+        event.listen(sync_engine, "connect", set_journal_mode)
+    return engine, async_engine
+
+
+def set_journal_mode(connection, record) -> None:
+    # Readers do not wait for the writer, closer to MySQL than the default rollback journal
+    cursor = connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.close()
+
+
+def prepare_database(engine, paths: List[str]) -> None:
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as db:
+        for village in ("Kumo", "Konoha", "Errant"):
+            create_village(db, village)
+    for path, result in import_mission_files(engine, list_mission_files(paths)):
+        if isinstance(result, Exception):
+            raise result
+
+
+def make_application(settings: Settings, engine, async_engine):
+    api = create_application(settings)
+
+    def get_benchmark_session():
+        with Session(engine) as session:
+            try:
+                yield session
+            except Exception:
+                session.rollback()
+                raise
+
+    async def get_benchmark_async_session():
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            try:
+                yield session
+            except Exception:
+                await session.rollback()
+                raise
+
+    api.dependency_overrides[get_session] = get_benchmark_session
+    api.dependency_overrides[get_async_session] = get_benchmark_async_session
+    return api
+
+
+# -------------------------------------------------#
+#                                                  #
+#               3.Player                           #
+#                                                  #
+# -------------------------------------------------#
+
+
+class Player:
+
+    def __init__(self, number: int, client: httpx.AsyncClient, engine, measures: Measures,
+                 semaphore: asyncio.Semaphore):
+        self.number = number
+        self.client = client
+        self.engine = engine
+        self.measures = measures
+        self.semaphore = semaphore
+        self.headers = {"Authorization": f"Bearer {make_token(number)}"}
+
+    async def call(self, endpoint: str, method: str, url: str, **kwargs) -> httpx.Response:
+        async with self.semaphore:
+            begin = time.perf_counter()
+            response = await self.client.request(method, url, headers=self.headers, **kwargs)
+            latency = time.perf_counter() - begin
+        queries = int(response.headers.get("x-db-queries", 0))
+        self.measures.add(endpoint, latency, queries, response.status_code >= 400)
+        return response
+
+    async def create_user(self) -> None:
+        await self.call("create_user", "POST", "/api/users", json={"token_srpg": make_token(self.number)})
+
+    async def play(self, rank: str) -> None:
+        character = make_character(self.number)
+        response = await self.call("start", "POST", "/api/games/start",
+                                   json={"rank": rank, "character_name": character["name"]})
+        if response.status_code != 201:
+            return
+        await self.call("in_progress", "GET", "/api/games/in-progress")
+        while True:
+            response = await self.call("step", "GET", "/api/games/step/in-progress")
+            if response.status_code != 200:
+                break
+            choice = random.choice(response.json()["choices"])
+            response = await self.call("choice", "PATCH", "/api/games/in-progress/step",
+                                       params={"id_choice": choice["choice_id"]})
+            if response.status_code != 200:
+                break
+        await self.call("time_left", "GET", "/api/games/in-progress/time-left")
+        await asyncio.get_running_loop().run_in_executor(None, self.finish_time)
+        await self.call("result", "GET", "/api/games/in-progress/result")
+
+    def finish_time(self) -> None:
+        # Not measured: end the mission timer instead of waiting for it
+        with Session(self.engine) as db:
+            mission_playing = db.exec(select(MissionPlaying).join(Character).where(
+                Character.id_srpg == make_character(self.number)["id"])).first()
+            if not mission_playing:
+                return
+            mission_playing.begin_time -= timedelta(days=1)
+            mission_playing.end_time -= timedelta(days=1)
+            db.add(mission_playing)
+            db.commit()
+
+
+# -------------------------------------------------#
+#                                                  #
+#               4.Report                           #
+#                                                  #
+# -------------------------------------------------#
+
+
+def make_report(measures: Measures, duration: float) -> List[dict]:
+    report = []
+    for endpoint, latencies in measures.latencies.items():
+        queries = measures.queries[endpoint]
+        report.append({
+            "endpoint": endpoint,
+            "count": len(latencies),
+            "errors": measures.errors.get(endpoint, 0),
+            "p50": percentile(latencies, 50) * 1000,
+            "p95": percentile(latencies, 95) * 1000,
+            "p99": percentile(latencies, 99) * 1000,
+            "queries": sum(queries) / len(queries),
+            "throughput": len(latencies) / duration,
+        })
+    return report
+
+
+def print_report(report: List[dict], duration: float) -> None:
+    print(f"{'endpoint':<12} {'count':>7} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'queries':>8} {'req/s':>8}")
+    for line in report:
+        print(f"{line['endpoint']:<12} {line['count']:>7} {line['errors']:>7} {line['p50']:>8.1f} "
+              f"{line['p95']:>8.1f} {line['p99']:>8.1f} {line['queries']:>8.1f} {line['throughput']:>8.1f}")
+    total = sum(line["count"] for line in report)
+    print(f"{total} requests in {duration:.2f}s ({total / duration:.1f} req/s)")
+
+
+async def run(args) -> List[dict]:
+    directory = tempfile.mkdtemp(prefix="benchmark-")
+    settings = get_settings().copy(update={"db_async": args.use_async, "db_instrumentation": True,
+                                           "db_query_headers": True})
+    engine, async_engine = make_engines(settings, os.path.join(directory, "benchmark.sqlite"), args.pool_size,
+                                        args.concurrency)
+    prepare_database(engine, args.missions)
+    # With SRPG_FAKE set the client calls the stand-in served by benchmarks.fake_srpg over HTTP
+    if not settings.srpg_fake:
+        install_stub_srpg(get_srpg_client(), latency=args.srpg_latency / 1000)
+    api = make_application(settings, engine, async_engine)
+
+    measures = Measures()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    transport = httpx.ASGITransport(app=api)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        players = [Player(number, client, engine, measures, semaphore) for number in range(args.players)]
+        await asyncio.gather(*(player.create_user() for player in players))
+        if measures.errors.get("create_user"):
+            raise RuntimeError(f"{measures.errors['create_user']} users not created")
+        begin = time.perf_counter()
+        await asyncio.gather(*(player.play(args.rank) for player in players))
+        duration = time.perf_counter() - begin
+
+    await async_engine.dispose()
+    engine.dispose()
+    shutil.rmtree(directory, ignore_errors=True)
+    # Users are created before the clock starts
+    measures.latencies.pop("create_user")
+    report = make_report(measures, duration)
+    print_report(report, duration)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the gameplay loop with concurrent players")
+    parser.add_argument("--players", type=int, default=500, help="number of simulated players")
+    parser.add_argument("--concurrency", type=int, default=50, help="requests in flight at the same time")
+    parser.add_argument("--rank", default="C", help="rank of the missions started by the players")
+    parser.add_argument("--missions", nargs="*", default=[MISSION_DIRECTORY],
+                        help="mission files or directories imported before the run")
+    parser.add_argument("--pool-size", type=int, default=20, help="size of the SQLite connection pool")
+    parser.add_argument("--srpg-latency", type=float, default=0,
+                        help="latency of the stubbed SRPG API in ms, unused with SRPG_FAKE")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="benchmark the async routes")
+    parser.add_argument("--max-p95", type=float, default=None,
+                        help="fail when the p95 latency of an endpoint is over this value in ms")
+    parser.add_argument("--max-queries", type=float, default=None,
+                        help="fail when an endpoint runs more queries per request on average")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    failed = False
+    for line in report:
+        if line["errors"]:
+            failed = True
+            print(f"Erreur : {line['endpoint']} {line['errors']} errors")
+        if args.max_p95 is not None and line["p95"] > args.max_p95:
+            failed = True
+            print(f"Erreur : {line['endpoint']} p95 {line['p95']:.1f}ms > {args.max_p95}ms")
+        if args.max_queries is not None and line["queries"] > args.max_queries:
+            failed = True
+            print(f"Erreur : {line['endpoint']} {line['queries']:.1f} queries > {args.max_queries}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    exit(main())
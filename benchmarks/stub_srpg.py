@@ -0,0 +1,75 @@
+import asyncio
+import json
+import time
+from typing import Callable, Tuple
+
+import httpx
+import requests
+from requests.adapters import BaseAdapter
+
+from config import Settings
+from api.core.srpg_client import SrpgClient
+
+VILLAGES = ["Konoha", "Kumo"]
+POWER = {"total": 10, "details": {"Ninjutsu": {"niveau": 3}}}
+
+
+def make_token(player: int) -> str:
+    return f"bench-{player}"
+
+
+def make_character(player: int) -> dict:
+    return {"id": player + 1, "name": f"Ninja{player}", "village": VILLAGES[player % len(VILLAGES)],
+            "avatar": f"/avatar/{player}.png"}
+
+
+def make_handler(settings: Settings) -> Callable[[str], Tuple[int, object]]:
+    def handle(url: str) -> Tuple[int, object]:
+        if url.startswith(settings.SRPG_URL_CHARACTERS_TOKEN):
+            token = url[len(settings.SRPG_URL_CHARACTERS_TOKEN):]
+            if not token.startswith("bench-"):
+                return 200, []
+            return 200, [make_character(int(token[len("bench-"):]))]
+        if url.startswith(settings.SRPG_URL_MISSION_PERCENT):
+            return 200, POWER
+        return 404, []
+    return handle
+
+
+class StubAdapter(BaseAdapter):
+    # Answer the requests session of SrpgClient without network
+
+    def __init__(self, handle: Callable[[str], Tuple[int, object]], latency: float = 0):
+        super().__init__()
+        self.handle = handle
+        self.latency = latency
+
+    def send(self, request, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        status_code, datas = self.handle(request.url)
+        response = requests.Response()
+        response.status_code = status_code
+        response._content = json.dumps(datas).encode()
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+def install_stub_srpg(client: SrpgClient, latency: float = 0) -> None:
+    handle = make_handler(client.settings)
+
+    async def handle_async(request: httpx.Request) -> httpx.Response:
+        if latency:
+            await asyncio.sleep(latency)
+        status_code, datas = handle(str(request.url))
+        return httpx.Response(status_code, json=datas)
+
+    adapter = StubAdapter(handle, latency)
+    client.session.mount("http://", adapter)
+    client.session.mount("https://", adapter)
+    client._async_client = httpx.AsyncClient(transport=httpx.MockTransport(handle_async))
+    client.invalidate_power()
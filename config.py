@@ -2,8 +2,9 @@ import os
 import logging
 from dotenv import load_dotenv
 
-from pydantic import BaseSettings
+from pydantic import BaseSettings, root_validator
 from functools import lru_cache
+from typing import Optional
 
 import db_config
 
@@ -37,25 +38,121 @@ class Settings(BaseSettings):
     access_token_expire_minutes_mail: int = 60 * 24
     access_token_expire_minutes_login: int = 60
 
+    # AUTHENTICATION CACHE
+    auth_cache_size: int = 10000
+    auth_cache_ttl: int = 60
+
     # DATABASE
     db_user: str = db_config.db_user
     db_password: str = db_config.db_password
     db_host: str = db_config.db_host
     db_port: str = db_config.db_port
     db_name: str = db_config.db_name
+
+    db_user_test: str = db_config.db_user_test
+    db_password_test: str = db_config.db_password_test
+    db_host_test: str = db_config.db_host_test
+    db_port_test: str = db_config.db_port_test
+    db_name_test: str = db_config.db_name_test
+
     db_echo: bool = False
+    db_async: bool = False
+    db_async_driver: str = 'aiomysql'
+
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout: int = 30
+    db_pool_recycle: int = 60 * 30
+    db_pool_pre_ping: bool = True
+    db_statement_timeout: Optional[int] = None  # milliseconds
+    db_isolation_level: Optional[str] = None
+
+    # Schema creation, migrations and seeding are skipped when the stored schema version matches the models
+    db_schema_marker: bool = True
+
+    db_instrumentation: bool = True
+    db_query_headers: bool = True
+    db_query_log: bool = False
+    db_slow_query_ms: int = 200
+    db_n_plus_one_threshold: int = 5
 
     # SRPG
     TOKEN_API_SRPG = os.getenv("TOKEN_API_SRPG")
     SRPG_URL_BASE = "https://shinobi-rpg.ovh"
-    SRPG_URL_BASE_PROFILE = SRPG_URL_BASE + "/profil-"
-    SRPG_URL_API_LAST_USER = f"{SRPG_URL_BASE}/api.php?function=getDerniers&tokenAPI={TOKEN_API_SRPG}"
-    SRPG_URL_API_NINDO = f"{SRPG_URL_BASE}/api.php?function=getCitations&tokenAPI={TOKEN_API_SRPG}"
-    SRPG_URL_CHARACTERS_TOKEN = f"{SRPG_URL_BASE}/api.php?function=getAccount&tokenAPI={TOKEN_API_SRPG}&crypt="
-    SRPG_URL_MISSION_PERCENT = f"{SRPG_URL_BASE}/api.php?function=getPower&tokenAPI={TOKEN_API_SRPG}&id="
-
-    def db_url(self):
-        return f"mysql://{self.db_user}:{self.db_password}@{self.db_host}:{self.db_port}/{self.db_name}"
+    # Built from SRPG_URL_BASE by set_srpg_urls
+    SRPG_URL_BASE_PROFILE = ""
+    SRPG_URL_API_LAST_USER = ""
+    SRPG_URL_API_NINDO = ""
+    SRPG_URL_CHARACTERS_TOKEN = ""
+    SRPG_URL_MISSION_PERCENT = ""
+
+    srpg_timeout: float = 5.0
+    srpg_retries: int = 2
+    srpg_pool_size: int = 20
+    srpg_stat_cache_ttl: int = 60 * 15
+    srpg_stat_cache_size: int = 10000
+    # After srpg_breaker_threshold failures in a row the SRPG calls fail at once for srpg_breaker_reset seconds
+    srpg_breaker_threshold: int = 5
+    srpg_breaker_reset: float = 30
+
+    # Local stand-in of the SRPG API (python -m benchmarks.fake_srpg), called instead of SRPG_URL_BASE when enabled.
+    # Latencies in ms, a tail adds an exponential delay of this mean, rates are fractions of the calls
+    srpg_fake: bool = False
+    srpg_fake_url: str = "http://127.0.0.1:8001"
+    srpg_fake_latency: float = 50
+    srpg_fake_latency_tail: float = 0
+    srpg_fake_error_rate: float = 0
+    srpg_fake_slow_rate: float = 0
+    srpg_fake_slow_latency: float = 10000
+    srpg_fake_roster_size: int = 3
+    srpg_fake_seed: Optional[int] = None
+
+    # GAME
+    outcome_seed: Optional[int] = None
+    mission_index_refresh: int = 60
+    # Rank stats and cash are summed in memory and written every interval (seconds), lost if the worker crashes
+    counter_write_behind: bool = False
+    counter_flush_interval: float = 1.0
+    # Games over and fully chosen are resolved every interval (seconds), by batches
+    mission_sweep_enabled: bool = True
+    mission_sweep_interval: float = 60
+    mission_sweep_batch: int = 100
+    # Server-Sent Events of the game in progress, keepalive in seconds
+    game_events_keepalive: float = 15
+    game_events_queue_size: int = 100
+
+    # SRPG characters of the users seen in the active window (seconds) are refreshed every interval (seconds),
+    # at most roster_batch users per tick through roster_workers concurrent calls
+    roster_refresh_enabled: bool = True
+    roster_refresh_interval: float = 60 * 10
+    roster_active_window: float = 60 * 60
+    roster_tick: float = 5
+    roster_batch: int = 50
+    roster_workers: int = 4
+
+    @root_validator
+    def set_srpg_urls(cls, values):
+        base = values["srpg_fake_url"].rstrip("/") if values["srpg_fake"] else values["SRPG_URL_BASE"]
+        api = f"{base}/api.php?function="
+        token = values["TOKEN_API_SRPG"]
+        values.update({
+            "SRPG_URL_BASE": base,
+            "SRPG_URL_BASE_PROFILE": base + "/profil-",
+            "SRPG_URL_API_LAST_USER": f"{api}getDerniers&tokenAPI={token}",
+            "SRPG_URL_API_NINDO": f"{api}getCitations&tokenAPI={token}",
+            "SRPG_URL_CHARACTERS_TOKEN": f"{api}getAccount&tokenAPI={token}&crypt=",
+            "SRPG_URL_MISSION_PERCENT": f"{api}getPower&tokenAPI={token}&id=",
+        })
+        return values
+
+    def db_url(self, test: Optional[bool] = None, driver: str = "mysql"):
+        if self.is_test() if test is None else test:
+            return (f"{driver}://{self.db_user_test}:{self.db_password_test}@{self.db_host_test}:{self.db_port_test}/"
+                    f"{self.db_name_test}")
+        return f"{driver}://{self.db_user}:{self.db_password}@{self.db_host}:{self.db_port}/{self.db_name}"
+
+    def async_db_url(self, test: Optional[bool] = None):
+        return self.db_url(test=test, driver=f"mysql+{self.db_async_driver}")
 
 
 @ lru_cache()
@@ -1,3 +1,6 @@
+# First import, the startup report measures from here. Its "imports" phase is mostly FastAPI and SQLModel,
+# which every worker needs: only the async routers (in sync mode) and the mail client are deferred
+from api.core.startup import get_startup_report
 import logging
 
 from click import style
@@ -5,10 +8,9 @@ from fastapi import FastAPI
 import uvicorn
 
 from config import Settings, get_settings
-from api.core.events import create_start_app_handler
-from api.routes.user_routes import router as user_routes
-from api.routes.character_routes import router as character_routes
-from api.routes.mission_routes import router as mission_routes
+from api.core.events import create_start_app_handler, create_stop_app_handler
+from api.core.instrumentation import QueryStatsMiddleware
+from api.routes import internal_routes, admin_routes, leaderboard_routes
 
 
 log = logging.getLogger("uvicorn")
@@ -32,20 +34,40 @@ def create_application(settings: Settings) -> FastAPI:
 
     # Routes
     log.info("  ... add routes ...")
-    api.include_router(user_routes, prefix="/api")
-    api.include_router(character_routes, prefix="/api")
-    api.include_router(mission_routes, prefix="/api")
+    # The async routers are only imported in async mode, they import the sync route modules for the game logic
+    if settings.db_async:
+        log.info("  ... with async database ...")
+        from api.routes import async_user_routes, async_character_routes, async_mission_routes
+        api.include_router(async_user_routes.router, prefix="/api")
+        api.include_router(async_character_routes.router, prefix="/api")
+        api.include_router(async_mission_routes.router, prefix="/api")
+    else:
+        from api.routes import user_routes, character_routes, mission_routes
+        api.include_router(user_routes.router, prefix="/api")
+        api.include_router(character_routes.router, prefix="/api")
+        api.include_router(mission_routes.router, prefix="/api")
+    api.include_router(internal_routes.router, prefix="/api")
+    api.include_router(admin_routes.router, prefix="/api")
+    api.include_router(leaderboard_routes.router, prefix="/api")
     # if settings.is_dev():
     # these routes are only for testing, they will not be present in prod
     # api.include_router(tests_routes, prefix="/api")
 
+    # Middlewares
+    if settings.db_instrumentation:
+        log.info("  ... add query instrumentation ...")
+        api.add_middleware(QueryStatsMiddleware, settings=settings)
+
     # Event handlers registration
     log.info("  ... add events handlers ...")
     api.add_event_handler("startup", create_start_app_handler(settings))
+    api.add_event_handler("shutdown", create_stop_app_handler())
     return api
 
 
+get_startup_report().mark("imports")
 api = create_application(get_settings())
+get_startup_report().mark("application")
 
 if __name__ == "__main__":
     uvicorn.run("main:api", host="0.0.0.0", port=8000, reload=True)
@@ -1,15 +1,34 @@
-from sqlmodel import create_engine
-import db_config
+from typing import List
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, create_engine
+from config import get_settings
+from api.core.database import create_db_engine, create_db_async_engine
 
-db_user: str = db_config.db_user_test
-db_password: str = db_config.db_password_test
-db_host: str = db_config.db_host_test
-db_port: str = db_config.db_port_test
-db_name: str = db_config.db_name_test
 
+engine_test = create_db_engine(get_settings(), test=True)
+async_engine_test = create_db_async_engine(get_settings(), test=True)
 
-def db_url_test():
-    return f"mysql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
 
+def create_memory_engine(tables: bool = True) -> Engine:
+    # One in-memory SQLite database shared by every connection of the engine
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    if tables:
+        SQLModel.metadata.create_all(engine)
+    return engine
 
-engine_test = create_engine(db_url_test(), echo=False)
+
+def capture_statements(engine: Engine, writes_only: bool = False) -> List[str]:
+    statements = []
+
+    def capture(conn, cursor, statement, *args):
+        if not writes_only or not statement.startswith("SELECT"):
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", capture)
+    return statements
+
+
+def make_account(ids, village="Konoha") -> List[dict]:
+    return [{"id": id_srpg, "name": f"Ninja{id_srpg}", "village": village, "avatar": "/a.png"} for id_srpg in ids]
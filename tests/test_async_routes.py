@@ -0,0 +1,142 @@
+from datetime import timedelta
+import unittest
+import httpx
+from sqlmodel import SQLModel, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from tests.conftest import engine_test, async_engine_test
+from config import get_settings
+from main import create_application
+from api.crud import create_village, get_mission_playing, get_user
+from api.dependencies import get_session, get_async_session
+from api.models import MissionPlaying
+from api.core.auth_cache import get_auth_cache
+from api.core.mission_graph import invalidate_mission_graph
+from api.core.mission_index import invalidate_mission_index
+from api.core.srpg_client import get_srpg_client
+from benchmarks.stub_srpg import install_stub_srpg, make_character, make_token
+from create_mission import generate_mission_script
+
+
+def get_test_session():
+    with Session(engine_test) as session:
+        yield session
+
+
+async def get_test_async_session():
+    async with AsyncSession(async_engine_test, expire_on_commit=False) as session:
+        yield session
+
+
+class TestAsyncRoutes(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        SQLModel.metadata.create_all(engine_test)
+        with Session(engine_test) as db:
+            create_village(db, 'Konoha')
+            create_village(db, 'Kumo')
+            create_village(db, 'Errant')
+        generate_mission_script(test=True, echo=False)
+        get_auth_cache().clear()
+        install_stub_srpg(get_srpg_client())
+
+        api = create_application(get_settings().copy(update={"db_async": True}))
+        api.dependency_overrides[get_session] = get_test_session
+        api.dependency_overrides[get_async_session] = get_test_async_session
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=api), base_url="http://test")
+        self.header = {"Authorization": f"Bearer {make_token(0)}"}
+        self.game = {"rank": "C", "character_name": make_character(0)["name"]}
+        await self.client.post('/api/users', json={"token_srpg": make_token(0)})
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+        # The pooled connections belong to the event loop of this test
+        await async_engine_test.dispose()
+        get_srpg_client.cache_clear()
+        get_auth_cache().clear()
+        invalidate_mission_graph()
+        invalidate_mission_index()
+        SQLModel.metadata.drop_all(engine_test)
+
+    async def test_create_user(self):
+        response = await self.client.post('/api/users', json={"token_srpg": make_token(1)})
+        self.assertEqual(response.status_code, 201, msg="expected status code 201")
+        response = await self.client.post('/api/users', json={"token_srpg": make_token(1)})
+        self.assertEqual(response.status_code, 422, msg="expected status code 422 / value is not unique")
+        response = await self.client.post('/api/users', json={"token_srpg": "Invalid Token"})
+        self.assertEqual(response.json()['detail'], 'Invalid Token', msg="expected status code 401")
+
+    async def test_get_user(self):
+        response = await self.client.get('/api/users', headers=self.header)
+        self.assertEqual(response.status_code, 200, msg="expected status code 200")
+        response = await self.client.get('/api/users', headers={"Authorization": "Bearer invalid"})
+        self.assertEqual(response.status_code, 401, msg="expected status code 401")
+
+    async def test_characters(self):
+        response = await self.client.patch('/api/characters/', headers=self.header)
+        self.assertEqual(response.status_code, 200, msg="expected status code 200")
+        response = await self.client.get('/api/characters/mine', headers=self.header)
+        self.assertEqual(response.status_code, 200, msg="expected status code 200")
+        self.assertEqual(response.json()["items"][0]["name"], make_character(0)["name"])
+
+    async def test_create_game_success_and_create_game_already_exist(self):
+        response = await self.client.post('/api/games/start', headers=self.header, json=self.game)
+        self.assertEqual(response.status_code, 201, msg="expected status code 201")
+        self.assertEqual(response.json()["mission"]["id"], 2)
+        response = await self.client.post('/api/games/start', headers=self.header, json=self.game)
+        self.assertEqual(response.status_code, 409, msg="expected status code 409")
+
+    async def test_get_game_without_mission(self):
+        response = await self.client.get('/api/games/in-progress', headers=self.header)
+        self.assertEqual(response.status_code, 404, msg="expected status code 404")
+
+    async def test_get_game_success(self):
+        await self.client.post('/api/games/start', headers=self.header, json=self.game)
+        response = await self.client.get('/api/games/in-progress', headers=self.header)
+        self.assertEqual(response.status_code, 200, msg="expected status code 200")
+        self.assertEqual(response.json()["mission"]["id"], 2)
+        response = await self.client.get('/api/games/in-progress/time-left', headers=self.header)
+        self.assertGreaterEqual(response.json()['time'], 10790)
+        self.assertLessEqual(response.json()['time'], 10810)
+        response = await self.client.get('/api/games/missions/2', headers=self.header)
+        self.assertEqual(response.status_code, 200, msg="expected status code 200")
+
+    async def test_edit_position_success(self):
+        await self.client.post('/api/games/start', headers=self.header, json=self.game)
+        response = await self.client.get('/api/games/step/in-progress', headers=self.header)
+        self.assertEqual(response.json()["choices"][0]['choice_id'], 4)
+        response = await self.client.patch('/api/games/in-progress/step?id_choice=5', headers=self.header)
+        self.assertEqual(response.status_code, 200, msg="expected status code 200")
+        response = await self.client.get('/api/games/step/in-progress', headers=self.header)
+        self.assertEqual(response.json()['description'], 'step 1')
+
+    async def test_edit_position_without_srpg(self):
+        await self.client.post('/api/games/start', headers=self.header, json=self.game)
+        # Stats fetched at the start are dropped and the SRPG API unreachable
+        get_srpg_client().invalidate_power()
+        breaker = get_srpg_client().breaker
+        for _ in range(breaker.threshold):
+            breaker.failure()
+        response = await self.client.patch('/api/games/in-progress/step?id_choice=999', headers=self.header)
+        self.assertEqual(response.status_code, 404, msg="expected status code 404 before any SRPG call")
+        # Choice 4 has no stat condition, its value does not need the SRPG stats
+        response = await self.client.patch('/api/games/in-progress/step?id_choice=4', headers=self.header)
+        self.assertEqual(response.status_code, 200, msg="expected status code 200 with the circuit open")
+
+    async def test_get_game_result_success(self):
+        await self.client.post('/api/games/start', headers=self.header, json=self.game)
+        await self.client.patch('/api/games/in-progress/step?id_choice=4', headers=self.header)
+        response = await self.client.get('/api/games/in-progress/result', headers=self.header)
+        self.assertEqual(response.json()['detail'], "Time is not over")
+        with Session(engine_test) as db:
+            mission_playing: MissionPlaying = get_mission_playing(db, user=get_user(db, id=1))
+            mission_playing.begin_time -= timedelta(hours=4)
+            mission_playing.end_time -= timedelta(hours=4)
+            db.commit()
+        response = await self.client.get('/api/games/in-progress/result', headers=self.header)
+        self.assertEqual(response.status_code, 200, msg="expected status code 200")
+        response = await self.client.get('/api/games/in-progress', headers=self.header)
+        self.assertEqual(response.status_code, 404, msg="expected status code 404 after the result")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import time
+import unittest
+from fastapi import HTTPException
+from sqlmodel import Session
+from api.models import MissionPlaying
+from api.schemas import CurrentUser
+from api.dependencies import check_if_mission
+from api.core.auth_cache import AuthCache, get_auth_cache
+from api.core.cache import TTLCache
+from tests.conftest import create_memory_engine
+
+
+class TestTTLCache(unittest.TestCase):
+
+    def test_get_and_set(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set(1, "one")
+        self.assertEqual(cache.get(1), "one")
+        self.assertIsNone(cache.get(2), msg="expected None for unknown key")
+
+    def test_evict_least_recently_used(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set(1, "one")
+        cache.set(2, "two")
+        cache.get(1)
+        cache.set(3, "three")
+        self.assertIn(1, cache)
+        self.assertNotIn(2, cache, msg="expected least recently used key evicted")
+        self.assertEqual(len(cache), 2)
+
+    def test_expire_entry(self):
+        cache = TTLCache(maxsize=2, ttl=0.01)
+        cache.set(1, "one")
+        time.sleep(0.02)
+        self.assertIsNone(cache.get(1), msg="expected expired entry")
+
+    def test_pop_and_clear(self):
+        cache = TTLCache()
+        cache.set(1, "one")
+        cache.set(2, "two")
+        self.assertEqual(cache.pop(1), "one")
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+
+def make_user(id: int, has_mission: bool = False) -> CurrentUser:
+    return CurrentUser(id=id, discord_id=None, token_srpg=f"token{id}", role="user", has_mission=has_mission)
+
+
+class TestAuthCache(unittest.TestCase):
+
+    def test_index_pruned_on_eviction(self):
+        auth_cache = AuthCache(maxsize=2, ttl=60)
+        for id in range(1, 5):
+            auth_cache.set((False, f"token{id}"), make_user(id))
+        self.assertEqual(set(auth_cache._keys_by_user), {3, 4}, msg="expected the evicted users forgotten")
+        auth_cache.invalidate_user(3)
+        self.assertIsNone(auth_cache.get((False, "token3")))
+
+    def test_index_pruned_on_expiry(self):
+        auth_cache = AuthCache(maxsize=2, ttl=0.01)
+        auth_cache.set((False, "token1"), make_user(1))
+        time.sleep(0.02)
+        self.assertIsNone(auth_cache.get((False, "token1")))
+        self.assertEqual(auth_cache._keys_by_user, {})
+
+    def test_stale_flag_checked(self):
+        engine = create_memory_engine()
+        user = make_user(1)
+        get_auth_cache().set((False, user.token_srpg), user)
+        with Session(engine) as db:
+            self.assertRaises(HTTPException, check_if_mission, user, db)
+            # Game started in another worker, the cached identity still says there is none
+            db.add(MissionPlaying(character_id=1, mission_id=1, user_id=1, percent_character=0, percent_choice=0))
+            db.commit()
+            self.assertEqual(check_if_mission(user, db), user)
+        self.assertIsNone(get_auth_cache().get((False, user.token_srpg)), msg="expected the stale identity dropped")
+
+
+if __name__ == '__main__':
+    unittest.main(failfast=True)
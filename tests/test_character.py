@@ -32,7 +32,7 @@ class TestCharacter(unittest.TestCase):
             "url_avatar": data_character.url_avatar,
         }
         response = requests.get(url=self.url + '/mine', headers=self.header)
-        self.assertEqual(response.json()[0], data_correct, msg="expected two dict as equal")
+        self.assertEqual(response.json()["items"][0], data_correct, msg="expected two dict as equal")
 
     def test_update_character_success(self):
         with Session(engine_test) as db:
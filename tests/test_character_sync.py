@@ -0,0 +1,58 @@
+import unittest
+from sqlmodel import Session, select
+from api.crud import create_user_db, get_character
+from api.models import LeaderboardEntry, RankStat, User, UserCharacterLink
+from api.services import MISSION_RANK, save_characters
+from tests.conftest import capture_statements, create_memory_engine, make_account
+
+
+class TestCharacterSync(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = create_memory_engine()
+        with Session(self.engine) as db:
+            self.user_id = create_user_db(db, "token", None).id
+        self.statements = capture_statements(self.engine)
+
+    def sync(self, account, refresh=True):
+        self.statements.clear()
+        with Session(self.engine) as db:
+            return save_characters(db, db.get(User, self.user_id), account, refresh=refresh)
+
+    def linked_ids_srpg(self):
+        with Session(self.engine) as db:
+            return sorted(get_character(db, id=link.id_character).id_srpg
+                          for link in db.exec(select(UserCharacterLink)).all())
+
+    def test_new_characters(self):
+        created = self.sync(make_account([1, 2, 3]), refresh=False)
+        self.assertEqual([character.id_srpg for character in created], [1, 2, 3])
+        self.assertEqual(self.linked_ids_srpg(), [1, 2, 3])
+        with Session(self.engine) as db:
+            self.assertEqual(len(db.exec(select(RankStat)).all()), 3 * len(MISSION_RANK))
+            self.assertEqual(len(db.exec(select(LeaderboardEntry)).all()), 3 * (len(MISSION_RANK) + 1))
+
+    def test_update_and_unlink(self):
+        self.sync(make_account([1, 2, 3]))
+        changed = self.sync(make_account([1, 2], village="Kumo"))
+        self.assertEqual([character.village for character in changed], ["Kumo", "Kumo"])
+        self.assertEqual(self.linked_ids_srpg(), [1, 2], msg="expected the character gone from the account unlinked")
+        with Session(self.engine) as db:
+            character = get_character(db, id_srpg=1)
+            villages = db.exec(select(LeaderboardEntry.village).where(
+                LeaderboardEntry.character_id == character.id)).all()
+            self.assertEqual(set(villages), {"Kumo"})
+
+    def test_constant_queries(self):
+        self.sync(make_account(range(5)))
+        self.sync(make_account(range(5), village="Kumo"))
+        small = len(self.statements)
+        self.sync(make_account(range(50)))
+        self.sync(make_account(range(50), village="Kumo"))
+        self.assertEqual(len(self.statements), small, msg="expected the same statements whatever the account size")
+        self.sync(make_account(range(50), village="Kumo"))
+        self.assertEqual(len(self.statements), 2, msg="expected the user and a single select without change")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+from api.core.conditions import StatIndex, compile_conditions, get_stat_index, meets_thresholds
+from api.core.mission_graph import ConditionNode
+
+
+class TestConditions(unittest.TestCase):
+
+    def test_compile_conditions(self):
+        thresholds, additional_time = compile_conditions([
+            ConditionNode(id=1, type="Taijutsu", value=4),
+            ConditionNode(id=2, type="Time", value=30),
+            ConditionNode(id=3, type="Taijutsu", value=6),
+            ConditionNode(id=4, type="Genjutsu", value=2)])
+        stat_index = get_stat_index()
+        self.assertEqual(additional_time, 30)
+        self.assertEqual(thresholds[stat_index.position("Taijutsu")], 6, msg="expected the highest level kept")
+        self.assertEqual(thresholds[stat_index.position("Genjutsu")], 2)
+        self.assertEqual(sum(thresholds), 8, msg="expected no threshold on the other stat types")
+
+    def test_first_time_condition(self):
+        _, additional_time = compile_conditions([
+            ConditionNode(id=1, type="Time", value=0),
+            ConditionNode(id=2, type="Time", value=30)])
+        self.assertEqual(additional_time, 0, msg="expected the first Time condition kept, even at 0")
+
+    def test_compile_without_conditions(self):
+        self.assertEqual(compile_conditions([]), ((), 0))
+
+    def test_meets_thresholds(self):
+        self.assertTrue(meets_thresholds((5, 3, 0), (5, 0)))
+        self.assertFalse(meets_thresholds((5, 3, 0), (0, 4)))
+        self.assertTrue(meets_thresholds((5, 3), ()))
+
+    def test_stat_vector(self):
+        stat_index = StatIndex()
+        stat_index.position("Ninjutsu")
+        stat_index.position("Kenjutsu")
+        character_stat = {"total": 10, "details": {"Kenjutsu": {"niveau": 7}, "Ninjutsu": {"niveau": 3}}}
+        self.assertEqual(stat_index.vector(character_stat), (3, 7))
+        stat_index.position("Fuinjutsu")
+        self.assertEqual(stat_index.vector(character_stat), (3, 7, 0), msg="expected a missing stat at level 0")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+from sqlmodel import Session
+from api.crud import create_character, create_rank_stat, get_character, get_rank_stat
+from api.schemas import CharacterCreate
+from api.core.counter_buffer import CounterBuffer
+from tests.conftest import create_memory_engine
+
+
+class TestCounterBuffer(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = create_memory_engine()
+        with Session(self.engine) as db:
+            for id_srpg in (1, 2):
+                create_character(db, CharacterCreate(id_srpg=id_srpg, name=f"Ninja{id_srpg}", village="Konoha",
+                                                     url_avatar="/a.png"),
+                                 None, [create_rank_stat(db, rank) for rank in ("C", "B")])
+
+    def test_flush_coalesced_increments(self):
+        buffer = CounterBuffer()
+        buffer.add_rank_stat(1, "C", win=1)
+        buffer.add_rank_stat(1, "C", win=1)
+        buffer.add_rank_stat(1, "C", fail=1)
+        buffer.add_cash(1, 100)
+        buffer.add_cash(1, 50)
+        self.assertEqual(buffer.flush(self.engine), 2, msg="expected one write per counter")
+        with Session(self.engine) as db:
+            character = get_character(db, id=1)
+            rank_stat = get_rank_stat(db, character, "C")
+            self.assertEqual((rank_stat.win, rank_stat.fail), (2, 1))
+            self.assertEqual(character.cash, 150)
+            other = get_character(db, id=2)
+            self.assertEqual(get_rank_stat(db, other, "C").win, 0, msg="expected other character untouched")
+            self.assertEqual(get_rank_stat(db, character, "B").win, 0, msg="expected other rank untouched")
+
+    def test_flush_empty_buffer(self):
+        self.assertEqual(CounterBuffer().flush(self.engine), 0)
@@ -0,0 +1,51 @@
+import asyncio
+import unittest
+from threading import Thread
+from api.core.event_bus import EventBus, format_event, stream_events
+
+
+class TestEventBus(unittest.TestCase):
+
+    def test_publish_without_subscription(self):
+        self.assertEqual(EventBus(10).publish(1, "step", {}), 0)
+
+    def test_stream_until_last_event(self):
+        bus = EventBus(10)
+
+        async def run():
+            other = bus.subscribe(2)
+            events = stream_events(bus, 1, ("end_time", {"time_left": 10}), "result", keepalive=5)
+            self.assertEqual(bus.publish(1, "step", {}), 0, msg="expected no subscription before the stream is read")
+            received = [await events.__anext__()]
+            # Published from a worker thread, as the sync routes do
+            publisher = Thread(target=lambda: [bus.publish(1, "step", {"step_id": 2}),
+                                               bus.publish(1, "result", {"value": "win"})])
+            publisher.start()
+            received += [event async for event in events]
+            publisher.join()
+            self.assertTrue(other.queue.empty(), msg="expected events of other users not delivered")
+            bus.unsubscribe(other)
+            return received
+
+        received = asyncio.run(run())
+        self.assertEqual(received, [format_event("end_time", {"time_left": 10}),
+                                    format_event("step", {"step_id": 2}),
+                                    format_event("result", {"value": "win"})])
+        self.assertEqual(bus.publish(1, "step", {}), 0, msg="expected the stream unsubscribed once closed")
+
+    def test_keepalive(self):
+        bus = EventBus(10)
+
+        async def run():
+            events = stream_events(bus, 1, ("end_time", {}), "result", keepalive=0.01)
+            await events.__anext__()
+            keepalive = await events.__anext__()
+            await events.aclose()
+            return keepalive
+
+        self.assertEqual(asyncio.run(run()), ": keepalive\n\n")
+        self.assertEqual(bus.publish(1, "step", {}), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
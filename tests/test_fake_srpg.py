@@ -0,0 +1,43 @@
+import unittest
+from fastapi.testclient import TestClient
+from config import Settings, get_settings
+from benchmarks.fake_srpg import create_fake_srpg
+from benchmarks.stub_srpg import make_character, make_token
+
+
+class TestFakeSrpg(unittest.TestCase):
+
+    def make_client(self, **update):
+        settings = get_settings().copy(update={"srpg_fake_latency": 0, "srpg_fake_seed": 1, **update})
+        return TestClient(create_fake_srpg(settings))
+
+    def test_urls(self):
+        settings = Settings(srpg_fake=True, srpg_fake_url="http://localhost:9000/")
+        self.assertEqual(settings.SRPG_URL_BASE, "http://localhost:9000")
+        self.assertTrue(settings.SRPG_URL_CHARACTERS_TOKEN.startswith("http://localhost:9000/api.php?function="))
+        self.assertTrue(Settings().SRPG_URL_MISSION_PERCENT.startswith("https://shinobi-rpg.ovh/api.php"))
+
+    def test_account(self):
+        client = self.make_client(srpg_fake_roster_size=3)
+        roster = client.get("/api.php", params={"function": "getAccount", "crypt": make_token(7)}).json()
+        self.assertEqual(roster[0], make_character(7), msg="expected the character of the benchmark player first")
+        self.assertEqual(len({character["id"] for character in roster}), 3)
+        other = client.get("/api.php", params={"function": "getAccount", "crypt": "token"}).json()
+        self.assertEqual(other, client.get("/api.php", params={"function": "getAccount", "crypt": "token"}).json())
+        self.assertEqual(client.get("/api.php", params={"function": "getAccount", "crypt": "invalid"}).json(), [])
+
+    def test_power(self):
+        client = self.make_client()
+        power = client.get("/api.php", params={"function": "getPower", "id": 12}).json()
+        self.assertEqual(power["total"], sum(detail["niveau"] for detail in power["details"].values()))
+        self.assertEqual(power, client.get("/api.php", params={"function": "getPower", "id": 12}).json())
+
+    def test_errors(self):
+        client = self.make_client(srpg_fake_error_rate=1)
+        self.assertEqual(client.get("/api.php", params={"function": "getDerniers"}).status_code, 503)
+        client = self.make_client()
+        self.assertEqual(len(client.get("/api.php", params={"function": "getCitations"}).json()), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
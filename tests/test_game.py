@@ -59,7 +59,7 @@ class TestGame(unittest.TestCase):
 
     def test_get_game_time_left_after_adding_time(self):
         data = {"rank": "C", "character_name": "Narrateur"}
-        id_choice = 1
+        id_choice = 4
         requests.post(url=self.url + '/start', headers=self.header, json=data)
         requests.patch(url=self.url + "/in-progress/step?id_choice=" + str(id_choice), headers=self.header)
         requests.get(url=self.url + "/step/in-progress", headers=self.header)
@@ -73,11 +73,11 @@ class TestGame(unittest.TestCase):
         response = requests.get(url=self.url + "/step/in-progress", headers=self.header)
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json()['description'], "Test")
-        self.assertEqual(response.json()["choices"][0]['choice_id'], 1)
+        self.assertEqual(response.json()["choices"][0]['choice_id'], 4)
 
     def test_edit_position_succes(self):
         data = {"rank": "C", "character_name": "Narrateur"}
-        id_choice = 2
+        id_choice = 5
         requests.post(url=self.url + '/start', headers=self.header, json=data)
         requests.patch(url=self.url + "/in-progress/step?id_choice=" + str(id_choice), headers=self.header)
         response = requests.get(url=self.url + "/step/in-progress", headers=self.header)
@@ -86,7 +86,7 @@ class TestGame(unittest.TestCase):
 
     def test_edit_position_end_of_way(self):
         data = {"rank": "C", "character_name": "Narrateur"}
-        id_choice = 1
+        id_choice = 4
         requests.post(url=self.url + '/start', headers=self.header, json=data)
         requests.patch(url=self.url + "/in-progress/step?id_choice=" + str(id_choice), headers=self.header)
         response = requests.get(url=self.url + "/step/in-progress", headers=self.header)
@@ -100,7 +100,7 @@ class TestGame(unittest.TestCase):
 
     def test_get_game_result_not_finish_time(self):
         data = {"rank": "C", "character_name": "Narrateur"}
-        id_choice = 1
+        id_choice = 4
         requests.post(url=self.url + '/start', headers=self.header, json=data)
         requests.patch(url=self.url + "/in-progress/step?id_choice=" + str(id_choice), headers=self.header)
         response = requests.get(url=self.url + "/in-progress/result", headers=self.header)
@@ -108,12 +108,13 @@ class TestGame(unittest.TestCase):
 
     def test_get_game_result_success(self):
         data = {"rank": "C", "character_name": "Narrateur"}
-        id_choice = 1
+        id_choice = 4
         requests.post(url=self.url + '/start', headers=self.header, json=data)
         requests.patch(url=self.url + "/in-progress/step?id_choice=" + str(id_choice), headers=self.header)
         with Session(engine_test) as db:
             mission_playing: MissionPlaying = get_mission_playing(db, user=get_user(db, id=1))
             mission_playing.begin_time -= timedelta(hours=4)
+            mission_playing.end_time -= timedelta(hours=4)
             db.commit()
         response = requests.get(url=self.url + "/in-progress/result", headers=self.header)
         self.assertEqual(response.status_code, 200)
@@ -0,0 +1,37 @@
+import unittest
+from sqlalchemy import text
+from sqlmodel import create_engine
+from config import get_settings
+from api.core.instrumentation import RequestStats, _request_stats, instrument_engine
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        instrument_engine(self.engine, get_settings())
+
+    def test_count_queries_of_request(self):
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        try:
+            with self.engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+                connection.execute(text("SELECT 2"))
+        finally:
+            _request_stats.reset(token)
+        self.assertEqual(stats.queries, 2)
+        self.assertGreaterEqual(stats.db_time, 0)
+
+    def test_ignore_queries_outside_request(self):
+        with self.engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        self.assertIsNone(_request_stats.get())
+
+    def test_repeated_statements(self):
+        stats = RequestStats()
+        for _ in range(3):
+            stats.add("SELECT * FROM rank_stat WHERE id = ?", 0.001, 1)
+        stats.add("SELECT * FROM character", 0.001, 1)
+        self.assertEqual(stats.repeated_statements(3), {"SELECT * FROM rank_stat WHERE id = ?": 3})
+        self.assertEqual(stats.rows, 4)
@@ -0,0 +1,43 @@
+import unittest
+from sqlmodel import Session
+from api.crud import (create_character, create_rank_stat, edit_character, get_character, get_leaderboard,
+                      update_rank_stat)
+from api.schemas import CharacterCreate
+from tests.conftest import create_memory_engine
+
+
+class TestLeaderboard(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = create_memory_engine()
+        with Session(self.engine) as db:
+            for id_srpg, village in ((1, "Konoha"), (2, "Kumo"), (3, "Konoha")):
+                create_character(db, CharacterCreate(id_srpg=id_srpg, name=f"Ninja{id_srpg}", village=village,
+                                                     url_avatar="/a.png"),
+                                 None, [create_rank_stat(db, rank) for rank in ("C", "B")])
+            update_rank_stat(db, 1, "C", win=1)
+            update_rank_stat(db, 2, "C", win=2)
+            update_rank_stat(db, 2, "B", fail=1)
+            update_rank_stat(db, 3, "B", win=1)
+
+    def names(self, rows):
+        return [(character.name, entry.win) for entry, character in rows]
+
+    def test_global_pages(self):
+        with Session(self.engine) as db:
+            first = get_leaderboard(db, limit=2)
+            last_entry, _ = first[-1]
+            second = get_leaderboard(db, limit=2, after=(last_entry.win, last_entry.character_id))
+            self.assertEqual(self.names(first), [("Ninja2", 2), ("Ninja1", 1)])
+            self.assertEqual(self.names(second), [("Ninja3", 1)])
+
+    def test_rank_and_village(self):
+        with Session(self.engine) as db:
+            self.assertEqual(self.names(get_leaderboard(db, rank="B")), [("Ninja3", 1), ("Ninja1", 0), ("Ninja2", 0)])
+            self.assertEqual(self.names(get_leaderboard(db, village="Konoha")), [("Ninja1", 1), ("Ninja3", 1)])
+
+    def test_village_change(self):
+        with Session(self.engine) as db:
+            edit_character(db, get_character(db, id=2), village="Konoha")
+            self.assertEqual(self.names(get_leaderboard(db, village="Kumo")), [])
+            self.assertEqual(len(get_leaderboard(db, village="Konoha")), 3)
@@ -0,0 +1,46 @@
+import os
+import unittest
+from sqlmodel import Session, select
+from api.crud import create_village, delete_mission
+from api.models import Mission
+from api.core.mission_graph import get_mission_graph, invalidate_mission_graph
+from api.core.mission_importer import import_mission_file
+from api.core.mission_index import get_random_mission_id, invalidate_mission_index
+from tests.conftest import create_memory_engine
+
+MISSION_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            "data", "mission_json", "test_konoha.json")
+
+
+class TestMissionGraph(unittest.TestCase):
+
+    def setUp(self):
+        invalidate_mission_graph()
+        invalidate_mission_index()
+        self.engine = create_memory_engine()
+        with Session(self.engine) as db:
+            create_village(db, "Konoha")
+        self.mission_id = import_mission_file(self.engine, MISSION_FILE)
+
+    def tearDown(self):
+        invalidate_mission_graph()
+        invalidate_mission_index()
+
+    def test_graph_cached(self):
+        with Session(self.engine) as db:
+            graph = get_mission_graph(db, self.mission_id)
+            self.assertTrue(graph.steps)
+            self.assertIs(get_mission_graph(db, self.mission_id), graph, msg="expected the compiled graph reused")
+
+    def test_delete_mission(self):
+        with Session(self.engine) as db:
+            graph = get_mission_graph(db, self.mission_id)
+            self.assertEqual(get_random_mission_id(db, "C", "Konoha"), self.mission_id)
+            delete_mission(db, self.mission_id)
+            self.assertIsNone(db.exec(select(Mission)).first())
+            self.assertIsNot(get_mission_graph(db, self.mission_id), graph, msg="expected the cached graph dropped")
+            self.assertIsNone(get_random_mission_id(db, "C", "Konoha"), msg="expected the deleted mission not drawn")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import os
+import unittest
+from datetime import datetime, timedelta
+from sqlmodel import Session, select
+from api.crud import (create_character, create_mission_playing, create_rank_stat, create_user_db, create_village,
+                      get_character)
+from api.models import Mission, MissionPlaying, MissionResult, RankStat, User
+from api.schemas import CharacterCreate, MissionPlayingCreate
+from api.services import resolve_game_result
+from api.core.mission_graph import get_mission_graph, invalidate_mission_graph
+from api.core.mission_importer import import_mission_file
+from api.core.mission_sweeper import MissionSweeper
+from tests.conftest import create_memory_engine
+
+MISSION_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            "data", "mission_json", "test_konoha.json")
+
+
+class TestMissionSweeper(unittest.TestCase):
+
+    def setUp(self):
+        invalidate_mission_graph()
+        self.engine = create_memory_engine()
+        with Session(self.engine) as db:
+            create_village(db, "Konoha")
+        import_mission_file(self.engine, MISSION_FILE)
+        with Session(self.engine) as db:
+            user = create_user_db(db, "token", None)
+            create_character(db, CharacterCreate(id_srpg=1, name="Ninja1", village="Konoha", url_avatar="/a.png"),
+                             user, [create_rank_stat(db, "C")])
+            mission = db.exec(select(Mission)).first()
+            graph = get_mission_graph(db, mission.id)
+            final_choice = next(choice for choice in graph.choices.values() if choice.finalities)
+            self.user_id, self.mission_id = user.id, mission.id
+            self.first_step_id, self.final_choice_id = graph.first_step_id, final_choice.id
+            self.other_choice_id = next(choice.id for choice in graph.choices.values() if not choice.finalities)
+
+    def tearDown(self):
+        invalidate_mission_graph()
+
+    def start_game(self, end_time: datetime, last_choice_id, character_id: int = 1) -> None:
+        with Session(self.engine) as db:
+            mission_playing = create_mission_playing(db, MissionPlayingCreate(
+                mission_id=self.mission_id, character_id=character_id, begin_time=end_time - timedelta(hours=3),
+                end_time=end_time, percent_character=50, step_id=self.first_step_id, user_id=self.user_id))
+            mission_playing.last_choice_id = last_choice_id
+            db.commit()
+
+    def count(self, model) -> int:
+        with Session(self.engine) as db:
+            return len(db.exec(select(model)).all())
+
+    def test_sweep_resolves_expired_games(self):
+        self.start_game(datetime.now() - timedelta(minutes=1), self.final_choice_id)
+        self.assertEqual(MissionSweeper(10).sweep(self.engine), 1)
+        self.assertEqual(self.count(MissionPlaying), 0)
+        with Session(self.engine) as db:
+            mission_result = db.exec(select(MissionResult)).one()
+            self.assertEqual(mission_result.user_id, self.user_id)
+            rank_stat = db.exec(select(RankStat).where(RankStat.rank == "C")).one()
+            self.assertEqual(rank_stat.win + rank_stat.fail, 1)
+
+    def test_sweep_skips_running_games(self):
+        self.start_game(datetime.now() + timedelta(hours=1), self.final_choice_id)
+        self.assertEqual(MissionSweeper(10).sweep(self.engine), 0)
+        self.assertEqual(self.count(MissionPlaying), 1)
+
+    def test_sweep_skips_unfinished_choices(self):
+        self.start_game(datetime.now() - timedelta(minutes=1), None)
+        self.assertEqual(MissionSweeper(10).sweep(self.engine), 0)
+        self.assertEqual(self.count(MissionPlaying), 1)
+
+    def test_sweep_past_unfinished_games(self):
+        with Session(self.engine) as db:
+            user = db.get(User, self.user_id)
+            for id_srpg in range(2, 6):
+                create_character(db, CharacterCreate(id_srpg=id_srpg, name=f"Ninja{id_srpg}", village="Konoha",
+                                                     url_avatar="/a.png"), user, [create_rank_stat(db, "C")])
+        # Abandoned games expired before the finished one, more of them than a batch
+        for character_id, last_choice_id in zip(range(2, 6), [None, self.other_choice_id] * 2):
+            self.start_game(datetime.now() - timedelta(hours=1), last_choice_id, character_id=character_id)
+        self.start_game(datetime.now() - timedelta(minutes=1), self.final_choice_id)
+        self.assertEqual(MissionSweeper(2).sweep(self.engine), 1)
+        self.assertEqual(self.count(MissionPlaying), 4)
+
+    def test_game_resolved_once(self):
+        self.start_game(datetime.now() - timedelta(minutes=1), self.final_choice_id)
+        with Session(self.engine) as db, Session(self.engine) as other:
+            mission_playing = db.exec(select(MissionPlaying)).one()
+            stale = other.exec(select(MissionPlaying)).one()
+            mission = db.get(Mission, self.mission_id)
+            self.assertIsNotNone(resolve_game_result(db, mission_playing, mission, get_character(db, id=1)))
+            self.assertIsNone(resolve_game_result(other, stale, other.get(Mission, self.mission_id),
+                                                  get_character(other, id=1)),
+                              msg="expected the second resolution to find the game already gone")
+        with Session(self.engine) as db:
+            rank_stat = db.exec(select(RankStat).where(RankStat.rank == "C")).one()
+            self.assertEqual(rank_stat.win + rank_stat.fail, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
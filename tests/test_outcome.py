@@ -0,0 +1,32 @@
+import unittest
+from api.core.outcome import OutcomeEngine
+
+
+class TestOutcomeEngine(unittest.TestCase):
+
+    def test_draw_bounds(self):
+        engine = OutcomeEngine(seed=1)
+        self.assertTrue(all(engine.draw(100) == "win" for _ in range(200)), msg="expected always win at 100")
+        self.assertTrue(all(engine.draw(0) == "fail" for _ in range(200)), msg="expected always fail at 0")
+
+    def test_draw_same_seed_same_results(self):
+        first = OutcomeEngine(seed=42)
+        second = OutcomeEngine(seed=42)
+        self.assertEqual([first.draw(50) for _ in range(50)], [second.draw(50) for _ in range(50)])
+
+    def test_draw_many(self):
+        engine = OutcomeEngine(seed=7)
+        results = engine.draw_many([0, 100] * 500)
+        self.assertEqual(len(results), 1000)
+        self.assertEqual(results[:2], ["fail", "win"])
+        self.assertEqual(engine.draw_many([]), [])
+
+    def test_draw_many_rate(self):
+        engine = OutcomeEngine(seed=3)
+        results = engine.draw_many([70] * 10000)
+        rate = results.count("win") / len(results)
+        self.assertAlmostEqual(rate, 0.7, delta=0.03, msg="expected win rate close to 70%")
+
+
+if __name__ == '__main__':
+    unittest.main(failfast=True)
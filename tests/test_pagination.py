@@ -0,0 +1,35 @@
+import base64
+import json
+import unittest
+from fastapi import HTTPException
+from api.core.pagination import Pagination, decode_cursor, encode_cursor
+
+
+class TestPagination(unittest.TestCase):
+
+    def test_cursor_round_trip(self):
+        self.assertEqual(decode_cursor(encode_cursor((3, 42)), (int, int)), (3, 42))
+        self.assertIsNone(decode_cursor(None, (int,)))
+
+    def test_invalid_cursor(self):
+        for cursor in ("@@", encode_cursor((1,))[:-2] + "!", "NQ=="):
+            with self.assertRaises(HTTPException, msg=f"expected 422 for {cursor}") as error:
+                decode_cursor(cursor, (int,))
+            self.assertEqual(error.exception.status_code, 422)
+
+    def test_malformed_cursor(self):
+        string_cursor = base64.urlsafe_b64encode(json.dumps("abc").encode()).decode()
+        for cursor in (encode_cursor((1,)), encode_cursor((1, 2, 3)), encode_cursor(("a", 2)),
+                       encode_cursor((True, 2)), encode_cursor((1.5, 2)), string_cursor):
+            with self.assertRaises(HTTPException, msg=f"expected 422 for {cursor}") as error:
+                decode_cursor(cursor, (int, int))
+            self.assertEqual(error.exception.status_code, 422)
+
+    def test_make_page(self):
+        pagination = Pagination(limit=2)
+        page = pagination.make_page([1, 2, 3], key=lambda item: (item,))
+        self.assertEqual(page.items, [1, 2])
+        self.assertEqual(decode_cursor(page.next_cursor, (int,)), (2,))
+        last_page = Pagination(limit=2, after=(2,)).make_page([3], key=lambda item: (item,))
+        self.assertEqual(last_page.items, [3])
+        self.assertIsNone(last_page.next_cursor, msg="expected no cursor on the last page")
@@ -0,0 +1,77 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+from sqlmodel import Session
+from config import get_settings
+from api.crud import create_user_db, get_characters_db
+from api.core.roster_refresher import RosterRefresher
+from tests.conftest import capture_statements, create_memory_engine, make_account
+
+
+class FakeRosterRefresher(RosterRefresher):
+
+    def __init__(self, settings, accounts):
+        super().__init__(settings)
+        self.accounts = accounts
+        self.fetched = []
+
+    def fetch(self, token_srpg):
+        self.fetched.append(token_srpg)
+        return self.accounts.get(token_srpg)
+
+
+class TestRosterRefresher(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = create_memory_engine()
+        with Session(self.engine) as db:
+            self.user_ids = [create_user_db(db, f"token{number}", None).id for number in range(3)]
+        self.accounts = {"token0": make_account([1, 2]), "token1": make_account([3]), "token2": []}
+        settings = get_settings().copy(update={"roster_refresh_interval": 60, "roster_batch": 2})
+        self.refresher = FakeRosterRefresher(settings, self.accounts)
+        self.writes = capture_statements(self.engine, writes_only=True)
+
+    def refresh(self):
+        # One worker: the in-memory database is a single connection, shared sessions cannot write at once
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return self.refresher.refresh(self.engine, executor)
+
+    def characters(self, user_id):
+        with Session(self.engine) as db:
+            return [character.id_srpg for character in get_characters_db(db, user_id)]
+
+    def test_requested_users_by_batch(self):
+        for number, user_id in enumerate(self.user_ids):
+            self.refresher.request(user_id, f"token{number}")
+        self.assertEqual(self.refresh(), 2)
+        self.assertEqual(len(self.refresher.fetched), 2, msg="expected at most roster_batch users per run")
+        self.assertEqual(self.characters(self.user_ids[0]), [1, 2])
+        self.refresh()
+        self.assertEqual(len(self.refresher.fetched), 3)
+        self.assertEqual(self.refresh(), 0, msg="expected no user due before the interval")
+
+    def test_requested_on_fresh_clock(self):
+        # Monotonic clock of a host booted less than an interval ago
+        with patch("api.core.roster_refresher.monotonic", return_value=5.0):
+            self.refresher.request(self.user_ids[0], "token0")
+            self.assertEqual(self.refresher.due_users(), [self.user_ids[0]])
+
+    def test_unchanged_roster_not_written(self):
+        self.refresher.remember(self.user_ids[1], "token1", make_account([3]))
+        self.refresher.request(self.user_ids[1], "token1")
+        self.writes.clear()
+        self.assertEqual(self.refresh(), 0)
+        self.assertEqual(self.refresher.fetched, ["token1"])
+        self.assertEqual(self.writes, [])
+
+    def test_empty_roster_keeps_characters(self):
+        self.refresher.request(self.user_ids[0], "token0")
+        self.refresh()
+        self.accounts["token0"] = []
+        self.refresher.request(self.user_ids[0], "token0")
+        self.assertEqual(self.refresh(), 0)
+        self.assertEqual(self.characters(self.user_ids[0]), [1, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+from unittest.mock import patch
+from sqlalchemy import inspect, text
+from sqlmodel import Session, select
+from api.crud import set_schema_version
+from api.models import Village
+from api.core.database import (add_missing_indexes, get_index_names, get_schema_fingerprint, is_schema_current,
+                               migrate_database)
+from api.core.startup import StartupReport
+from tests.conftest import capture_statements, create_memory_engine
+
+
+class TestSchemaVersion(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = create_memory_engine(tables=False)
+
+    def test_skip_when_current(self):
+        self.assertTrue(migrate_database(self.engine))
+        self.assertTrue(is_schema_current(self.engine))
+        statements = capture_statements(self.engine)
+        self.assertFalse(migrate_database(self.engine))
+        self.assertEqual(len(statements), 2, msg="expected only the table check and the schema version read")
+        with Session(self.engine) as db:
+            self.assertEqual(len(db.exec(select(Village)).all()), 3)
+
+    def test_add_missing_indexes(self):
+        migrate_database(self.engine)
+        with self.engine.begin() as connection:
+            connection.execute(text("DROP INDEX ix_mission_rank_id"))
+            connection.execute(text("DROP INDEX ix_missionvillage_mission_id_village_id"))
+        migrate_database(self.engine, schema_marker=False)
+        inspector = inspect(self.engine)
+        self.assertIn("ix_mission_rank_id", {index["name"] for index in inspector.get_indexes("mission")})
+        self.assertIn("ix_missionvillage_mission_id_village_id",
+                      {index["name"] for index in inspector.get_indexes("missionvillage")})
+
+    def test_migrate_twice(self):
+        migrate_database(self.engine)
+        self.assertTrue(migrate_database(self.engine, schema_marker=False))
+        checked = set()
+
+        def check_before_other_worker(engine, table_name):
+            # The first check of a table ran before another worker created its indexes
+            if table_name in checked:
+                return get_index_names(engine, table_name)
+            checked.add(table_name)
+            return set()
+
+        with patch("api.core.database.get_index_names", side_effect=check_before_other_worker):
+            add_missing_indexes(self.engine)
+        self.assertIn("mission", checked)
+
+    def test_migrate_when_changed(self):
+        migrate_database(self.engine)
+        with Session(self.engine) as db:
+            set_schema_version(db, "previous")
+        self.assertFalse(is_schema_current(self.engine))
+        self.assertTrue(migrate_database(self.engine))
+        self.assertTrue(migrate_database(self.engine, schema_marker=False), msg="expected the marker ignored")
+        with Session(self.engine) as db:
+            self.assertEqual(len(db.exec(select(Village)).all()), 3, msg="expected the villages seeded once")
+        self.assertEqual(len(get_schema_fingerprint()), 16)
+
+
+class TestStartupReport(unittest.TestCase):
+
+    def test_phases(self):
+        report = StartupReport(0)
+        report.mark("imports")
+        with report.measure("database"):
+            pass
+        self.assertEqual(list(report.phases), ["imports", "database"])
+        self.assertTrue(report.ready().startswith("Started in "))
+
+
+if __name__ == '__main__':
+    unittest.main()
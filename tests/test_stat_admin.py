@@ -0,0 +1,66 @@
+import unittest
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+from config import get_settings
+from main import create_application
+from api.crud import create_stat_admin_mission, get_stat_admin_rollup, rebuild_stat_admin_rollup
+from api.dependencies import check_if_admin, get_session
+from api.schemas import StatAdminMissionBase
+from api.core.pagination import encode_cursor
+from tests.conftest import create_memory_engine
+
+
+def make_stat(mission_name: str, rank: str, result: str, percent_character: int) -> StatAdminMissionBase:
+    return StatAdminMissionBase(mission_name=mission_name, mission_rank=rank, mission_village="Konoha",
+                                character_name="Narrateur", percent_mission=50,
+                                percent_character=percent_character, percent_choice=100, result=result)
+
+
+class TestStatAdminRollup(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = create_memory_engine()
+        with Session(self.engine) as db:
+            create_stat_admin_mission(db, make_stat("Escort", "C", "win", 10))
+            create_stat_admin_mission(db, make_stat("Escort", "C", "fail", 30))
+            create_stat_admin_mission(db, make_stat("Spy", "B", "win", 20))
+
+    def test_rollup_by_mission(self):
+        with Session(self.engine) as db:
+            rows = get_stat_admin_rollup(db, ["mission_name"])
+        self.assertEqual([tuple(row) for row in rows], [("Escort", 2, 1, 40, 200), ("Spy", 1, 1, 20, 100)])
+
+    def test_rollup_by_village_and_rank_filter(self):
+        with Session(self.engine) as db:
+            self.assertEqual(tuple(get_stat_admin_rollup(db, ["mission_village"])[0]), ("Konoha", 3, 2, 60, 300))
+            rows = get_stat_admin_rollup(db, ["mission_village"], rank="B")
+        self.assertEqual(tuple(rows[0]), ("Konoha", 1, 1, 20, 100))
+
+    def test_rollup_after_group(self):
+        with Session(self.engine) as db:
+            rows = get_stat_admin_rollup(db, ["mission_name", "mission_rank"], limit=1, after=("Escort", "C"))
+        self.assertEqual([tuple(row[:2]) for row in rows], [("Spy", "B")])
+
+    def test_stats_by_page(self):
+        def get_test_session():
+            with Session(self.engine) as session:
+                yield session
+
+        api = create_application(get_settings())
+        api.dependency_overrides[get_session] = get_test_session
+        api.dependency_overrides[check_if_admin] = lambda: None
+        client = TestClient(api)
+        page = client.get("/api/admin/stats/missions", params={"limit": 1}).json()
+        self.assertEqual([item["mission_name"] for item in page["items"]], ["Escort"])
+        page = client.get("/api/admin/stats/missions", params={"limit": 1, "cursor": page["next_cursor"]}).json()
+        self.assertEqual([item["mission_name"] for item in page["items"]], ["Spy"])
+        self.assertIsNone(page["next_cursor"], msg="expected no cursor on the last page")
+        response = client.get("/api/admin/stats/missions", params={"group_by": "rank", "cursor": encode_cursor((1,))})
+        self.assertEqual(response.status_code, 422, msg="expected status code 422 for a cursor of another listing")
+
+    def test_rebuild_from_history(self):
+        with Session(self.engine) as db:
+            before = [tuple(row) for row in get_stat_admin_rollup(db, ["mission_name", "mission_rank"])]
+            rebuild_stat_admin_rollup(db)
+            after = [tuple(row) for row in get_stat_admin_rollup(db, ["mission_name", "mission_rank"])]
+        self.assertEqual(before, after)
@@ -0,0 +1,131 @@
+import asyncio
+import unittest
+from threading import Event, Thread
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+from config import get_settings
+from main import create_application
+from api.crud import create_user_db
+from api.dependencies import get_session
+from api.core.auth_cache import get_auth_cache
+from api.core.srpg_client import SrpgClient, SrpgError, get_srpg_client
+from api.core.upstream import CLOSED, OPEN, CircuitBreaker, SingleFlight, UpstreamUnavailable
+from benchmarks.stub_srpg import StubAdapter
+from tests.conftest import create_memory_engine
+
+
+def fail():
+    raise ConnectionError()
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_open_after_threshold(self):
+        breaker = CircuitBreaker("test", threshold=2, reset_timeout=60)
+        for _ in range(2):
+            self.assertRaises(ConnectionError, breaker.call, fail)
+        self.assertEqual(breaker.state, OPEN)
+        calls = []
+        self.assertRaises(UpstreamUnavailable, breaker.call, lambda: calls.append(1))
+        self.assertEqual(calls, [], msg="expected no call while the circuit is open")
+
+    def test_trial_after_reset(self):
+        breaker = CircuitBreaker("test", threshold=1, reset_timeout=0)
+        self.assertRaises(ConnectionError, breaker.call, fail)
+        self.assertRaises(ConnectionError, breaker.call, fail)
+        self.assertEqual(breaker.state, OPEN, msg="expected a failed trial to open the circuit again")
+        self.assertEqual(breaker.call(lambda: "ok"), "ok")
+        self.assertEqual(breaker.state, CLOSED)
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def test_threads_share_call(self):
+        single_flight = SingleFlight()
+        started, release = Event(), Event()
+        calls, results = [], []
+
+        def fetch():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return "roster"
+
+        leader = Thread(target=lambda: results.append(single_flight.do("token", fetch)))
+        leader.start()
+        started.wait(5)
+        followers = [Thread(target=lambda: results.append(single_flight.do("token", fetch))) for _ in range(4)]
+        for follower in followers:
+            follower.start()
+        release.set()
+        for thread in [leader] + followers:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["roster"] * 5)
+        self.assertEqual(len(single_flight), 0)
+
+    def test_tasks_share_call(self):
+        single_flight = SingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {"total": 10}
+
+        async def run():
+            return await asyncio.gather(*(single_flight.do_async(("power", 1), fetch) for _ in range(5)))
+
+        self.assertEqual(asyncio.run(run()), [{"total": 10}] * 5)
+        self.assertEqual(len(calls), 1)
+
+
+class TestSrpgClient(unittest.TestCase):
+
+    def test_server_errors_open_circuit(self):
+        settings = get_settings().copy(update={"srpg_breaker_threshold": 3, "srpg_breaker_reset": 60})
+        client = SrpgClient(settings)
+        calls = []
+        adapter = StubAdapter(lambda url: calls.append(url) or (503, []))
+        client.session.mount("https://", adapter)
+        client.session.mount("http://", adapter)
+        for _ in range(3):
+            self.assertRaises(SrpgError, client.get_account, "token")
+        self.assertRaises(UpstreamUnavailable, client.get_power, 1)
+        self.assertEqual(len(calls), 3)
+
+
+class TestSrpgRoutes(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_memory_engine()
+        with Session(engine) as db:
+            create_user_db(db, "token", None)
+
+        def get_test_session():
+            with Session(engine) as session:
+                yield session
+
+        api = create_application(get_settings())
+        api.dependency_overrides[get_session] = get_test_session
+        self.client = TestClient(api)
+        get_auth_cache().clear()
+        self.breaker = get_srpg_client().breaker
+        for _ in range(self.breaker.threshold):
+            self.breaker.failure()
+
+    def tearDown(self):
+        self.breaker.success()
+        get_auth_cache().clear()
+
+    def test_create_user(self):
+        response = self.client.post("/api/users", json={"token_srpg": "other"})
+        self.assertEqual(response.status_code, 503, msg="expected status code 503 with the circuit open")
+
+    def test_update_characters(self):
+        response = self.client.patch("/api/characters/", headers={"Authorization": "Bearer token"})
+        self.assertEqual(response.status_code, 503, msg="expected status code 503 with the circuit open")
+
+
+if __name__ == '__main__':
+    unittest.main()